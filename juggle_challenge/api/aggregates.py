@@ -0,0 +1,105 @@
+"""Single-query aggregates computed over filtered querysets."""
+from __future__ import annotations
+
+from decimal import Decimal
+from typing import Any, Dict, List
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connection
+
+RATE_STEP = Decimal("0.001")
+
+
+def rate_histogram(queryset, buckets: int) -> dict:
+    """Bucket ``daily_rate_range`` into ``buckets`` equal-width ranges between
+    the lowest and the highest rate of ``queryset``, using ``WIDTH_BUCKET``.
+    """
+    query = queryset.order_by().values("daily_rate_range").query
+    try:
+        sql, params = query.sql_with_params()
+    except EmptyResultSet:
+        # Filtered with .none(), there is nothing to query
+        return dict(min=None, max=None, buckets=[])
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH rates AS ({sql}),
+            bounds AS (
+                SELECT MIN(daily_rate_range) AS lower, MAX(daily_rate_range) AS upper
+                FROM rates
+            )
+            SELECT
+                bounds.lower,
+                bounds.upper,
+                WIDTH_BUCKET(
+                    rates.daily_rate_range, bounds.lower, bounds.upper + %s, %s
+                ) AS bucket,
+                COUNT(*)
+            FROM rates, bounds
+            GROUP BY bounds.lower, bounds.upper, bucket
+            ORDER BY bucket
+            """,
+            [*params, RATE_STEP, buckets],
+        )
+        rows = cursor.fetchall()
+
+    if not rows:
+        return dict(min=None, max=None, buckets=[])
+
+    lower, upper = rows[0][0], rows[0][1]
+    counts = {bucket: count for _, _, bucket, count in rows}
+    width = (upper + RATE_STEP - lower) / buckets
+    result: List[dict] = []
+    for bucket in range(1, buckets + 1):
+        result.append(
+            dict(
+                lower=str((lower + width * (bucket - 1)).quantize(RATE_STEP)),
+                upper=str((lower + width * bucket).quantize(RATE_STEP)),
+                count=counts.get(bucket, 0),
+            )
+        )
+    return dict(min=str(lower), max=str(upper), buckets=result)
+
+
+def facet_counts(queryset, facets: Dict[str, str], limits: Dict[str, int]) -> dict:
+    """Count the values of several array columns of ``queryset`` at once.
+
+    ``facets`` maps a facet name to the array column to unnest, ``limits``
+    optionally keeps only the most frequent values of a facet.
+    """
+    columns = list(facets.values())
+    try:
+        sql, params = queryset.order_by().values(*columns).query.sql_with_params()
+    except EmptyResultSet:
+        # Filtered with .none(), there is nothing to count
+        return {name: {} for name in facets}
+    qn = connection.ops.quote_name
+
+    selects = []
+    select_params: List[Any] = []
+    for name, column in facets.items():
+        limit = limits.get(name)
+        selects.append(
+            f"""
+            (
+                SELECT %s AS facet, value::text AS value, COUNT(*) AS count
+                FROM filtered, UNNEST(filtered.{qn(column)}) AS value
+                GROUP BY value
+                ORDER BY count DESC, value
+                {"LIMIT %s" if limit else ""}
+            )
+            """
+        )
+        select_params.extend([name, limit] if limit else [name])
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"WITH filtered AS ({sql}) {' UNION ALL '.join(selects)}",
+            [*params, *select_params],
+        )
+        rows = cursor.fetchall()
+
+    counts: Dict[str, Dict[str, int]] = {name: {} for name in facets}
+    for name, value, count in rows:
+        counts[name][value] = count
+    return counts
@@ -0,0 +1,90 @@
+"""Hot/cold tiering of jobs.
+
+Open jobs nobody touched for ``JOB_EXPIRE_AFTER_DAYS`` are marked expired.
+Closed and expired jobs untouched for ``JOB_ARCHIVE_AFTER_DAYS`` are moved,
+with their applications, to ``job_archive`` and ``application_archive`` so
+the ``job`` table and its indexes only hold jobs that are still in use.
+The ``job_with_archive`` view reads both tiers.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import datetime
+from typing import List, Optional, Type
+
+from django.conf import settings
+from django.db import connection, models, transaction
+
+from juggle_challenge import utils
+
+from .models import Application, ApplicationArchive, Job, JobArchive
+
+
+def expire_jobs(days: int) -> int:
+    now = utils.now_with_tz()
+    expired = Job.objects.filter(
+        status=Job.Status.OPEN, updated_at__lt=now - datetime.timedelta(days=days)
+    ).update(status=Job.Status.EXPIRED, updated_at=now)
+    return expired
+
+
+@contextlib.contextmanager
+def _archiving():
+    """Log the deletes in the block as ``archive`` in the change feed, see
+    migration 0011. Must run in a transaction.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SET LOCAL juggle.archiving = on")
+        yield
+        # An enclosing transaction may go on deleting
+        cursor.execute("SET LOCAL juggle.archiving = off")
+
+
+def _move(
+    source: Type[models.Model], target: Type[models.Model], column: str, ids: List
+) -> int:
+    """Move the ``source`` rows whose ``column`` is in ``ids`` to ``target``."""
+    columns = ", ".join(
+        connection.ops.quote_name(field.column)
+        for field in target._meta.concrete_fields
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM {source._meta.db_table}
+                WHERE {column} = ANY(%s)
+                RETURNING {columns}
+            )
+            INSERT INTO {target._meta.db_table} ({columns})
+            SELECT {columns} FROM moved
+            """,
+            [ids],
+        )
+        return cursor.rowcount
+
+
+def archive_jobs(days: int, batch_size: Optional[int] = None) -> dict:
+    """Move jobs closed or expired more than ``days`` ago to the archive."""
+    batch_size = batch_size or settings.JOB_ARCHIVE_BATCH_SIZE
+    before = utils.now_with_tz() - datetime.timedelta(days=days)
+    jobs = applications = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                Job.objects.select_for_update(skip_locked=True)
+                .filter(
+                    status__in=[Job.Status.CLOSED, Job.Status.EXPIRED],
+                    updated_at__lt=before,
+                )
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            with _archiving():
+                jobs += _move(Job, JobArchive, "id", ids)
+                applications += _move(Application, ApplicationArchive, "job_id", ids)
+
+    return dict(jobs=jobs, applications=applications)
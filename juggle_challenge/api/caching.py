@@ -0,0 +1,45 @@
+"""Cached aggregate results, invalidated by the change log.
+
+The cache keys derived from a model include the id of the last
+``change_log`` row of its table. Every committed insert, update and delete
+logs a row, whether through ``save()``, ``bulk_create()``, ``update()`` or
+raw SQL, so the next read of any worker moves to a new namespace. Entries
+also expire after their timeout, which bounds how long a result stays
+stale when a transaction commits after one that logged a later row.
+"""
+from __future__ import annotations
+
+import hashlib
+from typing import Any, Callable
+
+from django.core.cache import cache
+from django.db.models import Max
+
+from juggle_challenge import metrics
+
+from .models import ChangeLog
+
+
+def get_version(model) -> int:
+    """Id of the last change logged for ``model``'s table."""
+    version = ChangeLog.objects.filter(entity=model._meta.db_table).aggregate(
+        version=Max("id")
+    )["version"]
+    return version or 0
+
+
+def cache_key(name: str, model, params) -> str:
+    digest = hashlib.md5(repr(sorted(params.lists())).encode()).hexdigest()
+    return f"{name}:{model._meta.label_lower}:{get_version(model)}:{digest}"
+
+
+def get_or_compute(
+    name: str, model, params, compute: Callable[[], Any], timeout: int
+) -> Any:
+    key = cache_key(name, model, params)
+    data = cache.get(key)
+    metrics.record_cache(name, data is not None)
+    if data is None:
+        data = compute()
+        cache.set(key, data, timeout)
+    return data
@@ -0,0 +1,122 @@
+"""Change feed of jobs, professionals, businesses and applications.
+
+Triggers append a ``change_log`` row for every insert, update and delete,
+tagged with the id of the writing transaction. Transaction ids are handed
+out when transactions start, not when they commit, so a reader only returns
+changes of transactions older than the oldest one still running
+(``txid_snapshot_xmin``): nothing can be committed behind the cursor later.
+Changes are ordered by ``(txid, id)`` and the cursor is the last pair read.
+"""
+from __future__ import annotations
+
+import datetime
+from typing import List, Optional, Tuple
+
+from django.db.models.expressions import RawSQL
+
+from juggle_challenge import utils
+
+from .models import Application, Business, ChangeLog, Job, Professional
+from .serializers import (
+    ApplicationSerializer,
+    BusinessSerializer,
+    JobSerializer,
+    ProfessionalSerializer,
+)
+
+ENTITIES = {
+    "business": (Business, BusinessSerializer),
+    "job": (Job, JobSerializer),
+    "professional": (Professional, ProfessionalSerializer),
+    "application": (Application, ApplicationSerializer),
+}
+
+Cursor = Tuple[int, int]
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    return "{}-{}".format(*cursor)
+
+
+def decode_cursor(value: str) -> Cursor:
+    """Parse a cursor from ``encode_cursor``, raises ``ValueError``."""
+    txid, _, change_id = value.partition("-")
+    return int(txid), int(change_id)
+
+
+def read_rows(
+    since: Optional[Cursor], limit: int, entities: Optional[List[str]] = None
+) -> Tuple[List[ChangeLog], Cursor, bool]:
+    """Up to ``limit`` change log rows after ``since``, the cursor to resume
+    at and whether more rows are already available.
+    """
+    queryset = ChangeLog.objects.filter(
+        txid__lt=RawSQL("txid_snapshot_xmin(txid_current_snapshot())", [])
+    )
+    if since is not None:
+        txid, change_id = since
+        # Keeps the (txid, id) index range scan, unlike an OR of both cases
+        queryset = queryset.filter(txid__gte=txid).exclude(
+            txid=txid, id__lte=change_id
+        )
+    if entities is not None:
+        queryset = queryset.filter(entity__in=entities)
+    rows = list(queryset.order_by("txid", "id")[: limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not rows:
+        return [], since or (0, 0), False
+    return rows, (rows[-1].txid, rows[-1].id), has_more
+
+
+def read_changes(
+    since: Optional[Cursor], limit: int
+) -> Tuple[List[dict], Cursor, bool]:
+    """Up to ``limit`` changes after ``since``, the cursor to resume at and
+    whether more changes are already available.
+    """
+    rows, cursor, has_more = read_rows(since, limit)
+    if not rows:
+        return [], cursor, has_more
+
+    data = {}
+    for entity, (model, serializer_class) in ENTITIES.items():
+        ids = {row.object_id for row in rows if row.entity == entity}
+        if ids:
+            objects = model.objects.in_bulk(ids)
+            data[entity] = {
+                pk: serializer_class(obj).data for pk, obj in objects.items()
+            }
+
+    changes = [
+        dict(
+            cursor=encode_cursor((row.txid, row.id)),
+            type=row.entity,
+            id=row.object_id,
+            op=row.op,
+            changed_at=row.changed_at,
+            # None for deleted objects, the current state otherwise
+            data=data.get(row.entity, {}).get(row.object_id),
+        )
+        for row in rows
+    ]
+    return changes, cursor, has_more
+
+
+def latest_cursor() -> Cursor:
+    """Cursor after every change visible to new readers right now."""
+    row = (
+        ChangeLog.objects.filter(
+            txid__lt=RawSQL("txid_snapshot_xmin(txid_current_snapshot())", [])
+        )
+        .order_by("-txid", "-id")
+        .values_list("txid", "id")
+        .first()
+    )
+    return row or (0, 0)
+
+
+def prune(days: int) -> int:
+    before = utils.now_with_tz() - datetime.timedelta(days=days)
+    deleted, _ = ChangeLog.objects.filter(changed_at__lt=before).delete()
+    return deleted
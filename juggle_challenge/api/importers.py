@@ -0,0 +1,196 @@
+"""Streaming bulk import of professionals and jobs from CSV or NDJSON.
+
+Rows are parsed one at a time, validated with the regular serializers and
+inserted with ``bulk_create`` in batches, so memory stays bounded by the
+batch size whatever the file size. Invalid rows, and the rows of batches the
+database rejects, are written to an NDJSON error report instead of aborting
+the import, which the owner of an upload's task downloads from
+``GET /v1/tasks/{id}/report/``.
+"""
+from __future__ import annotations
+
+import csv
+import io
+import json
+import os
+from typing import IO, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, transaction
+
+from . import skills, taskqueue
+from .models import Business, Job, Professional, Task
+from .serializers import JobSerializer, ProfessionalSerializer
+
+User = get_user_model()
+
+FORMATS = ("csv", "ndjson")
+
+KINDS = {
+    "professionals": (Professional, ProfessionalSerializer),
+    "jobs": (Job, JobSerializer),
+}
+
+# Multi-valued CSV columns hold their values separated by "|"
+CSV_LIST_SEPARATOR = "|"
+CSV_LIST_FIELDS = {"availability_ids", "location_ids", "skills"}
+
+MAX_REPORTED_ERRORS = 20
+
+IMPORT_TASK = "import_records"
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def intern_skills(rows: List[dict]) -> None:
+    """Replace the skill names of validated job rows by their ids in place.
+
+    Interns the names of the whole batch at once, like
+    ``JobSerializer.create`` does for a single job.
+    """
+    names = [name for data in rows for name in data.get("skill_ids", ())]
+    normalized_names = dict.fromkeys(skills.normalize(name) for name in names)
+    ids = dict(zip(normalized_names, skills.intern(names)))
+    for data in rows:
+        if "skill_ids" in data:
+            data["skill_ids"] = list(
+                dict.fromkeys(ids[skills.normalize(n)] for n in data["skill_ids"])
+            )
+
+
+def format_from_name(name: str) -> str:
+    extension = os.path.splitext(name)[1].lstrip(".").lower()
+    if extension in ("json", "jsonl"):
+        extension = "ndjson"
+    if extension not in FORMATS:
+        raise ImportFormatError(f"Unsupported file format {extension!r}")
+    return extension
+
+
+def read_rows(fd: IO[bytes], fmt: str) -> Iterator[Tuple[int, object]]:
+    """Yield ``(row_number, row)`` pairs without reading the whole file."""
+    text = io.TextIOWrapper(fd, encoding="utf-8", newline="")
+    if fmt == "csv":
+        for number, row in enumerate(csv.DictReader(text), start=1):
+            for name in CSV_LIST_FIELDS & set(row):
+                value = row[name] or ""
+                row[name] = [v for v in value.split(CSV_LIST_SEPARATOR) if v]
+            yield number, row
+    elif fmt == "ndjson":
+        for number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield number, json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield number, exc
+    else:
+        raise ImportFormatError(f"Unsupported file format {fmt!r}")
+
+
+def import_records(
+    kind: str,
+    fd: IO[bytes],
+    fmt: str,
+    owner,
+    business: Optional[Business] = None,
+    report: Optional[IO[str]] = None,
+    batch_size: Optional[int] = None,
+) -> dict:
+    model, serializer_class = KINDS[kind]
+    batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+    save_kwargs = dict(owner=owner)
+    if kind == "jobs":
+        save_kwargs["business"] = business
+
+    created = failed = 0
+    errors = []
+
+    def report_error(number, row_errors):
+        nonlocal failed
+        failed += 1
+        error = dict(row=number, errors=row_errors)
+        if report is not None:
+            report.write(json.dumps(error) + "\n")
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append(error)
+
+    def flush(batch):
+        nonlocal created
+        try:
+            with transaction.atomic():
+                if kind == "jobs":
+                    intern_skills([data for _, data in batch])
+                model.objects.bulk_create(
+                    [model(**data, **save_kwargs) for _, data in batch],
+                    batch_size=batch_size,
+                )
+        except DatabaseError as exc:
+            # The whole batch was rolled back, report each of its rows
+            for number, _ in batch:
+                report_error(number, {"non_field_errors": [str(exc).strip()]})
+        else:
+            created += len(batch)
+
+    batch = []
+    for number, row in read_rows(fd, fmt):
+        if isinstance(row, Exception):
+            row_errors = {"non_field_errors": [str(row)]}
+        elif not isinstance(row, dict):
+            row_errors = {"non_field_errors": ["Expected an object"]}
+        else:
+            serializer = serializer_class(data=row)
+            if serializer.is_valid():
+                batch.append((number, serializer.validated_data))
+                if len(batch) >= batch_size:
+                    flush(batch)
+                    batch = []
+                continue
+            row_errors = serializer.errors
+        report_error(number, row_errors)
+
+    if batch:
+        flush(batch)
+
+    return dict(created=created, failed=failed, errors=errors)
+
+
+def upload_path(name: str) -> str:
+    os.makedirs(settings.IMPORT_DIR, exist_ok=True)
+    return os.path.join(settings.IMPORT_DIR, name)
+
+
+def report_path(task: Task) -> Optional[str]:
+    """Path of the error report of an ``import_file`` task, if it has one."""
+    name = (task.result or {}).get("report") if task.name == IMPORT_TASK else None
+    if not name:
+        return None
+    return os.path.join(settings.IMPORT_DIR, os.path.basename(name))
+
+
+@taskqueue.task(IMPORT_TASK, max_attempts=1)
+def import_file(
+    kind: str,
+    path: str,
+    fmt: str,
+    owner_id: int,
+    business_id: Optional[int] = None,
+) -> dict:
+    owner = User.objects.get(pk=owner_id)
+    business = Business.objects.get(pk=business_id) if business_id else None
+    report_path = f"{os.path.splitext(path)[0]}.errors.ndjson"
+    try:
+        with open(path, "rb") as fd, open(report_path, "w") as report:
+            result = import_records(
+                kind, fd, fmt, owner=owner, business=business, report=report
+            )
+    finally:
+        os.remove(path)
+    if result["failed"]:
+        result["report"] = os.path.basename(report_path)
+    else:
+        os.remove(report_path)
+    return result
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api import archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Expire stale open jobs and move old closed or expired jobs, with "
+        "their applications, to the archive tables"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--expire-after-days",
+            type=int,
+            default=settings.JOB_EXPIRE_AFTER_DAYS,
+            help="Expire open jobs not updated for this many days",
+        )
+        parser.add_argument(
+            "--archive-after-days",
+            type=int,
+            default=settings.JOB_ARCHIVE_AFTER_DAYS,
+            help="Archive closed or expired jobs not updated for this many days",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.JOB_ARCHIVE_BATCH_SIZE,
+            help="Number of jobs moved per transaction",
+        )
+
+    def handle(self, *args, **options):
+        expired = archive.expire_jobs(options["expire_after_days"])
+        self.stdout.write(f"Expired {expired} jobs")
+
+        moved = archive.archive_jobs(
+            options["archive_after_days"], batch_size=options["batch_size"]
+        )
+        self.stdout.write(
+            f"Archived {moved['jobs']} jobs and {moved['applications']} applications"
+        )
@@ -0,0 +1,32 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the daily application counts of jobs and businesses from the "
+        "live and archived applications"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            help="Only recount the days from this date on (YYYY-MM-DD)",
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"]:
+            try:
+                since = datetime.date.fromisoformat(options["since"])
+            except ValueError:
+                raise CommandError(f"Invalid date {options['since']!r}")
+
+        counts = rollups.backfill(since)
+        self.stdout.write(
+            f"Wrote {counts['job_days']} job days and "
+            f"{counts['business_days']} business days"
+        )
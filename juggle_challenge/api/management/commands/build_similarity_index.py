@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api import similarity
+
+
+class Command(BaseCommand):
+    help = "Build the similar jobs index and save it for the API processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default=settings.SIMILAR_JOBS_INDEX_PATH,
+            help="Path of the index file",
+        )
+
+    def handle(self, *args, **options):
+        index = similarity.build()
+        index.save(options["output"])
+        self.stdout.write(f"Indexed {len(index.ids)} jobs in {options['output']}")
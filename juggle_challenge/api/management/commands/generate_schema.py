@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from juggle_challenge import schema
+
+
+class Command(BaseCommand):
+    help = "Write the OpenAPI schema served at /swagger.json and /swagger.yaml"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output-dir",
+            default=settings.OPENAPI_SCHEMA_DIR,
+            help="Directory to write the schema to (default: OPENAPI_SCHEMA_DIR)",
+        )
+
+    def handle(self, *args, **options):
+        if not options["output_dir"]:
+            raise CommandError("Pass --output-dir or set JUGGLE_OPENAPI_SCHEMA_DIR")
+        for path in schema.write_schemas(options["output_dir"]):
+            self.stdout.write(f"Wrote {path}")
@@ -0,0 +1,68 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from api import importers
+from api.models import Business
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Stream professionals or jobs from a CSV or NDJSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(importers.KINDS))
+        parser.add_argument("path", help="File to import, '-' for stdin")
+        parser.add_argument("--format", choices=importers.FORMATS)
+        parser.add_argument(
+            "--owner", required=True, help="Username owning the imported rows"
+        )
+        parser.add_argument("--business", type=int, help="Business id for jobs")
+        parser.add_argument("--batch-size", type=int)
+        parser.add_argument(
+            "--report", help="Write the per-row error report to this file"
+        )
+
+    def handle(self, *args, **options):
+        kind, path = options["kind"], options["path"]
+        try:
+            owner = User.objects.get(username=options["owner"])
+        except User.DoesNotExist:
+            raise CommandError(f"Unknown user {options['owner']!r}")
+
+        business = None
+        if kind == "jobs":
+            if options["business"] is None:
+                raise CommandError("--business is required to import jobs")
+            business = Business.objects.filter(pk=options["business"]).first()
+            if business is None:
+                raise CommandError(f"Unknown business {options['business']}")
+
+        try:
+            fmt = options["format"] or importers.format_from_name(path)
+        except importers.ImportFormatError as exc:
+            raise CommandError(str(exc))
+
+        report = open(options["report"], "w") if options["report"] else None
+        fd = sys.stdin.buffer if path == "-" else open(path, "rb")
+        try:
+            result = importers.import_records(
+                kind,
+                fd,
+                fmt,
+                owner=owner,
+                business=business,
+                report=report,
+                batch_size=options["batch_size"],
+            )
+        finally:
+            if fd is not sys.stdin.buffer:
+                fd.close()
+            if report is not None:
+                report.close()
+
+        self.stdout.write(
+            f"Created {result['created']} {kind}, {result['failed']} rows failed"
+        )
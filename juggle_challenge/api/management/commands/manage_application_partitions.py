@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from api import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Create upcoming monthly Application partitions and detach the ones "
+        "older than the retention period"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=3,
+            help="Number of future months to create partitions for",
+        )
+        parser.add_argument(
+            "--retention-months",
+            type=int,
+            default=None,
+            help="Detach partitions older than this many months",
+        )
+        parser.add_argument(
+            "--drop",
+            action="store_true",
+            help="Drop detached partitions instead of moving them to the "
+            f"{partitions.ARCHIVE_SCHEMA!r} schema",
+        )
+
+    def handle(self, *args, **options):
+        for name in partitions.ensure_partitions(options["months_ahead"]):
+            self.stdout.write(f"Created partition {name}")
+
+        if options["retention_months"] is not None:
+            for name in partitions.detach_partitions(
+                options["retention_months"], drop=options["drop"]
+            ):
+                action = "Dropped" if options["drop"] else "Archived"
+                self.stdout.write(f"{action} partition {name}")
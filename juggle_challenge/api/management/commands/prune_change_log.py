@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api import changes
+
+
+class Command(BaseCommand):
+    help = "Delete change feed entries older than the retention period"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.CHANGE_LOG_RETENTION_DAYS,
+            help="Keep changes from the last this many days",
+        )
+
+    def handle(self, *args, **options):
+        deleted = changes.prune(options["days"])
+        self.stdout.write(f"Deleted {deleted} changes")
@@ -0,0 +1,174 @@
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from juggle_challenge import metrics, traffic
+from juggle_challenge.rest_api import BearerAuth, Client
+
+# Failed requests printed, the others are only counted
+MAX_REPORTED_FAILURES = 10
+
+
+@dataclass
+class Replayed:
+    # From the Server-Timing header, None if the response had none
+    server_s: Optional[float]
+    client_s: float
+    status: int
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class Command(BaseCommand):
+    help = "Replay a traffic capture against an instance and compare latencies"
+
+    def add_arguments(self, parser):
+        parser.add_argument("capture", help="NDJSON file written by the capture")
+        parser.add_argument(
+            "--base-url",
+            default="http://127.0.0.1:8000/",
+            help="Instance to send the requests to",
+        )
+        parser.add_argument(
+            "--speed",
+            type=float,
+            default=1.0,
+            help="Replay speed relative to the capture, 0 sends as fast as "
+            "the workers allow",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=8,
+            help="Requests in flight at most",
+        )
+        parser.add_argument("--username", help="User to authenticate as")
+        parser.add_argument("--password", help="Password of --username")
+        parser.add_argument("--limit", type=int, help="Replay this many requests")
+
+    def handle(self, *args, **options):
+        with open(options["capture"]) as fd:
+            records = sorted(traffic.read_capture(fd), key=lambda r: r["ts"])
+        # Uploads aren't captured, they can't be replayed
+        records = [r for r in records if "body_omitted" not in r]
+        if options["limit"]:
+            records = records[: options["limit"]]
+        if not records:
+            raise CommandError("Nothing to replay")
+
+        session = requests.Session()
+        # One pooled connection per worker thread
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=options["concurrency"]
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        client = Client(
+            base_url=options["base_url"],
+            exception_raise_enabled=False,
+            log_sample_rate=0,
+            session=session,
+        )
+        if options["username"]:
+            response = client("v1/token/").post(
+                username=options["username"], password=options["password"]
+            )
+            if response.status_code != 200:
+                raise CommandError(f"Authentication failed: {response.text}")
+            client.auth = BearerAuth(response.json()["access"])
+
+        def replay(record) -> Replayed:
+            path = record["path"].lstrip("/")
+            if record["query"]:
+                path = f"{path}?{urlencode(record['query'], doseq=True)}"
+            t0 = time.perf_counter()
+            response = client.send(
+                method=record["method"], path=path, data=record.get("body")
+            )
+            return Replayed(
+                server_s=metrics.parse_server_timing(
+                    response.headers.get("Server-Timing")
+                ),
+                client_s=time.perf_counter() - t0,
+                status=response.status_code,
+            )
+
+        speed = options["speed"]
+        first_ts = records[0]["ts"]
+        started = time.perf_counter()
+        futures = []
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            for record in records:
+                if speed > 0:
+                    delay = (record["ts"] - first_ts) / speed
+                    time.sleep(max(0.0, started + delay - time.perf_counter()))
+                futures.append((record, executor.submit(replay, record)))
+        elapsed = time.perf_counter() - started
+
+        results: Dict[str, List[Tuple[dict, Replayed]]] = defaultdict(list)
+        failures: Dict[str, int] = defaultdict(int)
+        for record, future in futures:
+            try:
+                results[record["route"]].append((record, future.result()))
+            except Exception as exc:
+                failures[record["route"]] += 1
+                if sum(failures.values()) <= MAX_REPORTED_FAILURES:
+                    self.stderr.write(
+                        f"{record['method']} {record['path']} failed: {exc!r}"
+                    )
+
+        self.stdout.write(
+            f"Replayed {len(records)} requests in {elapsed:.1f}s "
+            f"(captured over {records[-1]['ts'] - first_ts:.1f}s)\n"
+        )
+        # Server times, as captured and from the Server-Timing header of the
+        # replayed responses, then the round trip time seen by this client
+        self.stdout.write(
+            f"{'route':<32} {'count':>6} {'p50 ms':>16} {'p95 ms':>16} "
+            f"{'delta p50':>10} {'client p50':>10} {'status diff':>11} "
+            f"{'failed':>6}"
+        )
+        for route in sorted(set(results) | set(failures)):
+            rows = results.get(route, [])
+            timed = [(r["duration_s"], x.server_s) for r, x in rows if x.server_s]
+            captured = [row[0] for row in timed]
+            replayed = [row[1] for row in timed]
+            if timed:
+                captured_p50 = percentile(captured, 0.5)
+                replayed_p50 = percentile(replayed, 0.5)
+                delta = (
+                    (replayed_p50 - captured_p50) / captured_p50 if captured_p50 else 0
+                )
+                timings = (
+                    f"{captured_p50 * 1000:>7.1f} > {replayed_p50 * 1000:<6.1f} "
+                    f"{percentile(captured, 0.95) * 1000:>7.1f} > "
+                    f"{percentile(replayed, 0.95) * 1000:<6.1f} {delta:>+10.0%}"
+                )
+            else:
+                # No response carried a Server-Timing header
+                timings = f"{'-':>16} {'-':>16} {'-':>10}"
+            client_p50 = (
+                f"{percentile([x.client_s for _, x in rows], 0.5) * 1000:>10.1f}"
+                if rows
+                else f"{'-':>10}"
+            )
+            # Responses in another status class than captured, e.g. 404s for
+            # ids missing from this instance
+            status_diff = sum(
+                1 for r, x in rows if r["status"] // 100 != x.status // 100
+            )
+            self.stdout.write(
+                f"{route:<32} {len(rows) + failures.get(route, 0):>6} {timings} "
+                f"{client_p50} {status_diff:>11} {failures.get(route, 0):>6}"
+            )
+        if failures:
+            raise CommandError(f"{sum(failures.values())} requests failed")
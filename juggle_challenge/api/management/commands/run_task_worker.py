@@ -0,0 +1,83 @@
+import multiprocessing
+import signal
+import threading
+
+from django import db
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api import taskqueue
+
+
+def _work_in_process(stop, poll_interval, burst):
+    # The parent handles SIGINT and tells children to stop through ``stop``
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    taskqueue.work(stop, poll_interval, burst=burst)
+
+
+class Command(BaseCommand):
+    help = "Run background tasks from the task table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=settings.TASK_WORKER_CONCURRENCY,
+            help="Number of tasks to run in parallel",
+        )
+        parser.add_argument(
+            "--pool",
+            choices=["thread", "process"],
+            default="process",
+            help="Run tasks in threads or in forked processes",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=settings.TASK_POLL_INTERVAL,
+            help="Seconds to wait before polling an empty queue again",
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit once the queue is empty",
+        )
+
+    def handle(self, *args, **options):
+        taskqueue.autodiscover()
+        concurrency = options["concurrency"]
+        poll_interval = options["poll_interval"]
+        burst = options["burst"]
+
+        if options["pool"] == "process":
+            # Forked children must not share the parent's DB connection
+            db.connections.close_all()
+            context = multiprocessing.get_context("fork")
+            stop = context.Event()
+            workers = [
+                context.Process(
+                    target=_work_in_process, args=(stop, poll_interval, burst)
+                )
+                for _ in range(concurrency)
+            ]
+        else:
+            stop = threading.Event()
+            workers = [
+                threading.Thread(
+                    target=taskqueue.work, args=(stop, poll_interval, burst)
+                )
+                for _ in range(concurrency)
+            ]
+
+        def shutdown(signum, frame):
+            self.stdout.write("Stopping after the running tasks finish")
+            stop.set()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        self.stdout.write(f"Running {concurrency} {options['pool']} task workers")
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
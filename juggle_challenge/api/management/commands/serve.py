@@ -0,0 +1,144 @@
+import time
+
+from django import db
+from django.conf import settings
+from django.contrib.staticfiles.handlers import (
+    ASGIStaticFilesHandler,
+    StaticFilesHandler,
+)
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import get_resolver
+
+from api import similarity, skills
+from juggle_challenge import metrics, prefork, schema
+
+
+def _wait_for_database(timeout: float) -> None:
+    """Wait for every database to accept connections, e.g. while the
+    database container starts.
+    """
+    deadline = time.monotonic() + timeout
+    for connection in db.connections.all():
+        while True:
+            try:
+                connection.ensure_connection()
+                break
+            except db.OperationalError as exc:
+                if time.monotonic() >= deadline:
+                    raise CommandError(f"Database {connection.alias!r}: {exc}")
+                time.sleep(1)
+
+
+def _preload():
+    """Warm up what every worker can share copy-on-write."""
+    _wait_for_database(settings.SERVER_DATABASE_TIMEOUT)
+    get_resolver().url_patterns  # imports every view
+    if settings.SWAGGER_ENABLED:
+        schema.get_schema("json")
+    skills.preload()
+    similarity.preload()
+    # Forked workers must not share the master's database connections
+    db.connections.close_all()
+
+
+def _connect():
+    for connection in db.connections.all():
+        connection.ensure_connection()
+
+
+class Command(BaseCommand):
+    help = "Serve the API with gunicorn over wsgi.py or asgi.py"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--bind",
+            default=settings.SERVER_BIND,
+            help="Address to listen on, as host:port",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.SERVER_WORKERS,
+            help="Number of worker processes (default: sized to available CPUs)",
+        )
+        parser.add_argument(
+            "--max-requests",
+            type=int,
+            default=settings.SERVER_MAX_REQUESTS,
+            help="Replace a worker after this many requests, 0 to disable",
+        )
+        parser.add_argument(
+            "--max-requests-jitter",
+            type=int,
+            default=settings.SERVER_MAX_REQUESTS_JITTER,
+            help="Add up to this many requests to each worker's --max-requests",
+        )
+        parser.add_argument(
+            "--graceful-timeout",
+            type=float,
+            default=settings.SERVER_GRACEFUL_TIMEOUT,
+            help="Seconds workers get to finish their requests on shutdown",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=settings.SERVER_REQUEST_TIMEOUT,
+            help="Seconds after which a worker stuck on a request is replaced",
+        )
+        parser.add_argument(
+            "--asgi",
+            action="store_true",
+            help="Serve asgi.py with uvicorn workers instead of wsgi.py",
+        )
+
+    def handle(self, *args, **options):
+        cpus = prefork.available_cpus()
+        if options["asgi"]:
+            try:
+                import uvicorn  # noqa: F401
+            except ImportError:
+                raise CommandError("--asgi requires uvicorn to be installed")
+            from juggle_challenge.asgi import application
+
+            if settings.DEBUG:
+                application = ASGIStaticFilesHandler(application)
+            worker_class = prefork.ASGI_WORKER_CLASS
+            workers = options["workers"] or cpus
+            # Sync views run in a thread pool, connections are opened there
+            post_fork = None
+        else:
+            from juggle_challenge.wsgi import application
+
+            if settings.DEBUG:
+                application = StaticFilesHandler(application)
+            worker_class = "sync"
+            # Sync workers sit idle while waiting on the database
+            workers = options["workers"] or 2 * cpus + 1
+            post_fork = _connect
+
+        _preload()
+        if workers > 1 and not settings.METRICS_DIR:
+            self.stderr.write(
+                "JUGGLE_METRICS_DIR is not set, /metrics only reports the "
+                "worker serving it"
+            )
+
+        self.stdout.write(
+            f"Serving on {options['bind']} with {workers} "
+            f"{'ASGI' if options['asgi'] else 'WSGI'} workers"
+        )
+        prefork.Server(
+            application,
+            dict(
+                bind=options["bind"],
+                workers=workers,
+                worker_class=worker_class,
+                max_requests=options["max_requests"],
+                max_requests_jitter=options["max_requests_jitter"],
+                graceful_timeout=options["graceful_timeout"],
+                timeout=options["timeout"],
+            ),
+            post_fork=post_fork,
+            worker_exit=metrics.REGISTRY.flush,
+            worker_reaped=metrics.REGISTRY.retire,
+        ).run()
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.5 on 2026-10-19 14:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['daily_rate_range'], name='job_daily_rate_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='professional',
+            index=models.Index(fields=['daily_rate_range'], name='professional_daily_rate_idx'),
+        ),
+    ]
@@ -0,0 +1,76 @@
+from django.db import migrations, models
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+import juggle_challenge.utils
+
+
+def normalize(name):
+    return " ".join(name.split()).casefold()
+
+
+def intern_job_skills(apps, schema_editor):
+    Job = apps.get_model("api", "Job")
+    Skill = apps.get_model("api", "Skill")
+
+    skill_ids = {}
+    for job in Job.objects.only("skills").iterator():
+        ids = []
+        for name in job.skills:
+            normalized_name = normalize(name)
+            if normalized_name not in skill_ids:
+                skill, _ = Skill.objects.get_or_create(
+                    normalized_name=normalized_name,
+                    defaults=dict(name=" ".join(name.split())),
+                )
+                skill_ids[normalized_name] = skill.pk
+            if skill_ids[normalized_name] not in ids:
+                ids.append(skill_ids[normalized_name])
+        job.skill_ids = ids
+        job.save(update_fields=["skill_ids"])
+
+
+def restore_job_skills(apps, schema_editor):
+    Job = apps.get_model("api", "Job")
+    Skill = apps.get_model("api", "Skill")
+
+    names = dict(Skill.objects.values_list("pk", "name"))
+    for job in Job.objects.only("skill_ids").iterator():
+        job.skills = [names[pk] for pk in job.skill_ids if pk in names]
+        job.save(update_fields=["skills"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_daily_rate_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Skill',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=juggle_challenge.utils.now_with_tz)),
+                ('updated_at', models.DateTimeField(default=juggle_challenge.utils.now_with_tz)),
+                ('name', models.CharField(max_length=50)),
+                ('normalized_name', models.CharField(max_length=50, unique=True)),
+            ],
+            options={
+                'db_table': 'skill',
+            },
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='skill_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), default=list, size=None),
+        ),
+        migrations.RunPython(intern_job_skills, restore_job_skills),
+        migrations.RemoveField(
+            model_name='job',
+            name='skills',
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['skill_ids'], name='job_skill_ids_gin'),
+        ),
+    ]
@@ -0,0 +1,102 @@
+"""Move api_application to a table range partitioned by month on created_at.
+
+Postgres requires the partition key in the primary key, so the table's
+primary key becomes (id, created_at); ids still come from the same sequence.
+"""
+import datetime
+
+from django.db import migrations
+from django.utils import timezone
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def create_partitions(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT MIN(created_at) FROM api_application_unpartitioned")
+        (oldest,) = cursor.fetchone()
+        today = timezone.now().date()
+        first = oldest.astimezone(datetime.timezone.utc).date() if oldest else today
+        month = datetime.date(first.year, first.month, 1)
+        last = add_months(datetime.date(today.year, today.month, 1), 3)
+        while month <= last:
+            cursor.execute(
+                f"""
+                CREATE TABLE api_application_p{month:%Y%m}
+                PARTITION OF api_application
+                FOR VALUES FROM (%s) TO (%s)
+                """,
+                [
+                    f"{month:%Y-%m-%d} 00:00:00+00",
+                    f"{add_months(month, 1):%Y-%m-%d} 00:00:00+00",
+                ],
+            )
+            month = add_months(month, 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_skill_dictionary'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+            ALTER TABLE api_application RENAME TO api_application_unpartitioned;
+            ALTER SEQUENCE api_application_id_seq OWNED BY NONE;
+
+            CREATE TABLE api_application (
+                id bigint NOT NULL DEFAULT nextval('api_application_id_seq'),
+                created_at timestamp with time zone NOT NULL,
+                updated_at timestamp with time zone NOT NULL,
+                job_id bigint NOT NULL
+                    REFERENCES job (id) DEFERRABLE INITIALLY DEFERRED,
+                professional_id bigint NOT NULL
+                    REFERENCES professional (id) DEFERRABLE INITIALLY DEFERRED,
+                PRIMARY KEY (id, created_at)
+            ) PARTITION BY RANGE (created_at);
+            ALTER SEQUENCE api_application_id_seq OWNED BY api_application.id;
+
+            CREATE INDEX api_application_job_created_idx
+                ON api_application (job_id, created_at);
+            CREATE INDEX api_application_professional_idx
+                ON api_application (professional_id);
+            CREATE TABLE api_application_default
+                PARTITION OF api_application DEFAULT;
+            """,
+            reverse_sql="""
+            ALTER SEQUENCE api_application_id_seq OWNED BY NONE;
+            DROP TABLE api_application;
+            ALTER TABLE api_application_unpartitioned RENAME TO api_application;
+            ALTER SEQUENCE api_application_id_seq OWNED BY api_application.id;
+            """,
+        ),
+        migrations.RunPython(create_partitions, migrations.RunPython.noop),
+        migrations.RunSQL(
+            sql="""
+            INSERT INTO api_application
+                SELECT id, created_at, updated_at, job_id, professional_id
+                FROM api_application_unpartitioned;
+            DROP TABLE api_application_unpartitioned;
+            """,
+            reverse_sql="""
+            CREATE TABLE api_application_unpartitioned
+                (LIKE api_application INCLUDING DEFAULTS);
+            INSERT INTO api_application_unpartitioned
+                SELECT * FROM api_application;
+            ALTER TABLE api_application_unpartitioned ADD PRIMARY KEY (id);
+            CREATE INDEX ON api_application_unpartitioned (job_id);
+            CREATE INDEX ON api_application_unpartitioned (professional_id);
+            ALTER TABLE api_application_unpartitioned
+                ADD FOREIGN KEY (job_id) REFERENCES job (id)
+                DEFERRABLE INITIALLY DEFERRED;
+            ALTER TABLE api_application_unpartitioned
+                ADD FOREIGN KEY (professional_id) REFERENCES professional (id)
+                DEFERRABLE INITIALLY DEFERRED;
+            """,
+        ),
+    ]
@@ -0,0 +1,203 @@
+# Generated by Django 3.2.5 on 2026-10-19 14:58
+
+from django.conf import settings
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+import juggle_challenge.utils
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("api", "0005_task_queue"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="JobWithArchive",
+            fields=[
+                (
+                    "created_at",
+                    models.DateTimeField(default=juggle_challenge.utils.now_with_tz),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(default=juggle_challenge.utils.now_with_tz),
+                ),
+                ("title", models.CharField(max_length=50)),
+                (
+                    "daily_rate_range",
+                    models.DecimalField(decimal_places=3, max_digits=20),
+                ),
+                (
+                    "availability_ids",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.CharField(max_length=10), size=None
+                    ),
+                ),
+                (
+                    "location_ids",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.CharField(max_length=10), size=None
+                    ),
+                ),
+                (
+                    "skill_ids",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.IntegerField(), default=list, size=None
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("open", "Open"),
+                            ("closed", "Closed"),
+                            ("expired", "Expired"),
+                        ],
+                        default="open",
+                        max_length=10,
+                    ),
+                ),
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("archived", models.BooleanField()),
+            ],
+            options={
+                "db_table": "job_with_archive",
+                "managed": False,
+            },
+        ),
+        migrations.CreateModel(
+            name="ApplicationArchive",
+            fields=[
+                (
+                    "created_at",
+                    models.DateTimeField(default=juggle_challenge.utils.now_with_tz),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(default=juggle_challenge.utils.now_with_tz),
+                ),
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+            ],
+            options={
+                "db_table": "application_archive",
+            },
+        ),
+        migrations.CreateModel(
+            name="JobArchive",
+            fields=[
+                (
+                    "created_at",
+                    models.DateTimeField(default=juggle_challenge.utils.now_with_tz),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(default=juggle_challenge.utils.now_with_tz),
+                ),
+                ("title", models.CharField(max_length=50)),
+                (
+                    "daily_rate_range",
+                    models.DecimalField(decimal_places=3, max_digits=20),
+                ),
+                (
+                    "availability_ids",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.CharField(max_length=10), size=None
+                    ),
+                ),
+                (
+                    "location_ids",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.CharField(max_length=10), size=None
+                    ),
+                ),
+                (
+                    "skill_ids",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.IntegerField(), default=list, size=None
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("open", "Open"),
+                            ("closed", "Closed"),
+                            ("expired", "Expired"),
+                        ],
+                        default="open",
+                        max_length=10,
+                    ),
+                ),
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+            ],
+            options={
+                "db_table": "job_archive",
+            },
+        ),
+        migrations.AddField(
+            model_name="job",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("open", "Open"),
+                    ("closed", "Closed"),
+                    ("expired", "Expired"),
+                ],
+                default="open",
+                max_length=10,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(
+                fields=["status", "updated_at"], name="job_status_updated_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="jobarchive",
+            name="business",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, to="api.business"
+            ),
+        ),
+        migrations.AddField(
+            model_name="jobarchive",
+            name="owner",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT, to=settings.AUTH_USER_MODEL
+            ),
+        ),
+        migrations.AddField(
+            model_name="applicationarchive",
+            name="job",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, to="api.jobarchive"
+            ),
+        ),
+        migrations.AddField(
+            model_name="applicationarchive",
+            name="professional",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, to="api.professional"
+            ),
+        ),
+        migrations.RunSQL(
+            sql="""
+            CREATE VIEW job_with_archive AS
+            SELECT id, created_at, updated_at, title, daily_rate_range, availability_ids,
+                location_ids, skill_ids, status, business_id, owner_id,
+                false AS archived
+            FROM job
+            UNION ALL
+            SELECT id, created_at, updated_at, title, daily_rate_range, availability_ids,
+                location_ids, skill_ids, status, business_id, owner_id,
+                true AS archived
+            FROM job_archive;
+            """,
+            reverse_sql="DROP VIEW job_with_archive;",
+        ),
+    ]
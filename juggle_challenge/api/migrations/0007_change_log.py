@@ -0,0 +1,73 @@
+# Generated by Django 3.2.5 on 2026-10-19 15:09
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_job_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('txid', models.BigIntegerField()),
+                ('entity', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('op', models.CharField(choices=[('insert', 'Insert'), ('update', 'Update'), ('delete', 'Delete')], max_length=6)),
+                ('changed_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'change_log',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='changelog',
+            index=models.Index(fields=['txid', 'id'], name='change_log_cursor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='changelog',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['changed_at'], name='change_log_changed_at_brin'),
+        ),
+        migrations.RunSQL(
+            sql="""
+            CREATE FUNCTION record_change() RETURNS trigger AS $$
+            BEGIN
+                INSERT INTO change_log (txid, entity, object_id, op, changed_at)
+                VALUES (
+                    txid_current(),
+                    TG_ARGV[0],
+                    CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END,
+                    lower(TG_OP),
+                    now()
+                );
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            CREATE TRIGGER business_change_log
+                AFTER INSERT OR UPDATE OR DELETE ON business
+                FOR EACH ROW EXECUTE FUNCTION record_change('business');
+            CREATE TRIGGER job_change_log
+                AFTER INSERT OR UPDATE OR DELETE ON job
+                FOR EACH ROW EXECUTE FUNCTION record_change('job');
+            CREATE TRIGGER professional_change_log
+                AFTER INSERT OR UPDATE OR DELETE ON professional
+                FOR EACH ROW EXECUTE FUNCTION record_change('professional');
+            CREATE TRIGGER api_application_change_log
+                AFTER INSERT OR UPDATE OR DELETE ON api_application
+                FOR EACH ROW EXECUTE FUNCTION record_change('application');
+            """,
+            reverse_sql="""
+            DROP TRIGGER business_change_log ON business;
+            DROP TRIGGER job_change_log ON job;
+            DROP TRIGGER professional_change_log ON professional;
+            DROP TRIGGER api_application_change_log ON api_application;
+            DROP FUNCTION record_change();
+            """,
+        ),
+    ]
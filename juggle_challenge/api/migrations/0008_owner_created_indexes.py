@@ -0,0 +1,43 @@
+# Generated by Django 3.2.5 on 2026-10-19 15:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0007_change_log'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='business',
+            name='owner',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='job',
+            name='owner',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='professional',
+            name='owner',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='business',
+            index=models.Index(fields=['owner', 'created_at'], name='business_owner_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['owner', 'created_at'], name='job_owner_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='professional',
+            index=models.Index(fields=['owner', 'created_at'], name='professional_owner_created_idx'),
+        ),
+    ]
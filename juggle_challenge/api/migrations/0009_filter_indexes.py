@@ -0,0 +1,75 @@
+# Generated by Django 3.2.5 on 2026-10-19 15:30
+
+import warnings
+
+from django.db import DatabaseError, migrations, models, transaction
+import django.db.models.functions.text
+
+TRIGRAM_INDEXES = {
+    "professional_title_upper_trgm": "title",
+    "professional_full_name_upper_trgm": "full_name",
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """Index the icontains filters on professionals, when the pg_trgm
+    extension can be used: it ships with Postgres' contrib modules, which some
+    installations leave out, and creating it takes the CREATE privilege on the
+    database.
+    """
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+        )
+        if cursor.fetchone() is None:
+            warnings.warn("pg_trgm isn't available, skipping the trigram indexes")
+            return
+        try:
+            # A failed statement would abort the migration's transaction
+            with transaction.atomic(using=connection.alias):
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except DatabaseError as exc:
+            warnings.warn(
+                f"Can't create the pg_trgm extension, skipping the trigram "
+                f"indexes: {exc}"
+            )
+            return
+        for name, column in TRIGRAM_INDEXES.items():
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {name} ON professional "
+                f"USING gin (UPPER({column}) gin_trgm_ops)"
+            )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for name in TRIGRAM_INDEXES:
+            cursor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_owner_created_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['created_at'], name='job_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(django.db.models.functions.text.Upper('title'), name='job_title_upper_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='professional',
+            index=models.Index(fields=['created_at'], name='professional_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='professional',
+            index=models.Index(django.db.models.functions.text.Upper('email'), name='professional_email_upper_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 3.2.5 on 2026-10-19 15:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobDailyApplications',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('applications', models.PositiveIntegerField(default=0)),
+                ('business', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='api.business')),
+                ('job', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.job')),
+            ],
+            options={
+                'db_table': 'job_daily_applications',
+            },
+        ),
+        migrations.CreateModel(
+            name='BusinessDailyApplications',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('applications', models.PositiveIntegerField(default=0)),
+                ('business', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='api.business')),
+            ],
+            options={
+                'db_table': 'business_daily_applications',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='jobdailyapplications',
+            index=models.Index(fields=['business', 'day'], name='job_daily_business_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='jobdailyapplications',
+            constraint=models.UniqueConstraint(fields=('job', 'day'), name='job_daily_job_day_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='businessdailyapplications',
+            constraint=models.UniqueConstraint(fields=('business', 'day'), name='business_daily_business_day_uniq'),
+        ),
+    ]
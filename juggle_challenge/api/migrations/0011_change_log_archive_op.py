@@ -0,0 +1,57 @@
+"""Log the deletes of ``api.archive`` as ``archive`` changes.
+
+Archiving sets ``juggle.archiving`` in its transactions, so the trigger can
+tell rows moved to the archive tables from deleted ones.
+"""
+from django.db import migrations, models
+
+RECORD_CHANGE = """
+CREATE OR REPLACE FUNCTION record_change() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO change_log (txid, entity, object_id, op, changed_at)
+    VALUES (
+        txid_current(),
+        TG_ARGV[0],
+        CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END,
+        {op},
+        now()
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+ARCHIVE_OP = """
+        CASE
+            WHEN TG_OP = 'DELETE'
+                AND current_setting('juggle.archiving', true) = 'on'
+            THEN 'archive'
+            ELSE lower(TG_OP)
+        END"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0010_application_rollups"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="changelog",
+            name="op",
+            field=models.CharField(
+                choices=[
+                    ("insert", "Insert"),
+                    ("update", "Update"),
+                    ("delete", "Delete"),
+                    ("archive", "Archive"),
+                ],
+                max_length=7,
+            ),
+        ),
+        migrations.RunSQL(
+            sql=RECORD_CHANGE.format(op=ARCHIVE_OP.strip()),
+            reverse_sql=RECORD_CHANGE.format(op="lower(TG_OP)"),
+        ),
+    ]
@@ -0,0 +1,16 @@
+"""Index the change log by table, for the cache versions of ``api.caching``."""
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0011_change_log_archive_op"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="changelog",
+            index=models.Index(fields=["entity", "id"], name="change_log_entity_idx"),
+        ),
+    ]
@@ -1,11 +1,14 @@
 """api models"""
 from __future__ import annotations
 
-from typing import List
+from typing import Iterable, List, Optional
 
 from django.db import models
+from django.db.models import Q
+from django.db.models.functions import Upper
 from django.core import validators
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import BrinIndex, GinIndex
 from django.contrib.auth import get_user_model
 
 from .data import AVAILABILITIES, LOCATIONS, Availability
@@ -16,7 +19,22 @@ from juggle_challenge import utils
 User = get_user_model()
 
 
+def _copy(value):
+    # Arrays and JSON values can be changed in place, keep our own copy. It's
+    # shallow: changes nested in JSON values are only seen once reassigned
+    if isinstance(value, list):
+        return list(value)
+    if isinstance(value, dict):
+        return dict(value)
+    return value
+
+
 class BaseModel(models.Model):
+    """Instances loaded from the database remember their column values, so
+    ``save()`` only updates the columns that changed, plus ``updated_at``,
+    and doesn't query at all when nothing did.
+    """
+
     created_at = models.DateTimeField(default=utils.now_with_tz)
     updated_at = models.DateTimeField(default=utils.now_with_tz)
 
@@ -26,37 +44,116 @@ class BaseModel(models.Model):
     def __str__(self):
         return "{}(id={!r})".format(self.__class__.__name__, self.pk)
 
-    def save(self, *args, **kwargs):
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {}
+        instance._snapshot()
+        return instance
+
+    def _snapshot(self, fields: Optional[Iterable[str]] = None) -> None:
+        if not hasattr(self, "_loaded_values"):
+            self._loaded_values = {}
+        if fields is None:
+            attnames = [f.attname for f in self._meta.concrete_fields]
+        else:
+            attnames = [self._meta.get_field(name).attname for name in fields]
+        for attname in attnames:
+            if attname in self.__dict__:
+                self._loaded_values[attname] = _copy(self.__dict__[attname])
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self._snapshot(fields)
+
+    def changed_fields(self) -> Optional[List[str]]:
+        """Names of the fields modified since the instance was loaded or
+        saved, ``None`` for instances that aren't tracked.
+        """
+        loaded = getattr(self, "_loaded_values", None)
+        if loaded is None:
+            return None
+        return [
+            field.name
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+            and (
+                field.attname not in loaded
+                or self.__dict__[field.attname] != loaded[field.attname]
+            )
+        ]
+
+    def save(
+        self, force_insert=False, force_update=False, using=None, update_fields=None
+    ):
+        if update_fields is None and not force_insert and not self._state.adding:
+            update_fields = self.changed_fields()
+            if update_fields == []:
+                return
+
         self.updated_at = utils.now_with_tz()
-        super().save(*args, **kwargs)
+        if update_fields:
+            update_fields = {*update_fields, "updated_at"}
+        super().save(
+            force_insert=force_insert,
+            force_update=force_update,
+            using=using,
+            update_fields=update_fields,
+        )
+        self._snapshot(update_fields)
 
 
 class Business(BaseModel):
     class Meta:
         db_table = "business"
+        indexes = [
+            models.Index(
+                fields=["owner", "created_at"], name="business_owner_created_idx"
+            )
+        ]
 
     company_name = models.CharField(max_length=255)
     website = models.URLField()
 
-    owner = models.ForeignKey(User, on_delete=models.PROTECT)
+    # Indexed by the (owner, created_at) index
+    owner = models.ForeignKey(User, on_delete=models.PROTECT, db_index=False)
 
     @property
     def business_id(self):
         return self.pk
 
 
-class Job(BaseModel):
+class Skill(BaseModel):
     class Meta:
-        db_table = "job"
+        db_table = "skill"
+
+    name = models.CharField(max_length=50)
+    normalized_name = models.CharField(max_length=50, unique=True)
+
+    @property
+    def skill_id(self):
+        return self.pk
+
+
+class JobFields(BaseModel):
+    """Columns shared by live jobs, archived jobs and the view over both."""
+
+    class Meta:
+        abstract = True
+
+    class Status(models.TextChoices):
+        OPEN = "open"
+        CLOSED = "closed"
+        EXPIRED = "expired"
 
     title = models.CharField(max_length=50)
     daily_rate_range = models.DecimalField(max_digits=20, decimal_places=3)
     availability_ids = ArrayField(models.CharField(max_length=10))
     location_ids = ArrayField(models.CharField(max_length=10))
-    skills = ArrayField(models.CharField(max_length=50))
-
-    business = models.ForeignKey("Business", on_delete=models.CASCADE)
-    owner = models.ForeignKey(User, on_delete=models.PROTECT)
+    skill_ids = ArrayField(models.IntegerField(), default=list)
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.OPEN
+    )
 
     @property
     def job_id(self):
@@ -76,9 +173,77 @@ class Job(BaseModel):
         return self.name
 
 
+class Job(JobFields):
+    class Meta:
+        db_table = "job"
+        indexes = [
+            models.Index(fields=["daily_rate_range"], name="job_daily_rate_idx"),
+            GinIndex(fields=["skill_ids"], name="job_skill_ids_gin"),
+            models.Index(
+                fields=["status", "updated_at"], name="job_status_updated_idx"
+            ),
+            models.Index(fields=["owner", "created_at"], name="job_owner_created_idx"),
+            models.Index(fields=["created_at"], name="job_created_at_idx"),
+            # title filters match case insensitively
+            models.Index(Upper("title"), name="job_title_upper_idx"),
+        ]
+
+    business = models.ForeignKey("Business", on_delete=models.CASCADE)
+    # Indexed by the (owner, created_at) index
+    owner = models.ForeignKey(User, on_delete=models.PROTECT, db_index=False)
+
+
+class JobArchive(JobFields):
+    """Closed and expired jobs moved out of ``job`` by ``api.archive``.
+
+    Rows keep the id they had in ``job``.
+    """
+
+    class Meta:
+        db_table = "job_archive"
+
+    id = models.BigIntegerField(primary_key=True)
+
+    business = models.ForeignKey("Business", on_delete=models.CASCADE)
+    owner = models.ForeignKey(User, on_delete=models.PROTECT)
+
+
+class JobWithArchive(JobFields):
+    """Read-only view over ``job`` and ``job_archive``.
+
+    The view lists the job columns explicitly, so a migration that changes
+    them must recreate it.
+    """
+
+    class Meta:
+        db_table = "job_with_archive"
+        managed = False
+
+    id = models.BigIntegerField(primary_key=True)
+    archived = models.BooleanField()
+
+    business = models.ForeignKey(
+        "Business", on_delete=models.DO_NOTHING, related_name="+"
+    )
+    owner = models.ForeignKey(User, on_delete=models.DO_NOTHING, related_name="+")
+
+
 class Professional(BaseModel):
     class Meta:
         db_table = "professional"
+        indexes = [
+            models.Index(
+                fields=["daily_rate_range"], name="professional_daily_rate_idx"
+            ),
+            models.Index(
+                fields=["owner", "created_at"], name="professional_owner_created_idx"
+            ),
+            models.Index(fields=["created_at"], name="professional_created_at_idx"),
+            models.Index(Upper("email"), name="professional_email_upper_idx"),
+            # title and full_name substring filters use trigram indexes on
+            # UPPER(column), created by migration 0009 where pg_trgm is
+            # available: Django can't declare operator classes on expressions
+        ]
 
     full_name = models.CharField(max_length=255)
     email = models.CharField(
@@ -94,7 +259,8 @@ class Professional(BaseModel):
     jobs = models.ManyToManyField(
         Job, related_name="professional_list", blank=True, through="Application"
     )
-    owner = models.ForeignKey(User, on_delete=models.PROTECT)
+    # Indexed by the (owner, created_at) index
+    owner = models.ForeignKey(User, on_delete=models.PROTECT, db_index=False)
 
     @property
     def professional_id(self):
@@ -114,3 +280,137 @@ class Professional(BaseModel):
 class Application(BaseModel):
     professional = models.ForeignKey(Professional, on_delete=models.CASCADE)
     job = models.ForeignKey(Job, on_delete=models.CASCADE)
+
+    @property
+    def application_id(self):
+        return self.pk
+
+
+class ApplicationArchive(BaseModel):
+    class Meta:
+        db_table = "application_archive"
+
+    id = models.BigIntegerField(primary_key=True)
+    professional = models.ForeignKey(Professional, on_delete=models.CASCADE)
+    job = models.ForeignKey(JobArchive, on_delete=models.CASCADE)
+
+
+class JobDailyApplications(models.Model):
+    """Applications received by a job per day, kept by ``api.rollups``.
+
+    Rows outlive their job: archived and deleted jobs keep counting in the
+    history of their business, so ``job`` isn't a database constraint.
+    """
+
+    class Meta:
+        db_table = "job_daily_applications"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["job", "day"], name="job_daily_job_day_uniq"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["business", "day"], name="job_daily_business_day_idx")
+        ]
+
+    # Indexed by the (job, day) unique constraint
+    job = models.ForeignKey(
+        Job,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        related_name="+",
+    )
+    # Indexed by the (business, day) index
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, db_index=False)
+    day = models.DateField()
+    applications = models.PositiveIntegerField(default=0)
+
+
+class BusinessDailyApplications(models.Model):
+    """Applications received by all jobs of a business per day, kept by
+    ``api.rollups``.
+    """
+
+    class Meta:
+        db_table = "business_daily_applications"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["business", "day"], name="business_daily_business_day_uniq"
+            )
+        ]
+
+    # Indexed by the (business, day) unique constraint
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, db_index=False)
+    day = models.DateField()
+    applications = models.PositiveIntegerField(default=0)
+
+
+class Task(BaseModel):
+    class Meta:
+        db_table = "task"
+        indexes = [
+            models.Index(
+                fields=["run_at"],
+                name="task_pending_run_at_idx",
+                condition=Q(status__in=["queued", "running"]),
+            )
+        ]
+
+    class Status(models.TextChoices):
+        QUEUED = "queued"
+        RUNNING = "running"
+        SUCCEEDED = "succeeded"
+        FAILED = "failed"
+
+    name = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict)
+    status = models.CharField(
+        max_length=20, choices=Status.choices, default=Status.QUEUED
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    # Earliest time to run a queued task, or the lease expiry of a running one
+    run_at = models.DateTimeField(default=utils.now_with_tz)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    owner = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+
+    @property
+    def task_id(self):
+        return self.pk
+
+
+class ChangeLog(models.Model):
+    """Row changes of the synced tables, written by database triggers.
+
+    ``txid`` is the id of the writing transaction; see ``api.changes`` for
+    how it gives readers a consistent commit order.
+    """
+
+    class Meta:
+        db_table = "change_log"
+        indexes = [
+            models.Index(fields=["txid", "id"], name="change_log_cursor_idx"),
+            # Latest change of a table, see ``api.caching``
+            models.Index(fields=["entity", "id"], name="change_log_entity_idx"),
+            # The table is append only, a BRIN index is enough for pruning
+            BrinIndex(fields=["changed_at"], name="change_log_changed_at_brin"),
+        ]
+
+    class Op(models.TextChoices):
+        INSERT = "insert"
+        UPDATE = "update"
+        DELETE = "delete"
+        # Deleted by ``api.archive`` after copying it to the archive tables
+        ARCHIVE = "archive"
+
+    id = models.BigAutoField(primary_key=True)
+    txid = models.BigIntegerField()
+    entity = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    op = models.CharField(max_length=7, choices=Op.choices)
+    changed_at = models.DateTimeField()
@@ -0,0 +1,120 @@
+"""Monthly range partitions of the Application table on ``created_at``.
+
+Partitions are named ``<table>_pYYYYMM``. A default partition catches rows
+outside every monthly range, so inserts never fail, but it should stay empty:
+keep future partitions created ahead of time with the
+``manage_application_partitions`` command.
+"""
+from __future__ import annotations
+
+import datetime
+import re
+from typing import Dict, List
+
+from django.db import connection, transaction
+
+from juggle_challenge import utils
+
+from .models import Application
+
+ARCHIVE_SCHEMA = "archive"
+
+_PARTITION_RE = re.compile(r"_p(\d{4})(\d{2})$")
+
+
+def table_name() -> str:
+    return Application._meta.db_table
+
+
+def month_start(value: datetime.date) -> datetime.date:
+    return datetime.date(value.year, value.month, 1)
+
+
+def add_months(month: datetime.date, months: int) -> datetime.date:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: datetime.date) -> str:
+    return f"{table_name()}_p{month:%Y%m}"
+
+
+def list_partitions() -> Dict[datetime.date, str]:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+            """,
+            [table_name()],
+        )
+        names = [name for name, in cursor.fetchall()]
+
+    partitions = {}
+    for name in names:
+        match = _PARTITION_RE.search(name)
+        if match:
+            year, month = map(int, match.groups())
+            partitions[datetime.date(year, month, 1)] = name
+    return partitions
+
+
+def create_partition(month: datetime.date) -> str:
+    qn = connection.ops.quote_name
+    name = partition_name(month)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {qn(name)}
+            PARTITION OF {qn(table_name())}
+            FOR VALUES FROM (%s) TO (%s)
+            """,
+            [
+                f"{month:%Y-%m-%d} 00:00:00+00",
+                f"{add_months(month, 1):%Y-%m-%d} 00:00:00+00",
+            ],
+        )
+    return name
+
+
+def ensure_partitions(months_ahead: int) -> List[str]:
+    """Create the partitions from the current month to ``months_ahead``."""
+    existing = list_partitions()
+    current = month_start(utils.now_with_tz().date())
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if month not in existing:
+            created.append(create_partition(month))
+    return created
+
+
+def detach_partitions(retention_months: int, drop: bool = False) -> List[str]:
+    """Detach the partitions older than ``retention_months``.
+
+    Detached partitions are moved to the ``archive`` schema, or dropped.
+    """
+    qn = connection.ops.quote_name
+    oldest_kept = add_months(
+        month_start(utils.now_with_tz().date()), -retention_months
+    )
+    detached = []
+    for month, name in sorted(list_partitions().items()):
+        if month >= oldest_kept:
+            continue
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"ALTER TABLE {qn(table_name())} DETACH PARTITION {qn(name)}"
+            )
+            if drop:
+                cursor.execute(f"DROP TABLE {qn(name)}")
+            else:
+                cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {qn(ARCHIVE_SCHEMA)}")
+                cursor.execute(
+                    f"ALTER TABLE {qn(name)} SET SCHEMA {qn(ARCHIVE_SCHEMA)}"
+                )
+        detached.append(name)
+    return detached
@@ -0,0 +1,145 @@
+"""Daily application counts per job and per business.
+
+Grouping over every application of a business gets slower as its history
+grows. Instead ``job_apply`` adds each application to the counts of its day
+in ``JobDailyApplications`` and ``BusinessDailyApplications``, in the
+transaction that inserts it, so the counts are exact and reading a range of
+days costs one row per day. ``backfill`` rebuilds the counts from the live
+and archived applications.
+
+The counts are of applications received: they keep those of archived and
+deleted jobs, until a backfill over those days drops the deleted ones.
+"""
+from __future__ import annotations
+
+import datetime
+from typing import Dict, Optional
+
+from django.db import connection, transaction
+
+from juggle_challenge import utils
+
+from .models import (
+    Application,
+    ApplicationArchive,
+    Business,
+    BusinessDailyApplications,
+    Job,
+    JobDailyApplications,
+    JobWithArchive,
+)
+
+JOB_TABLE = JobDailyApplications._meta.db_table
+BUSINESS_TABLE = BusinessDailyApplications._meta.db_table
+
+
+def record_application(job: Job, day: datetime.date) -> None:
+    """Count an application to ``job`` received on ``day``.
+
+    Call it in the transaction inserting the application. Concurrent
+    applications to jobs of the same business wait for each other on the
+    business row of the day until they commit.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {JOB_TABLE} (job_id, business_id, day, applications)
+            VALUES (%s, %s, %s, 1)
+            ON CONFLICT (job_id, day)
+            DO UPDATE SET applications = {JOB_TABLE}.applications + 1
+            """,
+            [job.pk, job.business_id, day],
+        )
+        cursor.execute(
+            f"""
+            INSERT INTO {BUSINESS_TABLE} (business_id, day, applications)
+            VALUES (%s, %s, 1)
+            ON CONFLICT (business_id, day)
+            DO UPDATE SET applications = {BUSINESS_TABLE}.applications + 1
+            """,
+            [job.business_id, day],
+        )
+
+
+def backfill(since: Optional[datetime.date] = None) -> dict:
+    """Recount the applications received from ``since``, or ever."""
+    since = since or datetime.date.min
+    since_dt = datetime.datetime.combine(since, datetime.time(), datetime.timezone.utc)
+    params = dict(since=since, since_dt=since_dt)
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Applications committed before the lock are counted here, later
+        # ones wait for the backfill to commit before adding themselves
+        cursor.execute(f"LOCK TABLE {JOB_TABLE}, {BUSINESS_TABLE} IN EXCLUSIVE MODE")
+        cursor.execute(f"DELETE FROM {JOB_TABLE} WHERE day >= %(since)s", params)
+        cursor.execute(
+            f"""
+            INSERT INTO {JOB_TABLE} (job_id, business_id, day, applications)
+            SELECT application.job_id, job.business_id,
+                (application.created_at AT TIME ZONE 'UTC')::date AS day,
+                COUNT(*)
+            FROM (
+                SELECT job_id, created_at FROM {Application._meta.db_table}
+                WHERE created_at >= %(since_dt)s
+                UNION ALL
+                SELECT job_id, created_at FROM {ApplicationArchive._meta.db_table}
+                WHERE created_at >= %(since_dt)s
+            ) application
+            JOIN {JobWithArchive._meta.db_table} job ON job.id = application.job_id
+            GROUP BY application.job_id, job.business_id, day
+            """,
+            params,
+        )
+        jobs = cursor.rowcount
+        cursor.execute(f"DELETE FROM {BUSINESS_TABLE} WHERE day >= %(since)s", params)
+        cursor.execute(
+            f"""
+            INSERT INTO {BUSINESS_TABLE} (business_id, day, applications)
+            SELECT business_id, day, SUM(applications)
+            FROM {JOB_TABLE}
+            WHERE day >= %(since)s
+            GROUP BY business_id, day
+            """,
+            params,
+        )
+        businesses = cursor.rowcount
+    return dict(job_days=jobs, business_days=businesses)
+
+
+def business_stats(business: Business, days: int) -> dict:
+    """Applications received by ``business`` over the last ``days`` days, in
+    total, per day and per job and day.
+    """
+    last_day = utils.now_with_tz().date()
+    first_day = last_day - datetime.timedelta(days=days - 1)
+    per_day = dict(
+        BusinessDailyApplications.objects.filter(
+            business=business, day__range=(first_day, last_day)
+        ).values_list("day", "applications")
+    )
+
+    # Jobs only list the days they received applications on
+    jobs: Dict[int, dict] = {}
+    for job_id, day, count in (
+        JobDailyApplications.objects.filter(
+            business=business, day__range=(first_day, last_day)
+        )
+        .order_by("day")
+        .values_list("job_id", "day", "applications")
+    ):
+        job = jobs.setdefault(job_id, dict(job_id=job_id, applications=0, days=[]))
+        job["applications"] += count
+        job["days"].append(dict(day=day, applications=count))
+
+    return dict(
+        business_id=business.pk,
+        first_day=first_day,
+        last_day=last_day,
+        applications=sum(per_day.values()),
+        days=[
+            dict(day=day, applications=per_day.get(day, 0))
+            for day in (first_day + datetime.timedelta(days=n) for n in range(days))
+        ],
+        jobs=sorted(
+            jobs.values(), key=lambda job: (-job["applications"], job["job_id"])
+        ),
+    )
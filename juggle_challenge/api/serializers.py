@@ -1,18 +1,22 @@
 from __future__ import annotations
 
 from django.contrib.auth.models import User as AuthUser
-from django.contrib.auth.hashers import make_password
-from django.db import transaction
+from django.db import models, transaction
 
 from rest_framework import serializers
 
-from .models import Job, Professional, Business
+from juggle_challenge import hashing
+from juggle_challenge.serializers import SparseFieldsMixin
+
+from . import skills
+from .models import Application, Job, Professional, Business, Task
 
 
 class AuthUserSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
+        # Hashed before the transaction starts, which shouldn't wait on it
+        validated_data["password"] = hashing.make_password(validated_data["password"])
         with transaction.atomic():
-            validated_data["password"] = make_password(validated_data["password"])
             instance = super().create(validated_data)
 
             return instance
@@ -40,12 +44,44 @@ class LocationSerializer(serializers.Serializer):
     description = serializers.CharField(read_only=True)
 
 
-class JobSerializer(serializers.ModelSerializer):
+class SkillsField(serializers.ListField):
+    """Skill names on the wire, interned skill ids in the model.
+
+    Validates to the names, the serializer interns them when saving.
+    """
+
+    child = serializers.CharField(max_length=50)
+
+    def to_representation(self, data):
+        # Resolved for the whole list by JobListSerializer
+        names = getattr(self.parent, "_skill_names", None)
+        if names is None:
+            return skills.names(data)
+        return [names[pk] for pk in data if pk in names]
+
+
+class JobListSerializer(serializers.ListSerializer):
+    """Resolves the skill names of all the jobs with a single lookup."""
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        jobs = list(iterable)
+        self.child._skill_names = None
+        if any(field.field_name == "skills" for field in self.child._readable_fields):
+            self.child._skill_names = skills.names_by_id(
+                {pk for job in jobs for pk in job.skill_ids}
+            )
+        return super().to_representation(jobs)
+
+
+class JobSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     availabilities = AvailabilitySerializer(read_only=True, many=True)
     locations = LocationSerializer(read_only=True, many=True)
+    skills = SkillsField(source="skill_ids")
 
     class Meta:
         model = Job
+        list_serializer_class = JobListSerializer
         fields = (
             "job_id",
             "title",
@@ -53,6 +89,7 @@ class JobSerializer(serializers.ModelSerializer):
             "availability_ids",
             "location_ids",
             "skills",
+            "status",
             "availabilities",
             "locations",
         )
@@ -61,9 +98,28 @@ class JobSerializer(serializers.ModelSerializer):
             "availability_ids": {"write_only": True},
             "location_ids": {"write_only": True},
         }
+        source_fields = {
+            "job_id": ["id"],
+            "skills": ["skill_ids"],
+            "availabilities": ["availability_ids"],
+            "locations": ["location_ids"],
+        }
 
+    def _intern_skills(self, validated_data):
+        if "skill_ids" in validated_data:
+            validated_data["skill_ids"] = skills.intern(validated_data["skill_ids"])
+        return validated_data
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            return super().create(self._intern_skills(validated_data))
 
-class ProfessionalSerializer(serializers.ModelSerializer):
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            return super().update(instance, self._intern_skills(validated_data))
+
+
+class ProfessionalSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     jobs = JobSerializer(read_only=True, many=True)
     availabilities = AvailabilitySerializer(read_only=True, many=True)
     locations = LocationSerializer(read_only=True, many=True)
@@ -87,3 +143,34 @@ class ProfessionalSerializer(serializers.ModelSerializer):
             "availability_ids": {"write_only": True},
             "location_ids": {"write_only": True},
         }
+        source_fields = {
+            "professional_id": ["id"],
+            "availabilities": ["availability_ids"],
+            "locations": ["location_ids"],
+        }
+        expandable_fields = {"jobs": JobSerializer}
+
+
+class ApplicationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Application
+        fields = ("application_id", "professional_id", "job_id", "created_at")
+        read_only_fields = fields
+
+
+class TaskSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Task
+        fields = (
+            "task_id",
+            "name",
+            "status",
+            "attempts",
+            "max_attempts",
+            "result",
+            "last_error",
+            "created_at",
+            "started_at",
+            "finished_at",
+        )
+        read_only_fields = fields
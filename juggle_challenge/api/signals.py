@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import similarity
+from .models import Job
+
+
+@receiver(post_save, sender=Job)
+def update_similarity_index(sender, instance, **kwargs):
+    transaction.on_commit(lambda: similarity.job_saved(instance))
+
+
+@receiver(post_delete, sender=Job)
+def remove_from_similarity_index(sender, instance, **kwargs):
+    transaction.on_commit(lambda: similarity.job_deleted(instance))
@@ -0,0 +1,423 @@
+"""Similar open jobs by MinHash locality-sensitive hashing.
+
+A job is described by its skills and the words of its title. Each job gets a
+MinHash signature of ``SIMILAR_JOBS_PERMUTATIONS`` values, whose share of
+equal values between two jobs estimates the Jaccard similarity of their
+features. Signatures are cut in ``SIMILAR_JOBS_BANDS`` bands and jobs sharing
+any band are candidates, so a lookup is a binary search per band followed by
+scoring a few hundred candidates instead of a scan of every job.
+
+The index is built in batch by ``manage.py build_similarity_index``, or the
+``build_similarity_index`` task, and saved to ``SIMILAR_JOBS_INDEX_PATH``,
+which processes load on first use. Until it exists lookups fail with a 503
+and queue the task: a request never builds the index itself. Job saves
+are applied to the index of the saving process right away, and every process
+catches up with the others' writes through the change feed. Changed jobs are
+kept in a small overlay and merged into the sorted arrays once there are
+``SIMILAR_JOBS_MERGE_THRESHOLD`` of them.
+"""
+from __future__ import annotations
+
+import datetime
+import functools
+import itertools
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from django.conf import settings
+from rest_framework.exceptions import APIException
+
+from juggle_challenge import utils
+
+from . import changes, taskqueue
+from .models import Job, Task
+
+logger = logging.getLogger(__name__)
+
+# Bump when features or hashing change, saved indexes are then rebuilt
+VERSION = 1
+
+SEED = 20210726
+
+WORD_RE = re.compile(r"\w+")
+
+BUILD_BATCH_SIZE = 10000
+
+SKILL_FEATURE = 1 << 32
+
+BUILD_TASK = "build_similarity_index"
+
+
+class IndexUnavailable(APIException):
+    status_code = 503
+    default_detail = "Similar jobs are being indexed, please try again later."
+    default_code = "similarity_index_unavailable"
+
+
+@functools.lru_cache(maxsize=100000)
+def _word_feature(word: str) -> int:
+    return zlib.crc32(word.encode())
+
+
+def features(title: str, skill_ids: Iterable[int]) -> Set[int]:
+    """Title words hash below 2 ** 32, skills above."""
+    words = {_word_feature(word) for word in WORD_RE.findall(title.casefold())}
+    return words | {SKILL_FEATURE | skill_id for skill_id in skill_ids}
+
+
+class SimilarityIndex:
+    def __init__(self, permutations: int, bands: int):
+        if permutations % bands:
+            raise ValueError("permutations must be a multiple of bands")
+        self.permutations = permutations
+        self.bands = bands
+        rng = np.random.RandomState(SEED)
+        # Multiply-shift hashing: the high 32 bits of a * x + b, with a odd
+        self._a = rng.randint(0, 2 ** 63, permutations, dtype=np.uint64) * 2 + 1
+        self._b = rng.randint(0, 2 ** 63, permutations, dtype=np.uint64)
+
+        self.ids = np.empty(0, dtype=np.int64)
+        self.signatures = np.empty((0, permutations), dtype=np.uint32)
+        # Per band, the band keys of all jobs sorted and their positions
+        self.band_keys = np.empty((bands, 0), dtype=np.uint64)
+        self.band_positions = np.empty((bands, 0), dtype=np.int32)
+
+        # Jobs changed since the arrays were built: base entries of ``stale``
+        # jobs are ignored, ``pending`` holds the current signatures
+        self.stale: Set[int] = set()
+        self.pending: Dict[int, np.ndarray] = {}
+        self.cursor: changes.Cursor = (0, 0)
+        self.built_at: Optional[datetime.datetime] = None
+        self.refreshed_at = 0.0
+        self.lock = threading.RLock()
+
+    def signatures_of(self, feature_sets: List[Set[int]]) -> np.ndarray:
+        """MinHash signatures of ``feature_sets``, none of them empty."""
+        lengths = [len(values) for values in feature_sets]
+        hashes = np.fromiter(
+            itertools.chain.from_iterable(feature_sets),
+            dtype=np.uint64,
+            count=sum(lengths),
+        )
+        # uint64 arithmetic wraps around, which multiply-shift relies on
+        with np.errstate(over="ignore"):
+            values = (hashes[:, None] * self._a + self._b) >> np.uint64(32)
+        offsets = np.cumsum([0] + lengths[:-1])
+        return np.minimum.reduceat(values.astype(np.uint32), offsets, axis=0)
+
+    def band_keys_of(self, signatures: np.ndarray) -> np.ndarray:
+        """One uint64 key per band and signature, shaped (bands, n)."""
+        rows = signatures.reshape(len(signatures), self.bands, -1).astype(np.uint64)
+        keys = np.zeros((len(signatures), self.bands), dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            for column in range(rows.shape[2]):
+                keys = (keys * np.uint64(0x100000001B3)) ^ rows[:, :, column]
+        return keys.T
+
+    def signature(self, title: str, skill_ids: Iterable[int]) -> Optional[np.ndarray]:
+        values = features(title, skill_ids)
+        return self.signatures_of([values])[0] if values else None
+
+    def _set_arrays(self, ids: np.ndarray, signatures: np.ndarray) -> None:
+        keys = self.band_keys_of(signatures)
+        positions = np.argsort(keys, axis=1, kind="stable").astype(np.int32)
+        self.band_keys = np.take_along_axis(keys, positions, axis=1)
+        self.band_positions = positions
+        self.ids = ids
+        self.signatures = signatures
+        self.stale = set()
+        self.pending = {}
+
+    def build(self, rows: Iterable[Tuple[int, str, List[int]]]) -> None:
+        """Index the ``(id, title, skill_ids)`` of ``rows``."""
+        id_chunks, signature_chunks = [], []
+        batch: List[Tuple[int, Set[int]]] = []
+
+        def flush():
+            id_chunks.append(np.array([pk for pk, _ in batch], dtype=np.int64))
+            signature_chunks.append(self.signatures_of([values for _, values in batch]))
+            batch.clear()
+
+        for pk, title, skill_ids in rows:
+            values = features(title, skill_ids)
+            if values:
+                batch.append((pk, values))
+            if len(batch) >= BUILD_BATCH_SIZE:
+                flush()
+        if batch:
+            flush()
+
+        with self.lock:
+            if id_chunks:
+                self._set_arrays(
+                    np.concatenate(id_chunks), np.concatenate(signature_chunks)
+                )
+            else:
+                self._set_arrays(
+                    np.empty(0, dtype=np.int64),
+                    np.empty((0, self.permutations), dtype=np.uint32),
+                )
+            self.built_at = utils.now_with_tz()
+
+    def merge(self) -> None:
+        """Fold the changed jobs into the sorted arrays."""
+        with self.lock:
+            keep = ~np.isin(self.ids, list(self.stale | set(self.pending)))
+            ids = np.concatenate(
+                [self.ids[keep], np.fromiter(self.pending, dtype=np.int64)]
+            )
+            signatures = np.concatenate(
+                [
+                    self.signatures[keep],
+                    np.array(list(self.pending.values()), dtype=np.uint32).reshape(
+                        -1, self.permutations
+                    ),
+                ]
+            )
+            self._set_arrays(ids, signatures)
+
+    def update(self, pk: int, title: str, skill_ids: List[int], status: str) -> None:
+        with self.lock:
+            self.stale.add(pk)
+            signature = None
+            if status == Job.Status.OPEN:
+                signature = self.signature(title, skill_ids)
+            if signature is None:
+                self.pending.pop(pk, None)
+            else:
+                self.pending[pk] = signature
+            if len(self.pending) >= settings.SIMILAR_JOBS_MERGE_THRESHOLD:
+                self.merge()
+
+    def remove(self, pk: int) -> None:
+        with self.lock:
+            self.stale.add(pk)
+            self.pending.pop(pk, None)
+
+    def refresh(self) -> None:
+        """Apply the jobs changed by any process since the last refresh."""
+        with self.lock:
+            while True:
+                rows, cursor, has_more = changes.read_rows(
+                    self.cursor, settings.CHANGES_MAX_PAGE_SIZE, entities=["job"]
+                )
+                ids = {row.object_id for row in rows}
+                jobs = {
+                    pk: (title, skill_ids, status)
+                    for pk, title, skill_ids, status in Job.objects.filter(
+                        pk__in=ids
+                    ).values_list("pk", "title", "skill_ids", "status")
+                }
+                for pk in ids:
+                    if pk in jobs:
+                        self.update(pk, *jobs[pk])
+                    else:
+                        self.remove(pk)
+                self.cursor = cursor
+                if not has_more:
+                    break
+            self.refreshed_at = time.monotonic()
+
+    def query(
+        self, signature: np.ndarray, limit: int, exclude: Optional[int] = None
+    ) -> List[Tuple[int, float]]:
+        """``(id, similarity)`` of the ``limit`` most similar jobs."""
+        with self.lock:
+            keys = self.band_keys_of(signature[None])[:, 0]
+            max_bucket = settings.SIMILAR_JOBS_MAX_BUCKET_SIZE
+            candidates = []
+            for band, key in enumerate(keys):
+                start = np.searchsorted(self.band_keys[band], key, side="left")
+                end = np.searchsorted(self.band_keys[band], key, side="right")
+                # Crowded buckets only contribute their most recent jobs
+                start = max(start, end - max_bucket)
+                candidates.append(self.band_positions[band, start:end])
+            positions = np.unique(np.concatenate(candidates))
+            ids = self.ids[positions]
+            scores = (self.signatures[positions] == signature).mean(axis=1)
+            if self.stale:
+                keep = ~np.isin(ids, list(self.stale))
+                ids, scores = ids[keep], scores[keep]
+
+            if self.pending:
+                pending_ids = np.fromiter(self.pending, dtype=np.int64)
+                pending_signatures = np.array(list(self.pending.values()))
+                collide = (self.band_keys_of(pending_signatures).T == keys).any(axis=1)
+                ids = np.concatenate([ids, pending_ids[collide]])
+                scores = np.concatenate(
+                    [
+                        scores,
+                        (pending_signatures[collide] == signature).mean(axis=1),
+                    ]
+                )
+
+        keep = ids != exclude
+        ids, scores = ids[keep], scores[keep]
+        # Highest similarity first, then the most recent job
+        top = np.lexsort((-ids, -scores))[:limit]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+    def save(self, path: str) -> None:
+        with self.lock:
+            self.merge()
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            meta = dict(
+                version=VERSION,
+                permutations=self.permutations,
+                bands=self.bands,
+                cursor=self.cursor,
+                built_at=self.built_at.isoformat(),
+            )
+            # Unique in the same directory, so concurrent saves don't write
+            # to the same file and the rename is atomic
+            fd, tmp_path = tempfile.mkstemp(
+                prefix=f"{os.path.basename(path)}.",
+                suffix=".tmp",
+                dir=os.path.dirname(path) or ".",
+            )
+            try:
+                # mkstemp creates it readable by this user only
+                os.fchmod(fd, 0o644)
+                with os.fdopen(fd, "wb") as fileobj:
+                    np.savez(
+                        fileobj,
+                        meta=np.array(json.dumps(meta)),
+                        ids=self.ids,
+                        signatures=self.signatures,
+                        band_keys=self.band_keys,
+                        band_positions=self.band_positions,
+                    )
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+
+    @classmethod
+    def load(cls, path: str) -> Optional[SimilarityIndex]:
+        """The index saved at ``path``, None if missing or unusable."""
+        try:
+            data = np.load(path)
+        except FileNotFoundError:
+            return None
+        with data:
+            meta = json.loads(str(data["meta"]))
+            built_at = datetime.datetime.fromisoformat(meta["built_at"])
+            retention = datetime.timedelta(days=settings.CHANGE_LOG_RETENTION_DAYS)
+            if (
+                meta["version"] != VERSION
+                or meta["permutations"] != settings.SIMILAR_JOBS_PERMUTATIONS
+                or meta["bands"] != settings.SIMILAR_JOBS_BANDS
+                # Changes since then may have been pruned from the change log
+                or built_at < utils.now_with_tz() - retention
+            ):
+                logger.warning("Ignoring outdated similar jobs index %s", path)
+                return None
+            index = cls(meta["permutations"], meta["bands"])
+            index.ids = data["ids"]
+            index.signatures = data["signatures"]
+            index.band_keys = data["band_keys"]
+            index.band_positions = data["band_positions"]
+        index.cursor = tuple(meta["cursor"])
+        index.built_at = built_at
+        return index
+
+
+def build() -> SimilarityIndex:
+    """Index every open job."""
+    index = SimilarityIndex(
+        settings.SIMILAR_JOBS_PERMUTATIONS, settings.SIMILAR_JOBS_BANDS
+    )
+    # Changes after this cursor are applied again on refresh, which is harmless
+    index.cursor = changes.latest_cursor()
+    index.build(
+        Job.objects.filter(status=Job.Status.OPEN)
+        .order_by("pk")
+        .values_list("pk", "title", "skill_ids")
+        .iterator(chunk_size=BUILD_BATCH_SIZE)
+    )
+    return index
+
+
+@taskqueue.task(BUILD_TASK, max_attempts=1)
+def build_and_save() -> dict:
+    """Build the index into ``SIMILAR_JOBS_INDEX_PATH``, which the workers
+    running it must share with the API processes.
+    """
+    index = build()
+    index.save(settings.SIMILAR_JOBS_INDEX_PATH)
+    return dict(jobs=len(index.ids))
+
+
+_index: Optional[SimilarityIndex] = None
+_index_lock = threading.Lock()
+# When this process last found no usable index
+_missing_at: Optional[float] = None
+
+
+def _queue_build() -> None:
+    pending = Task.objects.filter(
+        name=BUILD_TASK, status__in=[Task.Status.QUEUED, Task.Status.RUNNING]
+    )
+    if not pending.exists():
+        logger.warning("No similar jobs index, queueing a build")
+        build_and_save.enqueue()
+
+
+def get_index() -> SimilarityIndex:
+    """This process's index, loaded on first use and kept fresh.
+
+    Raises ``IndexUnavailable`` until a saved index exists, queueing a build.
+    """
+    global _index, _missing_at
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                # Look for the file again once per refresh period
+                if (
+                    _missing_at is not None
+                    and time.monotonic() - _missing_at
+                    < settings.SIMILAR_JOBS_REFRESH_SECONDS
+                ):
+                    raise IndexUnavailable()
+                _index = SimilarityIndex.load(settings.SIMILAR_JOBS_INDEX_PATH)
+                if _index is None:
+                    _missing_at = time.monotonic()
+                    _queue_build()
+                    raise IndexUnavailable()
+    if time.monotonic() - _index.refreshed_at > settings.SIMILAR_JOBS_REFRESH_SECONDS:
+        _index.refresh()
+    return _index
+
+
+def preload() -> None:
+    """Load the saved index, e.g. before forking server workers."""
+    global _index
+    if _index is None:
+        _index = SimilarityIndex.load(settings.SIMILAR_JOBS_INDEX_PATH)
+
+
+def similar_jobs(job: Job, limit: int) -> List[Tuple[int, float]]:
+    index = get_index()
+    signature = index.signature(job.title, job.skill_ids)
+    if signature is None:
+        return []
+    return index.query(signature, limit, exclude=job.pk)
+
+
+def job_saved(job: Job) -> None:
+    # Processes that haven't loaded the index catch up when they do
+    if _index is not None:
+        _index.update(job.pk, job.title, job.skill_ids, job.status)
+
+
+def job_deleted(job: Job) -> None:
+    if _index is not None:
+        _index.remove(job.pk)
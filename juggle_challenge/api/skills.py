@@ -0,0 +1,101 @@
+"""Interned skill names.
+
+Jobs store skills as arrays of ``Skill`` ids. Skill rows never change once
+created, so every process keeps a two-way name/id cache of committed skills
+and only hits the database for names it hasn't seen yet.
+"""
+from __future__ import annotations
+
+import functools
+import threading
+from typing import Dict, Iterable, List
+
+from django.db import transaction
+
+from .models import Skill
+
+_lock = threading.Lock()
+_ids_by_normalized_name: Dict[str, int] = {}
+_names_by_id: Dict[int, str] = {}
+
+
+def normalize(name: str) -> str:
+    return " ".join(name.split()).casefold()
+
+
+def _remember(skills: Iterable[Skill]) -> None:
+    with _lock:
+        for skill in skills:
+            _ids_by_normalized_name[skill.normalized_name] = skill.pk
+            _names_by_id[skill.pk] = skill.name
+
+
+def _fetch(queryset) -> List[Skill]:
+    skills = list(queryset)
+    # Rows read in a transaction may be its own inserts, only cache them
+    # once they are committed (right away outside of a transaction)
+    transaction.on_commit(functools.partial(_remember, skills))
+    return skills
+
+
+def _load(normalized_names: Iterable[str]) -> Dict[str, int]:
+    """Ids of the existing skills among ``normalized_names``."""
+    ids = {}
+    missing = []
+    for name in normalized_names:
+        if name in _ids_by_normalized_name:
+            ids[name] = _ids_by_normalized_name[name]
+        else:
+            missing.append(name)
+    if missing:
+        for skill in _fetch(Skill.objects.filter(normalized_name__in=missing)):
+            ids[skill.normalized_name] = skill.pk
+    return ids
+
+
+def lookup(names: Iterable[str]) -> List[int]:
+    """Ids of the known skills among ``names``, unknown names are skipped."""
+    normalized_names = [normalize(name) for name in names]
+    ids = _load(normalized_names)
+    return [ids[n] for n in normalized_names if n in ids]
+
+
+def intern(names: Iterable[str]) -> List[int]:
+    """Ids for ``names``, creating the skills that don't exist yet.
+
+    Call it when saving: skills are created in the current transaction.
+    """
+    display_names = {}
+    for name in names:
+        display_names.setdefault(normalize(name), " ".join(name.split()))
+    ids = _load(display_names)
+
+    missing = [n for n in display_names if n not in ids]
+    if missing:
+        Skill.objects.bulk_create(
+            [Skill(name=display_names[n], normalized_name=n) for n in missing],
+            ignore_conflicts=True,
+        )
+        ids.update(_load(missing))
+    return [ids[n] for n in display_names]
+
+
+def names_by_id(skill_ids: Iterable[int]) -> Dict[int, str]:
+    skill_ids = list(skill_ids)
+    found = {pk: _names_by_id[pk] for pk in skill_ids if pk in _names_by_id}
+    missing = [pk for pk in skill_ids if pk not in found]
+    if missing:
+        found.update(
+            (skill.pk, skill.name)
+            for skill in _fetch(Skill.objects.filter(pk__in=missing))
+        )
+    return {pk: found[pk] for pk in skill_ids if pk in found}
+
+
+def names(skill_ids: Iterable[int]) -> List[str]:
+    return list(names_by_id(skill_ids).values())
+
+
+def preload() -> None:
+    """Load the whole skill dictionary, e.g. before forking server workers."""
+    _remember(Skill.objects.all())
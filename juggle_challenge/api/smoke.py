@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import copy
+import logging
 import random
 import requests
 import time
@@ -11,6 +12,7 @@ from juggle_challenge.rest_api import BearerAuth, Client
 api = Client(
     base_url="http://127.0.0.1:8000/",
     exception_raise_enabled=False,
+    log_bodies=True,
 )
 
 
@@ -77,6 +79,7 @@ def test():
         job_id=job_id,
         locations=[{"location_id": "1", "description": "onsite"}],
         daily_rate_range="22.450",
+        status="open",
         availabilities=[{"availability_id": "2", "description": "3-4 days/wk"}],
     )
 
@@ -116,7 +119,6 @@ def test():
         locations=[{"location_id": "1", "description": "onsite"}],
         daily_rate_range="22.450",
         availabilities=[{"availability_id": "2", "description": "3-4 days/wk"}],
-        jobs=[],
     )
 
     assert response.json() == professional_serialized, professional_serialized
@@ -131,9 +133,9 @@ def test():
 
     assert response.json() == [job_serialized], job_serialized
 
-    # Get applications for a Job
+    # Get applications for a Job, embedding each professional's jobs
     job_url = "v1/jobs/"
-    job_professionals_url = f"{job_url}{job_id}/professionals/"
+    job_professionals_url = f"{job_url}{job_id}/professionals/?expand=jobs"
 
     response = api(job_professionals_url).get()
 
@@ -173,4 +175,6 @@ def test():
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG, format="%(message)s")
+    logging.getLogger("urllib3").setLevel(logging.WARNING)
     test()
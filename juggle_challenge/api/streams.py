@@ -0,0 +1,90 @@
+"""Server-sent event streams of new job applications.
+
+``job_apply`` publishes every application on ``APPLICATIONS_CHANNEL`` and
+``/v1/jobs/{id}/events/`` and ``/v1/business/{id}/events/`` stream the ones
+for a job or for all jobs of a business, to its owner or staff like
+``IsOwner``. The streams are served by the ASGI application only, see
+``juggle_challenge.asgi``.
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections
+
+from juggle_challenge import events, utils
+
+from .models import Business, Job
+
+User = get_user_model()
+
+APPLICATIONS_CHANNEL = "job_applications"
+
+
+def notify_application(professional, job) -> None:
+    events.notify(
+        APPLICATIONS_CHANNEL,
+        dict(
+            job_id=job.pk,
+            business_id=job.business_id,
+            professional=dict(
+                professional_id=professional.pk,
+                full_name=professional.full_name,
+                title=professional.title,
+                daily_rate_range=professional.daily_rate_range,
+            ),
+            created_at=utils.now_with_tz(),
+        ),
+    )
+
+
+@sync_to_async
+def _can_view(model, pk, user_id) -> Optional[bool]:
+    """Whether ``user_id`` owns the object or is staff, None if it doesn't
+    exist.
+    """
+    # No request_started/finished signals here to recycle the connection
+    close_old_connections()
+    owner_id = model.objects.filter(pk=pk).values_list("owner_id", flat=True).first()
+    if owner_id is None:
+        return None
+    if owner_id == user_id:
+        return True
+    return User.objects.filter(pk=user_id, is_staff=True).exists()
+
+
+async def _stream_applications(scope, receive, send, model, pk, key):
+    user_id = events.authenticate(scope)
+    if user_id is None:
+        detail = "Authentication credentials were not provided."
+        return await events.send_json(send, 401, {"detail": detail})
+    pk = int(pk)
+    allowed = await _can_view(model, pk, user_id)
+    if allowed is None:
+        return await events.send_json(send, 404, {"detail": "Not found."})
+    if not allowed:
+        detail = "You do not have permission to perform this action."
+        return await events.send_json(send, 403, {"detail": detail})
+    await events.stream(
+        receive,
+        send,
+        APPLICATIONS_CHANNEL,
+        lambda payload: payload[key] == pk,
+        event="application",
+    )
+
+
+async def job_applications(scope, receive, send, pk):
+    await _stream_applications(scope, receive, send, Job, pk, "job_id")
+
+
+async def business_applications(scope, receive, send, pk):
+    await _stream_applications(scope, receive, send, Business, pk, "business_id")
+
+
+ROUTES = [
+    (r"/v1/jobs/(?P<pk>\d+)/events/", job_applications),
+    (r"/v1/business/(?P<pk>\d+)/events/", business_applications),
+]
@@ -0,0 +1,171 @@
+"""Background tasks stored in Postgres.
+
+Workers claim due tasks with ``SELECT ... FOR UPDATE SKIP LOCKED``, so any
+number of them can poll the ``task`` table without handing out the same
+task twice. A claimed task holds a lease (``run_at`` in the future) and is
+claimed again if its worker dies before finishing. Failed tasks are retried
+with exponential backoff until ``max_attempts``.
+"""
+from __future__ import annotations
+
+import datetime
+import importlib
+import logging
+import threading
+import traceback
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from juggle_challenge import metrics, utils
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+_registry: Dict[str, Callable] = {}
+
+TASKS_RUN = metrics.counter(
+    "tasks_run_total", "Background task runs", ["name", "result"]
+)
+TASK_DURATION = metrics.histogram(
+    "task_duration_seconds",
+    "Background task run time",
+    ["name"],
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600),
+)
+
+
+class UnknownTask(Exception):
+    pass
+
+
+def task(name: str, max_attempts: int = 5):
+    """Register ``func`` as the task ``name``; ``func.enqueue(**kwargs)``
+    queues a run with JSON-serializable keyword arguments.
+    """
+
+    def decorator(func):
+        _registry[name] = func
+        func.enqueue = lambda owner=None, **kwargs: enqueue(
+            name, owner=owner, max_attempts=max_attempts, **kwargs
+        )
+        return func
+
+    return decorator
+
+
+def autodiscover() -> None:
+    for module in getattr(settings, "TASK_MODULES", []):
+        importlib.import_module(module)
+
+
+def enqueue(name: str, owner=None, max_attempts: int = 5, **kwargs) -> Task:
+    return Task.objects.create(
+        name=name, kwargs=kwargs, owner=owner, max_attempts=max_attempts
+    )
+
+
+def claim() -> Optional[Task]:
+    while True:
+        now = utils.now_with_tz()
+        with transaction.atomic():
+            task = (
+                Task.objects.select_for_update(skip_locked=True)
+                .filter(
+                    status__in=[Task.Status.QUEUED, Task.Status.RUNNING],
+                    run_at__lte=now,
+                )
+                .order_by("run_at")
+                .first()
+            )
+            if task is None:
+                return None
+
+            if task.status == Task.Status.RUNNING:
+                # The worker running it died before its lease expired
+                task.last_error = "Lease expired before the task finished"
+                if task.attempts >= task.max_attempts:
+                    task.status = Task.Status.FAILED
+                    task.finished_at = now
+                    task.save(
+                        update_fields=[
+                            "status",
+                            "last_error",
+                            "finished_at",
+                            "updated_at",
+                        ]
+                    )
+                    continue
+
+            task.status = Task.Status.RUNNING
+            task.attempts += 1
+            task.started_at = now
+            task.run_at = now + datetime.timedelta(seconds=settings.TASK_LEASE_SECONDS)
+            task.save(
+                update_fields=[
+                    "status",
+                    "attempts",
+                    "started_at",
+                    "run_at",
+                    "last_error",
+                    "updated_at",
+                ]
+            )
+            return task
+
+
+def retry_delay(attempts: int) -> datetime.timedelta:
+    seconds = settings.TASK_RETRY_BACKOFF * 2 ** (attempts - 1)
+    return datetime.timedelta(seconds=min(seconds, settings.TASK_RETRY_BACKOFF_MAX))
+
+
+def execute(task: Task) -> None:
+    t0 = utils.time()
+    try:
+        func = _registry.get(task.name)
+        if func is None:
+            raise UnknownTask(task.name)
+        result = func(**task.kwargs)
+    except Exception as exc:
+        task.last_error = traceback.format_exc()
+        task.finished_at = utils.now_with_tz()
+        if task.attempts < task.max_attempts and not isinstance(exc, UnknownTask):
+            task.status = Task.Status.QUEUED
+            task.run_at = task.finished_at + retry_delay(task.attempts)
+        else:
+            task.status = Task.Status.FAILED
+        logger.warning(
+            "Task %s (%s) failed on attempt %d", task.pk, task.name, task.attempts
+        )
+    else:
+        task.status = Task.Status.SUCCEEDED
+        task.result = result
+        task.finished_at = utils.now_with_tz()
+
+    TASKS_RUN.inc(name=task.name, result=task.status)
+    TASK_DURATION.observe(utils.time() - t0, name=task.name)
+    task.save(
+        update_fields=[
+            "status",
+            "run_at",
+            "result",
+            "last_error",
+            "finished_at",
+            "updated_at",
+        ]
+    )
+
+
+def work(stop: threading.Event, poll_interval: float, burst: bool = False) -> None:
+    """Run tasks until ``stop`` is set, or the queue is empty with ``burst``."""
+    while not stop.is_set():
+        close_old_connections()
+        task = claim()
+        if task is None:
+            if burst:
+                return
+            stop.wait(poll_interval)
+            continue
+        execute(task)
@@ -1,3 +1,2262 @@
-from django.test import TestCase
+"""API tests and query plan regression tests.
 
-# Create your tests here.
+``QueryPlanTests`` seeds the tables with a realistic volume of rows, sends a
+request for every job and professional filter, the child actions, the
+business stats and ``job_apply``, and runs the SELECTs each request issues
+through ``EXPLAIN (FORMAT JSON)``. A case fails when its plans don't use the
+indexes it expects, fully scan a large table sequentially or cost more than
+``COST_TOLERANCE`` times the plans recorded in ``query_plans.json``, and
+prints the difference with the recorded plans.
+
+They are tagged ``plans`` and left out of ``make test``, run them with
+``make test-plans``, and with ``JUGGLE_UPDATE_QUERY_PLANS=1`` to record the
+current plans after an intended change.
+"""
+from __future__ import annotations
+
+import datetime
+import difflib
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+from unittest import mock
+from urllib.parse import urlencode
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model, hashers
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.core.paginator import EmptyPage, PageNotAnInteger
+from django.db import DatabaseError, connection, transaction
+from django.http import QueryDict
+from django.test import SimpleTestCase, TestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from juggle_challenge import (
+    events,
+    hashing,
+    metrics,
+    rest_api,
+    schema,
+    traffic,
+    utils,
+)
+from juggle_challenge.hashing import HashingUnavailable
+from juggle_challenge.pagination import InlineCountPaginator
+from juggle_challenge.querycount import (
+    QueryBudgetExceeded,
+    assert_query_budget,
+    fingerprint,
+)
+from juggle_challenge.rest_api import ResponseCache
+
+from . import (
+    aggregates,
+    archive,
+    caching,
+    changes,
+    importers,
+    partitions,
+    rollups,
+    similarity,
+    skills,
+    streams,
+    taskqueue,
+)
+from .models import (
+    Application,
+    Business,
+    BusinessDailyApplications,
+    ChangeLog,
+    Job,
+    JobDailyApplications,
+    JobWithArchive,
+    Professional,
+    Skill,
+    Task,
+)
+
+QUERY_PLANS_PATH = Path(__file__).with_name("query_plans.json")
+UPDATE_QUERY_PLANS = os.environ.get("JUGGLE_UPDATE_QUERY_PLANS") == "1"
+
+# Statistics come from a sample of the rows, so costs vary between runs
+COST_TOLERANCE = 2.0
+# Scanning tables this small is cheaper than using an index
+SEQ_SCAN_MAX_ROWS = 1000
+# Nodes that read all their input before returning rows, so a LIMIT above
+# them doesn't stop the scans below early
+BLOCKING_NODES = {"Aggregate", "Hash", "Materialize", "Sort", "WindowAgg"}
+
+SEED_SIZES = dict(
+    skills=1_000,
+    businesses=1_000,
+    jobs=50_000,
+    professionals=50_000,
+    applications=200_000,
+    # Distinct titles and last names, a few dozen rows share each
+    titles=2_000,
+    last_names=3_000,
+)
+
+# Words made of letters only, so trigram searches for them are selective
+_WORD = "translate(substr(md5(({})::text), 1, {}), '0123456789', 'ghijklmnop')"
+
+SEED_SQL = [
+    """
+    INSERT INTO skill (created_at, updated_at, name, normalized_name)
+    SELECT now(), now(), 'Skill ' || i, 'skill ' || i
+    FROM generate_series(1, %(skills)s) i
+    """,
+    """
+    INSERT INTO business (created_at, updated_at, company_name, website, owner_id)
+    SELECT now(), now(), 'Company ' || i, 'https://company' || i || '.example.com',
+        %(owner_id)s
+    FROM generate_series(1, %(businesses)s) i
+    """,
+    f"""
+    INSERT INTO job (
+        created_at, updated_at, title, daily_rate_range, availability_ids,
+        location_ids, skill_ids, status, business_id, owner_id
+    )
+    SELECT created_at, created_at,
+        'Engineer ' || {_WORD.format("floor(random() * %(titles)s)", 6)},
+        round((100 + random() * 900)::numeric, 2),
+        ARRAY[(1 + floor(random() * 3))::text],
+        ARRAY[(1 + floor(random() * 3))::text],
+        ARRAY[
+            skills.first + floor(random() * %(skills)s)::int,
+            skills.first + floor(random() * %(skills)s)::int,
+            skills.first + floor(random() * %(skills)s)::int
+        ],
+        CASE
+            WHEN status < 0.03 THEN 'closed'
+            WHEN status < 0.05 THEN 'expired'
+            ELSE 'open'
+        END,
+        businesses.first + floor(random() * %(businesses)s)::int,
+        %(owner_id)s
+    FROM (
+        SELECT now() - random() * interval '365 days' AS created_at,
+            random() AS status
+        FROM generate_series(1, %(jobs)s)
+    ) jobs,
+    (SELECT min(id) AS first FROM skill) skills,
+    (SELECT min(id) AS first FROM business) businesses
+    """,
+    f"""
+    INSERT INTO professional (
+        created_at, updated_at, full_name, email, title, daily_rate_range,
+        availability_ids, location_ids, owner_id
+    )
+    SELECT created_at, created_at,
+        (ARRAY['Ana', 'Ben', 'Chloe', 'David', 'Emma', 'Finn', 'Grace', 'Hugo',
+            'Iris', 'Jack', 'Kate', 'Liam', 'Mia', 'Noah', 'Olivia', 'Paul',
+            'Rosa', 'Sam', 'Tara', 'Victor'])[1 + floor(random() * 20)::int]
+            || ' ' || initcap({_WORD.format("floor(random() * %(last_names)s)", 8)}),
+        'professional' || i || '@example.com',
+        'Consultant ' || {_WORD.format("floor(random() * %(titles)s)", 6)},
+        round((100 + random() * 900)::numeric, 2),
+        ARRAY[(1 + floor(random() * 3))::text],
+        ARRAY[(1 + floor(random() * 3))::text],
+        %(owner_id)s
+    FROM (
+        SELECT i, now() - random() * interval '365 days' AS created_at
+        FROM generate_series(1, %(professionals)s) i
+    ) professionals
+    """,
+    """
+    INSERT INTO api_application (created_at, updated_at, job_id, professional_id)
+    SELECT created_at, created_at,
+        jobs.first + floor(random() * %(jobs)s)::int,
+        professionals.first + floor(random() * %(professionals)s)::int
+    FROM (
+        SELECT now() - random() * interval '60 days' AS created_at
+        FROM generate_series(1, %(applications)s)
+    ) applications,
+    (SELECT min(id) AS first FROM job) jobs,
+    (SELECT min(id) AS first FROM professional) professionals
+    """,
+]
+
+
+@dataclass
+class PlanCase:
+    name: str
+    path: str
+    # Patterns of index names, each must be used by one of the plans
+    indexes: Tuple[str, ...]
+    query: Dict[str, str] = field(default_factory=dict)
+    method: str = "get"
+    trigram: bool = False
+
+
+CASES = [
+    PlanCase(
+        "job-title",
+        "/v1/jobs/",
+        ("job_title_upper_idx",),
+        dict(title="{job_title}"),
+    ),
+    PlanCase(
+        "job-daily-rate",
+        "/v1/jobs/",
+        ("job_daily_rate_idx",),
+        dict(min_daily_rate="500", max_daily_rate="502"),
+    ),
+    PlanCase(
+        "job-min-daily-rate",
+        "/v1/jobs/",
+        ("job_daily_rate_idx",),
+        dict(min_daily_rate="998"),
+    ),
+    PlanCase(
+        "job-max-daily-rate",
+        "/v1/jobs/",
+        ("job_daily_rate_idx",),
+        dict(max_daily_rate="102"),
+    ),
+    PlanCase(
+        "job-skills",
+        "/v1/jobs/",
+        ("job_skill_ids_gin",),
+        dict(skills="{skill}"),
+    ),
+    PlanCase(
+        "job-status",
+        "/v1/jobs/",
+        ("job_status_updated_idx",),
+        dict(status="closed"),
+    ),
+    PlanCase(
+        "job-min-created-datetime",
+        "/v1/jobs/",
+        ("job_created_at_idx",),
+        dict(min_created_datetime="{recent}"),
+    ),
+    PlanCase(
+        "job-max-created-datetime",
+        "/v1/jobs/",
+        ("job_created_at_idx",),
+        dict(max_created_datetime="{old}"),
+    ),
+    PlanCase(
+        "professional-title",
+        "/v1/professionals/",
+        ("professional_title_upper_trgm",),
+        dict(title="{professional_title}"),
+        trigram=True,
+    ),
+    PlanCase(
+        "professional-daily-rate",
+        "/v1/professionals/",
+        ("professional_daily_rate_idx",),
+        dict(min_daily_rate="500", max_daily_rate="502"),
+    ),
+    PlanCase(
+        "professional-email",
+        "/v1/professionals/",
+        ("professional_email_upper_idx",),
+        dict(email="{email}"),
+    ),
+    PlanCase(
+        "professional-full-name",
+        "/v1/professionals/",
+        ("professional_full_name_upper_trgm",),
+        dict(full_name="{last_name}"),
+        trigram=True,
+    ),
+    PlanCase(
+        "professional-min-created-datetime",
+        "/v1/professionals/",
+        ("professional_created_at_idx",),
+        dict(min_created_datetime="{recent}"),
+    ),
+    PlanCase(
+        "professional-max-created-datetime",
+        "/v1/professionals/",
+        ("professional_created_at_idx",),
+        dict(max_created_datetime="{old}"),
+    ),
+    PlanCase(
+        "job-professionals",
+        "/v1/jobs/{job_id}/professionals/",
+        ("api_application_.*job_id_created_at_idx", "professional_pkey"),
+    ),
+    PlanCase(
+        "professional-jobs",
+        "/v1/professionals/{professional_id}/jobs/",
+        ("api_application_.*professional_id_idx", "job_pkey"),
+    ),
+    PlanCase(
+        "business-jobs",
+        "/v1/business/{business_id}/jobs/",
+        ("job_business_id_.*",),
+    ),
+    PlanCase(
+        "business-jobs-filtered",
+        "/v1/business/{business_id}/jobs/",
+        ("job_business_id_.*",),
+        dict(status="open", min_daily_rate="500"),
+    ),
+    PlanCase(
+        "business-stats",
+        "/v1/business/{business_id}/stats/",
+        ("business_daily_business_day_uniq", "job_daily_business_day_idx"),
+        dict(days="366"),
+    ),
+    PlanCase(
+        "job-apply",
+        "/v1/professionals/{professional_id}/job-apply/{job_id}/",
+        # The daily count only reads the index of today's partition
+        (r"api_application_p\d{6}_job_id_created_at_idx",),
+        method="put",
+    ),
+]
+
+_PARTITION_RE = re.compile(r"_p\d{6}")
+
+
+def plan_nodes(plan: dict) -> Iterator[dict]:
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from plan_nodes(child)
+
+
+def full_scans(plan: dict, limited: bool = False) -> Iterator[dict]:
+    """The sequential scans of ``plan`` that read their whole table: those
+    without a LIMIT above them to stop them early.
+    """
+    if plan["Node Type"] == "Limit":
+        limited = True
+    elif plan["Node Type"] in BLOCKING_NODES:
+        limited = False
+    if plan["Node Type"] == "Seq Scan" and not limited:
+        yield plan
+    for child in plan.get("Plans", ()):
+        # Subqueries run to completion whatever their parent does
+        subquery = child.get("Parent Relationship") in ("InitPlan", "SubPlan")
+        yield from full_scans(child, limited and not subquery)
+
+
+def outline(plan: dict, depth: int = 0) -> List[str]:
+    """One line per plan node, without the costs and row estimates."""
+    label = plan["Node Type"]
+    if "Relation Name" in plan:
+        label += f" on {plan['Relation Name']}"
+    if "Index Name" in plan:
+        label += f" using {plan['Index Name']}"
+    # Partitions are named after the month they were created for
+    lines = ["  " * depth + _PARTITION_RE.sub("_pYYYYMM", label)]
+    for child in plan.get("Plans", ()):
+        lines += outline(child, depth + 1)
+    return lines
+
+
+def plan_diff(recorded: List[dict], current: List[dict]) -> str:
+    def lines(entries):
+        for entry in entries:
+            yield f"{entry['sql']}\n"
+            yield f"  cost {entry['cost']}\n"
+            yield from (f"  {line}\n" for line in entry["plan"])
+
+    return "".join(
+        difflib.unified_diff(
+            list(lines(recorded)), list(lines(current)), "recorded", "current"
+        )
+    )
+
+
+@tag("plans")
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username="plans")
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT setseed(0.5)")
+            for sql in SEED_SQL:
+                cursor.execute(sql, dict(SEED_SIZES, owner_id=cls.user.pk))
+            # Merge the rows waiting in GIN pending lists into the indexes,
+            # as autovacuum would have
+            cursor.execute(
+                """
+                SELECT gin_clean_pending_list(index.oid)
+                FROM pg_class index JOIN pg_am am ON am.oid = index.relam
+                WHERE am.amname = 'gin' AND index.relkind = 'i'
+                """
+            )
+            rollups.backfill()
+            cursor.execute("ANALYZE")
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            cls.has_trigram = cursor.fetchone() is not None
+
+        # Skill names are cached per process, load them all as servers do so
+        # the requests don't depend on what earlier ones looked up
+        skills.preload()
+
+        today = utils.now_with_tz().replace(hour=0, minute=0, second=0, microsecond=0)
+        # A job that can still take applications today
+        job = (
+            Job.objects.filter(status=Job.Status.OPEN)
+            .exclude(application__created_at__gte=today)
+            .order_by("pk")
+            .first()
+        )
+        professional = Professional.objects.order_by("pk").first()
+        now = utils.now_with_tz()
+        cls.values = dict(
+            job_id=job.pk,
+            job_title=job.title.upper(),
+            business_id=job.business_id,
+            skill="skill 1",
+            professional_id=professional.pk,
+            professional_title=professional.title.split()[-1],
+            email=professional.email.upper(),
+            last_name=professional.full_name.split()[-1].lower(),
+            recent=(now - datetime.timedelta(days=1)).isoformat(),
+            old=(now - datetime.timedelta(days=364)).isoformat(),
+        )
+
+        cls.recorded = {}
+        if QUERY_PLANS_PATH.exists():
+            cls.recorded = json.loads(QUERY_PLANS_PATH.read_text())
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.row_estimates: Dict[str, float] = {}
+
+    def row_estimate(self, table: str) -> float:
+        if table not in self.row_estimates:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples FROM pg_class WHERE relname = %s", [table]
+                )
+                self.row_estimates[table] = cursor.fetchone()[0]
+        return self.row_estimates[table]
+
+    def explain(self, sql: str) -> dict:
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+            return cursor.fetchone()[0][0]["Plan"]
+
+    def request_plans(self, case: PlanCase) -> List[Tuple[str, dict]]:
+        path = case.path.format(**self.values)
+        query = {
+            name: value.format(**self.values) for name, value in case.query.items()
+        }
+        if query:
+            path = f"{path}?{urlencode(query)}"
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, case.method)(path)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [
+            (query["sql"], self.explain(query["sql"]))
+            for query in context.captured_queries
+            if query["sql"].startswith("SELECT")
+        ]
+
+    def check_plans(self, case: PlanCase, plans: List[Tuple[str, dict]]) -> List[str]:
+        problems = []
+        index_names = {
+            node["Index Name"]
+            for _, plan in plans
+            for node in plan_nodes(plan)
+            if "Index Name" in node
+        }
+        for pattern in case.indexes:
+            if not any(re.fullmatch(pattern, name) for name in index_names):
+                problems.append(f"No plan uses an index matching {pattern!r}")
+
+        for sql, plan in plans:
+            for node in full_scans(plan):
+                if self.row_estimate(node["Relation Name"]) > SEQ_SCAN_MAX_ROWS:
+                    problems.append(
+                        f"Sequential scan on {node['Relation Name']} in {sql}"
+                    )
+        return problems
+
+    def compare_costs(self, recorded: List[dict], current: List[dict]) -> List[str]:
+        if [entry["sql"] for entry in recorded] != [entry["sql"] for entry in current]:
+            return ["The queries differ from the recorded ones"]
+        return [
+            f"Cost {now['cost']} is over {COST_TOLERANCE} times the recorded "
+            f"{before['cost']} for {now['sql']}"
+            for before, now in zip(recorded, current)
+            if now["cost"] > before["cost"] * COST_TOLERANCE
+        ]
+
+    def test_query_plans(self):
+        current_plans = {}
+        for case in CASES:
+            with self.subTest(case.name):
+                if case.trigram and not self.has_trigram:
+                    self.skipTest("pg_trgm isn't installed")
+
+                plans = self.request_plans(case)
+                current = [
+                    dict(
+                        sql=fingerprint(sql),
+                        cost=plan["Total Cost"],
+                        plan=outline(plan),
+                    )
+                    for sql, plan in plans
+                ]
+                current_plans[case.name] = current
+                problems = self.check_plans(case, plans)
+                recorded = self.recorded.get(case.name)
+                if recorded is not None and not UPDATE_QUERY_PLANS:
+                    problems += self.compare_costs(recorded, current)
+                if problems:
+                    self.fail(
+                        "\n".join(problems)
+                        + "\n\n"
+                        + plan_diff(recorded or [], current)
+                    )
+
+        if UPDATE_QUERY_PLANS:
+            QUERY_PLANS_PATH.write_text(
+                json.dumps(
+                    dict(self.recorded, **current_plans), indent=2, sort_keys=True
+                )
+                + "\n"
+            )
+
+
+class ApiTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username="owner")
+        cls.professional = Professional.objects.create(
+            full_name="Ada Lovelace",
+            email="ada@example.com",
+            title="Engineer",
+            daily_rate_range=500,
+            availability_ids=[],
+            location_ids=[],
+            owner=cls.user,
+        )
+        cls.business = Business.objects.create(
+            company_name="Analytical Engines",
+            website="https://example.com",
+            owner=cls.user,
+        )
+        cls.job = cls.create_job("Engineer")
+
+    @classmethod
+    def create_job(cls, title: str) -> Job:
+        return Job.objects.create(
+            title=title,
+            daily_rate_range=400,
+            availability_ids=[],
+            location_ids=[],
+            business=cls.business,
+            owner=cls.user,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # Skills cached by other tests were rolled back
+        skills._ids_by_normalized_name.clear()
+        skills._names_by_id.clear()
+
+
+class ChangedFieldsTests(ApiTestCase):
+    def test_changed_fields(self):
+        self.assertIsNone(Professional(full_name="Grace Hopper").changed_fields())
+
+        professional = Professional.objects.get(pk=self.professional.pk)
+        self.assertEqual(professional.changed_fields(), [])
+        professional.title = "Architect"
+        professional.availability_ids.append("1")
+        self.assertEqual(professional.changed_fields(), ["title", "availability_ids"])
+
+        professional.save()
+        self.assertEqual(professional.changed_fields(), [])
+
+    def test_save_updates_changed_columns_only(self):
+        professional = Professional.objects.get(pk=self.professional.pk)
+        with self.assertNumQueries(0):
+            professional.save()
+
+        professional.title = "Architect"
+        with CaptureQueriesContext(connection) as queries:
+            professional.save()
+        (query,) = queries.captured_queries
+        self.assertIn('"title"', query["sql"])
+        self.assertIn('"updated_at"', query["sql"])
+        self.assertNotIn('"email"', query["sql"])
+        professional.refresh_from_db()
+        self.assertEqual(professional.title, "Architect")
+
+
+@override_settings(QUERY_BUDGET_ENFORCED=True)
+class QueryBudgetTests(ApiTestCase):
+    def test_fingerprint(self):
+        self.assertEqual(
+            fingerprint(
+                "SELECT * FROM job\n  WHERE title = 'O''Brien' AND id IN (%s, %s, %s)"
+                " AND daily_rate_range > 1.5 LIMIT 20"
+            ),
+            "SELECT * FROM job WHERE title = ? AND id IN (...)"
+            " AND daily_rate_range > ? LIMIT ?",
+        )
+
+    def test_assert_query_budget(self):
+        with assert_query_budget(2) as recorder:
+            list(Job.objects.all())
+        self.assertEqual(recorder.count, 1)
+
+        with self.assertRaisesRegex(QueryBudgetExceeded, r"N\+1 ran 3 queries"):
+            with assert_query_budget(2, label="N+1"):
+                for pk in (1, 2, 3):
+                    Job.objects.filter(pk=pk).first()
+
+    def test_views_stay_within_budget(self):
+        for n in range(5):
+            professional = Professional.objects.create(
+                full_name=f"Professional {n}",
+                email="professional@example.com",
+                title="Engineer",
+                daily_rate_range=500,
+                availability_ids=["1"],
+                location_ids=["1"],
+                owner=self.user,
+            )
+            Application.objects.create(professional=professional, job=self.job)
+        response = self.client.get("/v1/professionals/")
+        self.assertEqual(response.status_code, 200, response.content)
+        response = self.client.get(f"/v1/jobs/{self.job.pk}/professionals/")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len(response.json()), 5)
+
+
+class PaginationTests(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for n in range(20):
+            cls.create_job(f"Job {n}")
+
+    def test_page_and_count_in_one_query(self):
+        paginator = InlineCountPaginator(Job.objects.order_by("pk"), 8)
+        with self.assertNumQueries(1):
+            page = paginator.page(3)
+            self.assertEqual(paginator.count, 21)
+        self.assertEqual(
+            [job.pk for job in page],
+            list(Job.objects.order_by("pk").values_list("pk", flat=True)[16:]),
+        )
+        self.assertEqual(paginator.num_pages, 3)
+        self.assertFalse(page.has_next())
+
+    def test_invalid_pages(self):
+        paginator = InlineCountPaginator(Job.objects.order_by("pk"), 8)
+        with self.assertRaises(EmptyPage):
+            paginator.page(4)
+        with self.assertRaises(EmptyPage):
+            paginator.page(0)
+        with self.assertRaises(PageNotAnInteger):
+            paginator.page("last")
+
+        paginator = InlineCountPaginator(Job.objects.none(), 8)
+        self.assertEqual(len(paginator.page(1)), 0)
+        self.assertEqual(paginator.count, 0)
+
+    def test_link_header(self):
+        response = self.client.get("/v1/jobs/", dict(page=2))
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len(response.json()), 1)
+        url = utils.build_absolute_url("/v1/jobs/")
+        self.assertEqual(response["Link"], f'<{url}>; rel="first", <{url}>; rel="prev"')
+
+
+class SparseFieldsTests(ApiTestCase):
+    def test_fields_narrow_reads(self):
+        response = self.client.get(
+            f"/v1/professionals/{self.professional.pk}/",
+            dict(fields="professional_id,title"),
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(
+            response.json(),
+            dict(professional_id=self.professional.pk, title="Engineer"),
+        )
+
+    def test_omit_and_expand(self):
+        response = self.client.get(
+            f"/v1/professionals/{self.professional.pk}/",
+            dict(omit="email", expand="jobs"),
+        )
+        self.assertNotIn("email", response.json())
+        self.assertEqual(response.json()["jobs"], [])
+        response = self.client.get(f"/v1/professionals/{self.professional.pk}/")
+        self.assertNotIn("jobs", response.json())
+
+    def test_fields_dont_drop_writes(self):
+        response = self.client.patch(
+            f"/v1/professionals/{self.professional.pk}/?fields=professional_id",
+            dict(title="Architect"),
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json(), dict(professional_id=self.professional.pk))
+        self.professional.refresh_from_db()
+        self.assertEqual(self.professional.title, "Architect")
+
+    def test_child_lists_keep_the_parent_key(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(
+                    f"/v1/business/{self.business.pk}/jobs/", dict(fields="job_id")
+                )
+            self.assertEqual(response.status_code, 200, response.content)
+            return len(queries)
+
+        queries = count_queries()
+        for n in range(3):
+            self.create_job(f"Job {n}")
+        # Deferring business_id would load it with one query per job
+        self.assertEqual(count_queries(), queries)
+
+
+class OwnerListTests(ApiTestCase):
+    def test_mine(self):
+        other = get_user_model().objects.create_user(username="other")
+        Job.objects.create(
+            title="Engineer",
+            daily_rate_range=400,
+            availability_ids=[],
+            location_ids=[],
+            business=self.business,
+            owner=other,
+        )
+
+        response = self.client.get("/v1/jobs/mine/", dict(fields="job_id,title"))
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response["X-Total-Count"], "1")
+        self.assertEqual(response.json(), [dict(job_id=self.job.pk, title="Engineer")])
+
+        response = self.client.get("/v1/jobs/mine/", dict(title="Architect"))
+        self.assertEqual(response.json(), [])
+
+        self.client.force_authenticate(other)
+        response = self.client.get("/v1/professionals/mine/")
+        self.assertEqual(response.json(), [])
+
+
+@override_settings(
+    PASSWORD_HASHING_WORKERS=0,
+    PASSWORD_HASHERS=[
+        "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+        "django.contrib.auth.hashers.MD5PasswordHasher",
+    ],
+)
+class PasswordHashingTests(ApiTestCase):
+    def test_must_update(self):
+        pbkdf2 = hashers.PBKDF2PasswordHasher()
+        self.assertFalse(hashing.must_update(hashers.make_password("secret")))
+        self.assertTrue(
+            hashing.must_update(hashers.make_password("secret", hasher="md5"))
+        )
+        self.assertTrue(
+            hashing.must_update(
+                pbkdf2.encode("secret", pbkdf2.salt(), iterations=pbkdf2.iterations - 1)
+            )
+        )
+        self.assertFalse(hashing.must_update(hashers.make_password(None)))
+
+    def test_login_upgrades_the_hash(self):
+        user = get_user_model().objects.create(
+            username="grace", password=hashers.make_password("secret", hasher="md5")
+        )
+
+        response = self.client.post(
+            "/v1/token/", dict(username="grace", password="wrong"), format="json"
+        )
+        self.assertEqual(response.status_code, 401)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith("md5$"))
+
+        response = self.client.post(
+            "/v1/token/", dict(username="grace", password="secret"), format="json"
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith("pbkdf2_sha256$"))
+        self.assertFalse(hashing.must_update(user.password))
+
+
+class StubPool:
+    """Runs hashes in the calling thread, or never with ``stall``."""
+
+    def __init__(self, stall: bool = False, broken: bool = False):
+        self.stall = stall
+        self.broken = broken
+        self.futures: List[Future] = []
+
+    def submit(self, fn, *args) -> Future:
+        future = Future()
+        if self.broken:
+            future.set_exception(BrokenProcessPool("A worker died"))
+        elif not self.stall:
+            future.set_result(fn(*args))
+        self.futures.append(future)
+        return future
+
+
+@override_settings(
+    PASSWORD_HASHING_WORKERS=1,
+    PASSWORD_HASHING_MAX_PENDING=1,
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+)
+class PasswordHashingPoolTests(ApiTestCase):
+    def use_pool(self, pool) -> None:
+        saved = hashing._pool, hashing._pool_pid
+        hashing._pool, hashing._pool_pid = pool, os.getpid()
+
+        def restore():
+            hashing._pool, hashing._pool_pid = saved
+
+        self.addCleanup(restore)
+
+    def test_hashes_on_the_pool(self):
+        pool = StubPool()
+        self.use_pool(pool)
+        encoded = hashing.make_password("secret")
+        self.assertTrue(hashing.check_password("secret", encoded))
+        self.assertEqual(len(pool.futures), 2)
+        self.assertEqual(hashing._pending, 0)
+
+    def test_saturated_pool_throttles(self):
+        rejections = hashing.PASSWORD_HASHING_REJECTIONS.samples().get(("check",), 0)
+        self.use_pool(StubPool())
+        with self.settings(PASSWORD_HASHING_MAX_PENDING=0):
+            response = self.client.post(
+                "/v1/token/", dict(username="owner", password="secret"), format="json"
+            )
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(
+            hashing.PASSWORD_HASHING_REJECTIONS.samples()[("check",)], rejections + 1
+        )
+
+    def test_timeout(self):
+        pool = StubPool(stall=True)
+        self.use_pool(pool)
+        with self.settings(PASSWORD_HASHING_TIMEOUT=0.01):
+            with self.assertRaises(HashingUnavailable):
+                hashing.make_password("secret")
+        self.assertTrue(pool.futures[0].cancelled())
+        self.assertEqual(hashing._pending, 0)
+
+    def test_broken_pool_is_replaced(self):
+        self.use_pool(StubPool(broken=True))
+        response = self.client.post(
+            "/v1/token/", dict(username="owner", password="secret"), format="json"
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertIsNone(hashing._pool)
+
+    def test_process_pool(self):
+        self.use_pool(None)
+        encoded = hashing.make_password("secret")
+        self.addCleanup(hashing._pool.shutdown)
+        # Pool processes load the project settings, not the overridden ones
+        self.assertTrue(encoded.startswith("pbkdf2_sha256$"))
+        self.assertTrue(hashing.check_password("secret", encoded))
+
+
+class BulkRetrieveTests(ApiTestCase):
+    def test_requested_order_and_missing_ids(self):
+        other = self.create_job("Architect")
+        missing = other.pk + 1000
+
+        response = self.client.get(
+            "/v1/jobs/bulk/",
+            dict(ids=f"{other.pk},{self.job.pk},{missing},{other.pk}", fields="job_id"),
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(
+            response.json(),
+            dict(
+                results=[dict(job_id=other.pk), dict(job_id=self.job.pk)],
+                missing=[missing],
+            ),
+        )
+
+        response = self.client.post(
+            "/v1/professionals/bulk/?fields=professional_id,title",
+            dict(ids=[missing, self.professional.pk]),
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(
+            response.json(),
+            dict(
+                results=[dict(professional_id=self.professional.pk, title="Engineer")],
+                missing=[missing],
+            ),
+        )
+
+    def test_invalid_ids(self):
+        response = self.client.get("/v1/jobs/bulk/", dict(ids="1,two"))
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post("/v1/jobs/bulk/", dict(ids="1"), format="json")
+        self.assertEqual(response.status_code, 400)
+        with self.settings(BULK_RETRIEVE_MAX_IDS=2):
+            response = self.client.get("/v1/jobs/bulk/", dict(ids="1,2,3"))
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get("/v1/jobs/bulk/")
+        self.assertEqual(response.json(), dict(results=[], missing=[]))
+
+
+class ApplicationRollupTests(ApiTestCase):
+    def apply(self, professional: Professional, job: Job):
+        return self.client.put(
+            f"/v1/professionals/{professional.pk}/job-apply/{job.pk}/"
+        )
+
+    def test_record_application(self):
+        day = datetime.date(2021, 3, 1)
+        other_job = self.create_job("Architect")
+        rollups.record_application(self.job, day)
+        rollups.record_application(self.job, day)
+        rollups.record_application(other_job, day)
+        rollups.record_application(self.job, day + datetime.timedelta(days=1))
+
+        self.assertEqual(
+            sorted(
+                JobDailyApplications.objects.values_list(
+                    "job_id", "day", "applications"
+                )
+            ),
+            sorted(
+                [
+                    (self.job.pk, day, 2),
+                    (other_job.pk, day, 1),
+                    (self.job.pk, day + datetime.timedelta(days=1), 1),
+                ]
+            ),
+        )
+        self.assertEqual(
+            sorted(
+                BusinessDailyApplications.objects.values_list("day", "applications")
+            ),
+            [(day, 3), (day + datetime.timedelta(days=1), 1)],
+        )
+
+    def test_applying_twice_counts_once(self):
+        self.assertEqual(self.apply(self.professional, self.job).status_code, 200)
+        self.assertEqual(self.apply(self.professional, self.job).status_code, 200)
+
+        self.assertEqual(Application.objects.filter(job=self.job).count(), 1)
+        self.assertEqual(
+            list(JobDailyApplications.objects.values_list("applications", flat=True)),
+            [1],
+        )
+        self.assertEqual(
+            list(
+                BusinessDailyApplications.objects.values_list("applications", flat=True)
+            ),
+            [1],
+        )
+        self.assertEqual(rollups.backfill(), dict(job_days=1, business_days=1))
+
+    def test_business_stats(self):
+        today = utils.now_with_tz().date()
+        other_job = self.create_job("Architect")
+        rollups.record_application(self.job, today)
+        rollups.record_application(other_job, today)
+        rollups.record_application(other_job, today - datetime.timedelta(days=2))
+        # Outside the requested range
+        rollups.record_application(self.job, today - datetime.timedelta(days=3))
+
+        response = self.client.get(
+            f"/v1/business/{self.business.pk}/stats/", dict(days=3)
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        first_day = today - datetime.timedelta(days=2)
+        self.assertEqual(
+            response.json(),
+            dict(
+                business_id=self.business.pk,
+                first_day=first_day.isoformat(),
+                last_day=today.isoformat(),
+                applications=3,
+                days=[
+                    dict(day=first_day.isoformat(), applications=1),
+                    dict(
+                        day=(first_day + datetime.timedelta(days=1)).isoformat(),
+                        applications=0,
+                    ),
+                    dict(day=today.isoformat(), applications=2),
+                ],
+                jobs=[
+                    dict(
+                        job_id=other_job.pk,
+                        applications=2,
+                        days=[
+                            dict(day=first_day.isoformat(), applications=1),
+                            dict(day=today.isoformat(), applications=1),
+                        ],
+                    ),
+                    dict(
+                        job_id=self.job.pk,
+                        applications=1,
+                        days=[dict(day=today.isoformat(), applications=1)],
+                    ),
+                ],
+            ),
+        )
+
+    def test_business_stats_days(self):
+        for days in ("0", "367", "week"):
+            response = self.client.get(
+                f"/v1/business/{self.business.pk}/stats/", dict(days=days)
+            )
+            self.assertEqual(response.status_code, 400, days)
+
+    def test_business_stats_owner_only(self):
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(username="other")
+        )
+        response = self.client.get(f"/v1/business/{self.business.pk}/stats/")
+        self.assertEqual(response.status_code, 403)
+
+
+class SimilarityIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = similarity.SimilarityIndex(permutations=64, bands=16)
+        self.index.build(
+            [
+                (1, "Python developer", [1, 2, 3]),
+                (2, "Senior Python developer", [1, 2, 3]),
+                (3, "Pastry chef", [7]),
+                (4, "", []),
+            ]
+        )
+
+    def query(self, title: str, skill_ids: List[int], **kwargs):
+        signature = self.index.signature(title, skill_ids)
+        return [pk for pk, _ in self.index.query(signature, 10, **kwargs)]
+
+    def test_query(self):
+        self.assertEqual(self.query("Python developer", [1, 2, 3]), [1, 2])
+        self.assertEqual(self.query("Python developer", [1, 2, 3], exclude=1), [2])
+        # Jobs without features aren't indexed
+        self.assertEqual(list(self.index.ids), [1, 2, 3])
+        self.assertIsNone(self.index.signature("", []))
+
+    def test_similarity_estimate(self):
+        signature = self.index.signature("Python developer", [1, 2, 3])
+        scores = dict(self.index.query(signature, 10))
+        self.assertEqual(scores[1], 1.0)
+        # Jaccard similarity of the two feature sets is 5 / 6
+        self.assertAlmostEqual(scores[2], 5 / 6, delta=0.15)
+
+    def test_updates_before_and_after_merge(self):
+        self.index.update(3, "Python developer", [1, 2, 3], Job.Status.OPEN)
+        self.index.update(1, "Python developer", [1, 2, 3], Job.Status.CLOSED)
+        self.index.remove(2)
+        self.assertEqual(self.query("Python developer", [1, 2, 3]), [3])
+        self.index.merge()
+        self.assertEqual(self.query("Python developer", [1, 2, 3]), [3])
+        self.assertEqual((self.index.stale, self.index.pending), (set(), {}))
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "index.npz")
+            self.index.cursor = (4, 2)
+            self.index.save(path)
+            self.assertEqual(os.listdir(directory), ["index.npz"])
+
+            loaded = similarity.SimilarityIndex.load(path)
+            self.assertEqual(loaded.cursor, (4, 2))
+            self.assertEqual(list(loaded.ids), list(self.index.ids))
+            with self.settings(SIMILAR_JOBS_BANDS=8):
+                self.assertIsNone(similarity.SimilarityIndex.load(path))
+            self.assertIsNone(
+                similarity.SimilarityIndex.load(os.path.join(directory, "missing"))
+            )
+
+
+class SimilarJobsViewTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = self.settings(
+            SIMILAR_JOBS_INDEX_PATH=os.path.join(directory.name, "index.npz")
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(setattr, similarity, "_index", None)
+        self.addCleanup(setattr, similarity, "_missing_at", None)
+        similarity._index = similarity._missing_at = None
+
+    def test_missing_index_queues_a_build(self):
+        other_job = self.create_job("Senior Engineer")
+        path = f"/v1/jobs/{self.job.pk}/similar/"
+        for _ in range(2):
+            self.assertEqual(self.client.get(path).status_code, 503)
+        self.assertEqual(Task.objects.filter(name=similarity.BUILD_TASK).count(), 1)
+
+        similarity.build_and_save()
+        similarity._missing_at = None
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual([job["job_id"] for job in response.json()], [other_job.pk])
+
+
+class SchemaTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings = self.settings(OPENAPI_SCHEMA_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # Served schemas are kept for the life of the process
+        self.addCleanup(schema._schemas.clear)
+        schema._schemas.clear()
+
+    def generate_schema(self) -> str:
+        stdout = io.StringIO()
+        with mock.patch.object(
+            schema, "generate", side_effect=lambda fmt: f"{fmt} schema".encode()
+        ):
+            call_command("generate_schema", stdout=stdout)
+        return stdout.getvalue()
+
+    def test_generate_schema(self):
+        output = self.generate_schema()
+        for fmt in ("json", "yaml"):
+            path = os.path.join(self.directory, f"swagger.{fmt}")
+            self.assertIn(f"Wrote {path}", output)
+            self.assertEqual(Path(path).read_text(), f"{fmt} schema")
+        self.assertEqual(
+            sorted(os.listdir(self.directory)), ["swagger.json", "swagger.yaml"]
+        )
+
+        with self.settings(OPENAPI_SCHEMA_DIR=None):
+            with self.assertRaisesRegex(CommandError, "--output-dir"):
+                call_command("generate_schema", output_dir=None)
+
+    def test_generate_json(self):
+        document = json.loads(schema.generate("json"))
+        self.assertEqual(document["info"]["title"], schema.INFO["title"])
+        self.assertEqual(document["basePath"], "/v1")
+        self.assertIn("/jobs/", document["paths"])
+
+    def test_schema_view(self):
+        self.generate_schema()
+        with mock.patch.object(schema, "generate") as generate:
+            response = self.client.get("/swagger.json")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response["Content-Type"], "application/json")
+            self.assertEqual(response.content, b"json schema")
+            etag = response["ETag"]
+
+            response = self.client.get("/swagger.json", HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            response = self.client.head("/swagger.json", HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+            response = self.client.get("/swagger.yaml", HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response["Content-Type"], "application/yaml")
+            self.assertNotEqual(response["ETag"], etag)
+
+            self.assertEqual(self.client.post("/swagger.json").status_code, 405)
+        # Served from the artifact
+        generate.assert_not_called()
+
+    def test_schema_view_without_artifact(self):
+        with mock.patch.object(schema, "generate", return_value=b"{}") as generate:
+            self.assertEqual(self.client.get("/swagger.json").content, b"{}")
+            self.assertEqual(self.client.get("/swagger.json").content, b"{}")
+        generate.assert_called_once_with("json")
+
+    def test_swagger_ui_view(self):
+        self.generate_schema()
+        response = self.client.get("/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/html; charset=utf-8")
+        self.assertIn(b'url: "/swagger.json"', response.content)
+        etag = response["ETag"]
+        response = self.client.get("/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get("/", dict(format="openapi"))
+        self.assertEqual(response.content, b"json schema")
+        self.assertEqual(response["ETag"], self.client.get("/swagger.json")["ETag"])
+        self.assertNotEqual(response["ETag"], etag)
+        response = self.client.get(
+            "/", dict(format="openapi"), HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, 304)
+
+
+class MetricsTests(SimpleTestCase):
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def test_render(self):
+        requests = self.registry.counter("requests_total", "Requests", ["route"])
+        latency = self.registry.histogram(
+            "latency_seconds", "Latency", ["route"], buckets=(0.1, 1)
+        )
+        requests.inc(route='say "hi"')
+        requests.inc(2, route='say "hi"')
+        for value in (0.05, 0.5, 5):
+            latency.observe(value, route="jobs")
+
+        self.assertEqual(
+            metrics.render(self.registry.snapshot()),
+            "# HELP latency_seconds Latency\n"
+            "# TYPE latency_seconds histogram\n"
+            'latency_seconds_bucket{route="jobs",le="0.1"} 1\n'
+            'latency_seconds_bucket{route="jobs",le="1"} 2\n'
+            'latency_seconds_bucket{route="jobs",le="+Inf"} 3\n'
+            'latency_seconds_sum{route="jobs"} 5.55\n'
+            'latency_seconds_count{route="jobs"} 3\n'
+            "# HELP requests_total Requests\n"
+            "# TYPE requests_total counter\n"
+            'requests_total{route="say \\"hi\\""} 3\n',
+        )
+
+    def test_threads_shards(self):
+        counter = self.registry.counter("events_total", "Events")
+        histogram = self.registry.histogram("sizes", "Sizes", buckets=(1,))
+
+        def record():
+            for _ in range(100):
+                counter.inc()
+                histogram.observe(2)
+
+        for _ in range(5):
+            threads = [threading.Thread(target=record) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        counter.inc()
+
+        self.assertEqual(counter.samples(), {(): 2001})
+        self.assertEqual(histogram.samples(), {(): [0, 2000, 4000.0]})
+        # Only the live thread keeps a shard of its own
+        self.assertEqual(len(counter._shards), 1)
+        self.assertEqual(len(histogram._shards), 0)
+
+    def test_collect_and_retire(self):
+        counter = self.registry.counter("events_total", "Events")
+        gauge = self.registry.gauge("connections", "Connections")
+        counter.inc(3)
+        gauge.inc(2)
+        with tempfile.TemporaryDirectory() as directory:
+            for pid in (1, 2):
+                metrics._write_snapshot(
+                    os.path.join(directory, f"metrics-{pid}.json"),
+                    self.registry.snapshot(),
+                )
+            self.registry.retire(1, directory)
+            self.assertEqual(
+                sorted(os.listdir(directory)),
+                ["metrics-2.json", "metrics-retired.json"],
+            )
+
+            collected = self.registry.collect(directory)
+            self.assertEqual(collected["events_total"]["samples"], [[[], 9]])
+            # The retired process' gauges are dropped
+            self.assertEqual(collected["connections"]["samples"], [[[], 4]])
+
+
+class RateTests(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Job.objects.filter(pk=cls.job.pk).update(daily_rate_range=250)
+        for title, rate in (("Intern", 100), ("Developer", 500), ("Architect", 1000)):
+            job = cls.create_job(title)
+            Job.objects.filter(pk=job.pk).update(daily_rate_range=rate)
+
+    def test_filters(self):
+        for params, titles in (
+            (dict(min_daily_rate=250), ["Architect", "Developer", "Engineer"]),
+            (dict(max_daily_rate=250), ["Engineer", "Intern"]),
+            (
+                dict(min_daily_rate=200, max_daily_rate="500.000"),
+                ["Developer", "Engineer"],
+            ),
+            (dict(min_daily_rate=501, max_daily_rate=999), []),
+        ):
+            with self.subTest(**params):
+                response = self.client.get("/v1/jobs/", params)
+                self.assertEqual(response.status_code, 200, response.content)
+                titles_found = sorted(job["title"] for job in response.json())
+                self.assertEqual(titles_found, titles)
+
+    def test_histogram(self):
+        self.assertEqual(
+            aggregates.rate_histogram(Job.objects.all(), buckets=3),
+            dict(
+                min="100.000",
+                max="1000.000",
+                buckets=[
+                    dict(lower="100.000", upper="400.000", count=2),
+                    dict(lower="400.000", upper="700.001", count=1),
+                    dict(lower="700.001", upper="1000.001", count=1),
+                ],
+            ),
+        )
+
+    def test_histogram_of_a_single_rate(self):
+        Job.objects.filter(pk=self.create_job("Tester").pk).update(daily_rate_range=500)
+        histogram = aggregates.rate_histogram(
+            Job.objects.filter(daily_rate_range=500), buckets=2
+        )
+        self.assertEqual((histogram["min"], histogram["max"]), ("500.000", "500.000"))
+        self.assertEqual([bucket["count"] for bucket in histogram["buckets"]], [2, 0])
+        self.assertEqual(histogram["buckets"][0]["lower"], "500.000")
+        self.assertEqual(histogram["buckets"][-1]["upper"], "500.001")
+
+    def test_empty_histogram(self):
+        self.assertEqual(
+            aggregates.rate_histogram(Job.objects.none(), buckets=10),
+            dict(min=None, max=None, buckets=[]),
+        )
+        for params in (dict(min_daily_rate=5000), dict(skills="Unknown")):
+            with self.subTest(**params):
+                response = self.client.get("/v1/jobs/rate-histogram/", params)
+                self.assertEqual(response.status_code, 200, response.content)
+                self.assertEqual(response.json(), dict(min=None, max=None, buckets=[]))
+
+    def test_histogram_view(self):
+        response = self.client.get(
+            "/v1/jobs/rate-histogram/", dict(buckets=2, max_daily_rate=500)
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(
+            [bucket["count"] for bucket in response.json()["buckets"]], [2, 1]
+        )
+        for buckets in ("1", "100"):
+            response = self.client.get(
+                "/v1/jobs/rate-histogram/", dict(buckets=buckets)
+            )
+            self.assertEqual(len(response.json()["buckets"]), int(buckets))
+        for buckets in ("0", "101", "-1", "many"):
+            with self.subTest(buckets=buckets):
+                response = self.client.get(
+                    "/v1/jobs/rate-histogram/", dict(buckets=buckets)
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(
+                    response.json(),
+                    {"buckets": "Must be an integer between 1 and 100."},
+                )
+
+
+class FacetTests(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for title, availability_ids, location_ids, skill_names in (
+            ("Architect", ["1", "3"], ["2"], ["Python", "Django", "SQL"]),
+            ("Developer", ["3"], ["2"], ["Python", "Go"]),
+            ("Tester", ["3"], ["1"], ["Python", "SQL"]),
+        ):
+            job = cls.create_job(title)
+            job.availability_ids = availability_ids
+            job.location_ids = location_ids
+            job.skill_ids = skills.intern(skill_names)
+            job.save()
+
+    def setUp(self):
+        super().setUp()
+        # The tests of a class share the cache version of setUpTestData
+        cache.clear()
+
+    def facets(self, path: str = "/v1/jobs/facets/", **params) -> dict:
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_job_facets(self):
+        facets = self.facets()
+        self.assertEqual(
+            facets["availabilities"],
+            [
+                dict(availability_id="1", description="1-2 days/wk", count=1),
+                dict(availability_id="2", description="3-4 days/wk", count=0),
+                dict(availability_id="3", description="Full Time", count=3),
+            ],
+        )
+        self.assertEqual(
+            facets["locations"],
+            [
+                dict(location_id="1", description="onsite", count=1),
+                dict(location_id="2", description="remote", count=2),
+                dict(location_id="3", description="mixed", count=0),
+            ],
+        )
+        self.assertEqual(
+            facets["skills"][:2],
+            [dict(name="Python", count=3), dict(name="SQL", count=2)],
+        )
+        # The order of ties depends on the skill ids
+        self.assertCountEqual(
+            facets["skills"][2:],
+            [dict(name="Django", count=1), dict(name="Go", count=1)],
+        )
+
+    @override_settings(FACETS_TOP_SKILLS=2)
+    def test_top_skills(self):
+        self.assertEqual(
+            self.facets()["skills"],
+            [dict(name="Python", count=3), dict(name="SQL", count=2)],
+        )
+
+    def test_filters(self):
+        facets = self.facets(skills="Go,Django")
+        self.assertEqual(
+            [location["count"] for location in facets["locations"]], [0, 2, 0]
+        )
+        self.assertEqual(facets["skills"][0], dict(name="Python", count=2))
+        self.assertCountEqual(
+            facets["skills"][1:],
+            [
+                dict(name="Django", count=1),
+                dict(name="Go", count=1),
+                dict(name="SQL", count=1),
+            ],
+        )
+
+        facets = self.facets(skills="Unknown")
+        self.assertEqual(
+            [availability["count"] for availability in facets["availabilities"]],
+            [0, 0, 0],
+        )
+        self.assertEqual(facets["skills"], [])
+
+    def test_professional_facets(self):
+        Professional.objects.filter(pk=self.professional.pk).update(
+            availability_ids=["2"], location_ids=["1", "3"]
+        )
+        facets = self.facets("/v1/professionals/facets/")
+        self.assertNotIn("skills", facets)
+        self.assertEqual(
+            [availability["count"] for availability in facets["availabilities"]],
+            [0, 1, 0],
+        )
+        self.assertEqual(
+            [location["count"] for location in facets["locations"]], [1, 0, 1]
+        )
+        facets = self.facets("/v1/professionals/facets/", min_daily_rate=501)
+        self.assertEqual(
+            [location["count"] for location in facets["locations"]], [0, 0, 0]
+        )
+
+
+class PartitionTests(ApiTestCase):
+    def set_today(self, today: datetime.date):
+        now = datetime.datetime.combine(today, datetime.time(12), datetime.timezone.utc)
+        patcher = mock.patch.object(utils, "now_with_tz", return_value=now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def setUp(self):
+        super().setUp()
+        # Far enough ahead for no partition to exist yet
+        self.set_today(datetime.date(2040, 6, 15))
+        self.months = [datetime.date(2040, month, 1) for month in (6, 7, 8)]
+        self.names = [partitions.partition_name(month) for month in self.months]
+
+    def archived_tables(self) -> List[str]:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT tablename FROM pg_tables WHERE schemaname = %s",
+                [partitions.ARCHIVE_SCHEMA],
+            )
+            return [name for name, in cursor.fetchall()]
+
+    def apply(self, day: datetime.date) -> Application:
+        return Application.objects.create(
+            professional=self.professional,
+            job=self.job,
+            created_at=datetime.datetime.combine(
+                day, datetime.time(12), datetime.timezone.utc
+            ),
+        )
+
+    def test_ensure_partitions(self):
+        self.assertEqual(partitions.ensure_partitions(2), self.names)
+        self.assertEqual(partitions.ensure_partitions(2), [])
+        existing = partitions.list_partitions()
+        self.assertEqual([existing[month] for month in self.months], self.names)
+
+        application = self.apply(datetime.date(2040, 7, 31))
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT id FROM {connection.ops.quote_name(self.names[1])}")
+            self.assertEqual(cursor.fetchall(), [(application.pk,)])
+
+    def test_detach_partitions(self):
+        partitions.ensure_partitions(2)
+        old = self.apply(datetime.date(2040, 6, 1))
+
+        self.set_today(datetime.date(2040, 8, 15))
+        detached = partitions.detach_partitions(retention_months=1)
+        self.assertIn(self.names[0], detached)
+        self.assertNotIn(self.names[1], detached)
+        self.assertEqual(partitions.detach_partitions(retention_months=1), [])
+        self.assertIn(self.names[0], self.archived_tables())
+        self.assertNotIn(self.months[0], partitions.list_partitions())
+        self.assertFalse(Application.objects.filter(pk=old.pk).exists())
+        with connection.cursor() as cursor:
+            qn = connection.ops.quote_name
+            cursor.execute(
+                f"SELECT id FROM {qn(partitions.ARCHIVE_SCHEMA)}.{qn(self.names[0])}"
+            )
+            self.assertEqual(cursor.fetchall(), [(old.pk,)])
+
+        # Left empty: Postgres won't drop a table with rows inserted earlier
+        # in the same transaction, which is the test's
+        detached = partitions.detach_partitions(retention_months=0, drop=True)
+        self.assertEqual(detached, [self.names[1]])
+        self.assertNotIn(self.names[1], self.archived_tables())
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s)", [self.names[1]])
+            self.assertEqual(cursor.fetchone(), (None,))
+
+
+class CachingTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.computed = 0
+
+    def compute(self):
+        self.computed += 1
+        return self.computed
+
+    def get(self, model=Job, **params):
+        query = QueryDict(mutable=True)
+        query.update(params)
+        return caching.get_or_compute("test", model, query, self.compute, timeout=60)
+
+    def test_writes_invalidate(self):
+        self.assertEqual((self.get(), self.get(), self.get(status="open")), (1, 1, 2))
+        self.assertEqual(self.get(Professional), 3)
+
+        # Neither update() nor bulk_create() send post_save
+        Job.objects.filter(pk=self.job.pk).update(title="Architect")
+        self.assertEqual((self.get(), self.get(Professional)), (4, 3))
+        Professional.objects.bulk_create(
+            [
+                Professional(
+                    full_name="Grace Hopper",
+                    email="grace@example.com",
+                    title="Admiral",
+                    daily_rate_range=600,
+                    availability_ids=[],
+                    location_ids=[],
+                    owner=self.user,
+                )
+            ]
+        )
+        self.assertEqual((self.get(), self.get(Professional)), (4, 5))
+
+    def test_version(self):
+        version = caching.get_version(Job)
+        self.create_job("Architect")
+        self.assertGreater(caching.get_version(Job), version)
+        self.assertEqual(caching.get_version(Task), 0)
+
+
+def http_response(status_code: int, content: bytes = b"", **headers) -> Response:
+    response = Response()
+    response.status_code = status_code
+    response.headers = CaseInsensitiveDict(
+        {name.replace("_", "-"): value for name, value in headers.items()}
+    )
+    response._content = content
+    return response
+
+
+class ResponseCacheTests(SimpleTestCase):
+    def test_not_modified(self):
+        cache = ResponseCache()
+        url = "http://testserver/v1/jobs/1/"
+        self.assertEqual(cache.request_headers(url), {})
+
+        cache.process(url, http_response(200, b"job", ETag='"1"', Date="Mon"))
+        self.assertEqual(cache.request_headers(url), {"If-None-Match": '"1"'})
+        response = cache.process(url, http_response(304, Date="Tue"))
+        self.assertEqual((response.status_code, response.content), (200, b"job"))
+        self.assertTrue(response.from_cache)
+        self.assertEqual(response.headers["Date"], "Tue")
+        self.assertEqual(
+            (cache.stats.hits, cache.stats.misses, cache.stats.bytes_saved), (1, 1, 3)
+        )
+
+        # Responses without validators aren't cached, and replace older ones
+        cache.process(url, http_response(200, b"job"))
+        self.assertEqual(len(cache), 0)
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(max_entries=2, max_bytes=10)
+        for url in ("a", "b"):
+            cache.process(url, http_response(200, b"xxx", ETag=url))
+        cache.get("a")
+        cache.process("c", http_response(200, b"xxx", ETag="c"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+
+        cache.process("d", http_response(200, b"x" * 8, ETag="d"))
+        self.assertEqual([url for url in "acd" if cache.get(url)], ["d"])
+        cache.process("e", http_response(200, b"x" * 11, ETag="e"))
+        self.assertIsNone(cache.get("e"))
+        self.assertEqual(cache.stats.evictions, 3)
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cache.jsonl")
+            cache = ResponseCache(path=path)
+            for url in ("a", "b"):
+                cache.process(url, http_response(200, b"\x00" + url.encode(), ETag=url))
+            cache.get("a")
+            cache.save()
+
+            loaded = ResponseCache(max_entries=1, path=path)
+            self.assertEqual(len(loaded), 1)
+            self.assertEqual(loaded.get("a").content, b"\x00a")
+            self.assertEqual(loaded.request_headers("a"), {"If-None-Match": "a"})
+
+
+class RestApiLoggingTests(SimpleTestCase):
+    def api_client(self, **kwargs) -> rest_api.Client:
+        session = mock.Mock()
+        session.request.return_value = http_response(200, b'{"job_id": 1}')
+        return rest_api.Client(base_url="http://testserver", session=session, **kwargs)
+
+    def post(self, client: rest_api.Client) -> None:
+        client.send("POST", "/v1/jobs/", data=dict(title="Architect"))
+
+    def test_bodies(self):
+        with self.assertLogs(rest_api.logger, "DEBUG") as logs:
+            self.post(self.api_client(log_bodies=True))
+        request, request_body, response, response_body = [
+            record.getMessage() for record in logs.records
+        ]
+        self.assertEqual(request, "POST /v1/jobs/")
+        self.assertEqual(request_body, 'request body={"title": "Architect"}')
+        self.assertRegex(response, r"^200 None dt_s=\d+\.\d{3}$")
+        self.assertEqual(response_body, 'response body={"job_id": 1}')
+
+    def test_bodies_are_not_decoded_unless_logged(self):
+        for log_bodies, level in ((False, "DEBUG"), (True, "INFO")):
+            with self.subTest(log_bodies=log_bodies, level=level), mock.patch.object(
+                rest_api, "decode_content"
+            ) as decode_content:
+                with self.assertLogs(rest_api.logger, level) as logs:
+                    self.post(self.api_client(log_bodies=log_bodies))
+                self.assertEqual(len(logs.records), 2)
+                decode_content.assert_not_called()
+
+    def test_sample_rate(self):
+        with self.assertNoLogs(rest_api.logger, "DEBUG"):
+            self.post(self.api_client(log_bodies=True, log_sample_rate=0))
+        with mock.patch.object(rest_api.random, "random", return_value=0.3):
+            with self.assertLogs(rest_api.logger, "INFO") as logs:
+                self.post(self.api_client(log_sample_rate=0.5))
+        self.assertEqual(len(logs.records), 2)
+
+    def test_truncated_bodies(self):
+        max_chars = rest_api.LOG_BODY_MAX_CHARS
+        text = "x" * (max_chars + 10)
+        self.assertEqual(
+            str(rest_api.LazyBody(text.encode())),
+            f"{text[:max_chars]}... ({max_chars + 10} chars)",
+        )
+        self.assertEqual(
+            str(rest_api.LazyBody(text[:max_chars].encode())), text[:max_chars]
+        )
+        self.assertEqual(
+            str(rest_api.LazyBody(dict(title="Architect"), max_chars=10)),
+            '{"title": ... (22 chars)',
+        )
+        self.assertEqual(str(rest_api.LazyBody(b"\xff")), "b'\\xff'")
+
+
+@taskqueue.task("test_echo")
+def echo_task(**kwargs):
+    return kwargs
+
+
+@taskqueue.task("test_fail", max_attempts=2)
+def fail_task():
+    raise RuntimeError("failed")
+
+
+class TaskQueueTests(TestCase):
+    def expire(self, task: Task) -> None:
+        Task.objects.filter(pk=task.pk).update(
+            run_at=utils.now_with_tz() - datetime.timedelta(seconds=1)
+        )
+
+    def test_claim_and_execute(self):
+        queued = echo_task.enqueue(value=1)
+        task = taskqueue.claim()
+        self.assertEqual(task.pk, queued.pk)
+        self.assertEqual((task.status, task.attempts), (Task.Status.RUNNING, 1))
+        self.assertGreater(task.run_at, utils.now_with_tz())
+        # Leased until it finishes or the lease expires
+        self.assertIsNone(taskqueue.claim())
+
+        taskqueue.execute(task)
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.Status.SUCCEEDED)
+        self.assertEqual(task.result, dict(value=1))
+        self.assertIsNone(taskqueue.claim())
+
+    def test_retries(self):
+        fail_task.enqueue()
+        task = taskqueue.claim()
+        taskqueue.execute(task)
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.Status.QUEUED)
+        self.assertEqual(
+            task.run_at - task.finished_at, taskqueue.retry_delay(task.attempts)
+        )
+        self.assertIn("RuntimeError: failed", task.last_error)
+        self.assertIsNone(taskqueue.claim())
+
+        self.expire(task)
+        task = taskqueue.claim()
+        self.assertEqual(task.attempts, 2)
+        taskqueue.execute(task)
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.Status.FAILED)
+
+    def test_expired_lease(self):
+        queued = echo_task.enqueue()
+        Task.objects.filter(pk=queued.pk).update(max_attempts=2)
+        self.expire(taskqueue.claim())
+
+        task = taskqueue.claim()
+        self.assertEqual((task.pk, task.attempts), (queued.pk, 2))
+        self.assertEqual(task.last_error, "Lease expired before the task finished")
+
+        self.expire(task)
+        self.assertIsNone(taskqueue.claim())
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.Status.FAILED)
+
+    def test_unknown_task(self):
+        taskqueue.enqueue("test_unknown")
+        task = taskqueue.claim()
+        taskqueue.execute(task)
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.Status.FAILED)
+
+
+class ChangeFeedTests(ApiTestCase):
+    def log(self, txid: int, entity: str, object_id: int, op: str) -> ChangeLog:
+        # Transaction ids below the current one, as if committed long ago
+        return ChangeLog.objects.create(
+            txid=txid,
+            entity=entity,
+            object_id=object_id,
+            op=op,
+            changed_at=utils.now_with_tz(),
+        )
+
+    def test_cursor(self):
+        self.assertEqual(changes.decode_cursor(changes.encode_cursor((7, 42))), (7, 42))
+        for value in ("7", "x-1", ""):
+            with self.assertRaises(ValueError):
+                changes.decode_cursor(value)
+        response = self.client.get("/v1/changes/", dict(since="7"))
+        self.assertEqual(response.status_code, 400)
+
+    def test_read_rows_in_commit_order(self):
+        later = self.log(2, "job", self.job.pk, "update")
+        earlier = self.log(1, "professional", self.professional.pk, "insert")
+        self.log(1, "business", self.business.pk, "insert")
+        # Changes of transactions still running, like this one, are skipped
+        self.create_job("Architect")
+
+        rows, cursor, has_more = changes.read_rows(None, 2)
+        self.assertEqual([row.txid for row in rows], [1, 1])
+        self.assertEqual(rows[0].pk, earlier.pk)
+        self.assertTrue(has_more)
+        rows, cursor, has_more = changes.read_rows(cursor, 2)
+        self.assertEqual([row.pk for row in rows], [later.pk])
+        self.assertEqual((cursor, has_more), ((2, later.pk), False))
+        self.assertEqual(changes.read_rows(cursor, 2), ([], cursor, False))
+        self.assertEqual(changes.latest_cursor(), cursor)
+
+        rows, _, _ = changes.read_rows(None, 10, entities=["job"])
+        self.assertEqual([row.pk for row in rows], [later.pk])
+
+    def test_list(self):
+        self.log(1, "job", self.job.pk, "update")
+        self.log(2, "job", 0, "delete")
+
+        response = self.client.get("/v1/changes/", dict(limit=1))
+        self.assertEqual(response.status_code, 200, response.content)
+        page = response.json()
+        (change,) = page["changes"]
+        self.assertEqual((change["type"], change["id"]), ("job", self.job.pk))
+        self.assertEqual(change["data"]["title"], "Engineer")
+        self.assertTrue(page["has_more"])
+
+        page = self.client.get("/v1/changes/", dict(since=page["cursor"])).json()
+        (change,) = page["changes"]
+        self.assertEqual((change["op"], change["data"]), ("delete", None))
+        self.assertFalse(page["has_more"])
+
+
+class EventStreamTests(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.job = cls.create_job("Architect")
+        cls.token = str(AccessToken.for_user(cls.user))
+
+    def scope(self, path: str, token: str = None, **kwargs) -> dict:
+        headers = []
+        if token:
+            headers.append((b"authorization", f"Bearer {token}".encode()))
+        return dict(
+            dict(type="http", method="GET", headers=headers, query_string=b""),
+            path=path,
+            **kwargs,
+        )
+
+    def request(self, path: str, token: str = None, **kwargs) -> List[dict]:
+        messages = []
+
+        async def app(scope, receive, send):
+            await events.send_json(send, 200, {"detail": "Django"})
+
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            messages.append(message)
+
+        router = events.EventRouter(app, streams.ROUTES)
+        # Closing the connection would break the test transaction
+        with mock.patch.object(streams, "close_old_connections"):
+            async_to_sync(router)(self.scope(path, token, **kwargs), receive, send)
+        return messages
+
+    def response(self, path: str, token: str = None, **kwargs) -> Tuple[int, dict]:
+        start, body = self.request(path, token, **kwargs)
+        return start["status"], json.loads(body["body"])
+
+    def test_authenticate(self):
+        path = f"/v1/jobs/{self.job.pk}/events/"
+        scope = self.scope(path, self.token)
+        self.assertEqual(events.authenticate(scope), self.user.pk)
+        query_string = urlencode(dict(access_token=self.token)).encode()
+        scope = self.scope(path, query_string=query_string)
+        self.assertEqual(events.authenticate(scope), self.user.pk)
+        self.assertIsNone(events.authenticate(self.scope(path)))
+        self.assertIsNone(events.authenticate(self.scope(path, "not a token")))
+        scope = self.scope(path, headers=[(b"authorization", b"Basic b3duZXI6")])
+        self.assertIsNone(events.authenticate(scope))
+
+    def test_router(self):
+        path = f"/v1/jobs/{self.job.pk}/events/"
+        detail = 'Method "POST" not allowed.'
+        response = self.response(path, self.token, method="POST")
+        self.assertEqual(response, (405, {"detail": detail}))
+        self.assertEqual(self.response(path)[0], 401)
+        self.assertEqual(self.response(path, "not a token")[0], 401)
+        self.assertEqual(self.response("/v1/jobs/0/events/", self.token)[0], 404)
+        response = self.response("/v1/jobs/", self.token)
+        self.assertEqual(response, (200, {"detail": "Django"}))
+
+    def test_owner_or_staff_only(self):
+        other = get_user_model().objects.create_user(username="other")
+        token = str(AccessToken.for_user(other))
+        for path in (
+            f"/v1/jobs/{self.job.pk}/events/",
+            f"/v1/business/{self.business.pk}/events/",
+        ):
+            with self.subTest(path), mock.patch.object(events, "stream") as stream:
+                self.assertEqual(self.response(path, token)[0], 403)
+                stream.assert_not_called()
+
+        other.is_staff = True
+        other.save()
+        with mock.patch.object(events, "stream") as stream:
+            messages = self.request(f"/v1/business/{self.business.pk}/events/", token)
+        self.assertEqual(messages, [])
+        stream.assert_called_once()
+
+    def test_subscribes_to_the_object(self):
+        with mock.patch.object(events, "stream") as stream:
+            self.request(f"/v1/jobs/{self.job.pk}/events/", self.token)
+        _, _, channel, predicate = stream.call_args.args
+        self.assertEqual(channel, streams.APPLICATIONS_CHANNEL)
+        self.assertTrue(predicate(dict(job_id=self.job.pk)))
+        self.assertFalse(predicate(dict(job_id=self.job.pk + 1)))
+
+    def test_format_event(self):
+        payload = dict(job_id=1, created_at=datetime.datetime(2021, 7, 1, 12, 30))
+        self.assertEqual(
+            events.format_event("application", payload),
+            b"event: application\n"
+            b'data: {"job_id": 1, "created_at": "2021-07-01T12:30:00"}\n\n',
+        )
+
+    @override_settings(SSE_QUEUE_SIZE=1)
+    def test_dispatch(self):
+        listener = events.Listener()
+        job, other = (
+            events.Subscription("ch", lambda payload, pk=pk: payload["job_id"] == pk)
+            for pk in (1, 2)
+        )
+        listener.subscriptions["ch"] = {job, other}
+
+        listener._dispatch("ch", json.dumps(dict(job_id=1)))
+        self.assertEqual(job.queue.get_nowait(), dict(job_id=1))
+        self.assertTrue(other.queue.empty())
+
+        listener._dispatch("other", json.dumps(dict(job_id=1)))
+        self.assertTrue(job.queue.empty())
+
+        with self.assertLogs(events.logger, "WARNING") as logs:
+            listener._dispatch("ch", "{")
+            listener._dispatch("ch", json.dumps(dict(job_id=1)))
+            listener._dispatch("ch", json.dumps(dict(job_id=1)))
+        self.assertEqual(job.queue.qsize(), 1)
+        self.assertEqual(
+            [record.getMessage() for record in logs.records],
+            [
+                "Ignoring malformed notification on ch",
+                "Dropping a notification for a slow ch stream",
+            ],
+        )
+
+
+class ArchiveTests(ApiTestCase):
+    def test_archived_rows_are_logged_as_archive(self):
+        application = Application.objects.create(
+            professional=self.professional, job=self.job
+        )
+        deleted_job = self.create_job("Architect")
+        deleted_job_id = deleted_job.pk
+        Job.objects.filter(pk=self.job.pk).update(
+            status=Job.Status.CLOSED,
+            updated_at=utils.now_with_tz() - datetime.timedelta(days=10),
+        )
+        ChangeLog.objects.all().delete()
+
+        self.assertEqual(archive.archive_jobs(days=5), dict(jobs=1, applications=1))
+        deleted_job.delete()
+
+        self.assertEqual(
+            sorted(ChangeLog.objects.values_list("entity", "object_id", "op")),
+            [
+                ("application", application.pk, "archive"),
+                ("job", self.job.pk, "archive"),
+                ("job", deleted_job_id, "delete"),
+            ],
+        )
+        self.assertTrue(JobWithArchive.objects.filter(pk=self.job.pk).exists())
+
+
+class SkillsTests(ApiTestCase):
+    def test_skills_are_interned_when_saving(self):
+        response = self.client.post(
+            f"/v1/business/{self.business.pk}/jobs/",
+            dict(
+                title="Backend developer",
+                daily_rate_range="450.000",
+                availability_ids=["1"],
+                location_ids=["1"],
+                skills=["Python", "  python ", "Django"],
+            ),
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()["skills"], ["Python", "Django"])
+        job = Job.objects.get(pk=response.json()["job_id"])
+        self.assertEqual(
+            job.skill_ids,
+            [
+                Skill.objects.get(normalized_name=name).pk
+                for name in ("python", "django")
+            ],
+        )
+
+    def test_invalid_jobs_dont_create_skills(self):
+        response = self.client.post(
+            f"/v1/business/{self.business.pk}/jobs/",
+            dict(title="x" * 51, skills=["Rust"]),
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Skill.objects.filter(normalized_name="rust").exists())
+
+    def test_only_committed_skills_are_cached(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                skills.intern(["Rust"])
+                transaction.set_rollback(True)
+            (go_id,) = skills.intern(["Go"])
+            # Not cached before the commit
+            self.assertNotIn("go", skills._ids_by_normalized_name)
+
+        self.assertNotIn("rust", skills._ids_by_normalized_name)
+        self.assertEqual(skills._ids_by_normalized_name["go"], go_id)
+        self.assertEqual(skills.names([go_id]), ["Go"])
+        self.assertEqual(skills.lookup(["GO", "Rust"]), [go_id])
+
+    def test_names_are_resolved_once_per_page(self):
+        def create_job(title, skill_names):
+            job = self.create_job(title)
+            job.skill_ids = skills.intern(skill_names)
+            job.save()
+
+        def count_queries(path):
+            # Skills created in the test transaction are never cached
+            with mock.patch.dict(skills._names_by_id, clear=True):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(path)
+            self.assertEqual(response.status_code, 200, response.content)
+            return len(queries), response.json()
+
+        paths = (
+            "/v1/jobs/",
+            f"/v1/business/{self.business.pk}/jobs/",
+        )
+        create_job("Backend developer", ["Python", "Django"])
+        queries = {path: count_queries(path)[0] for path in paths}
+        create_job("Frontend developer", ["TypeScript", "python"])
+        create_job("Data engineer", ["SQL"])
+        for path in paths:
+            with self.subTest(path):
+                count, body = count_queries(path)
+                self.assertEqual(count, queries[path])
+                self.assertEqual(
+                    sorted(job["skills"] for job in body),
+                    [[], ["Python", "Django"], ["SQL"], ["TypeScript", "Python"]],
+                )
+
+
+class TrafficCaptureTests(TestCase):
+    def test_mask(self):
+        self.assertEqual(
+            traffic.mask(
+                dict(
+                    full_name="Ada Lovelace",
+                    website="https://ada.example.com/2",
+                    daily_rate_range="450.5",
+                    availability_ids=["1", "2"],
+                    count=3,
+                    active=True,
+                    password="1234",
+                    email=None,
+                )
+            ),
+            dict(
+                full_name="xxx xxxxxxxx",
+                website="https://xxx.xxxxxxx.xxx/0",
+                daily_rate_range="450.5",
+                availability_ids=["1", "2"],
+                count=3,
+                active=True,
+                password="0000",
+                email=None,
+            ),
+        )
+        self.assertEqual(traffic.mask([dict(username=42)]), [dict(username=0)])
+
+    def test_anonymize_query(self):
+        query = QueryDict("email=ada@example.com&limit=10&title=Engineer")
+        self.assertEqual(
+            traffic.anonymize_query(query),
+            dict(email=["xxx@xxxxxxx.xxx"], limit=["10"], title=["Engineer"]),
+        )
+
+    def test_parse_server_timing(self):
+        parse = metrics.parse_server_timing
+        self.assertEqual(parse("db;dur=2, app;desc=x;dur=12.5"), 0.0125)
+        self.assertIsNone(parse("db;dur=2"))
+        self.assertIsNone(parse("app;dur=soon"))
+        self.assertIsNone(parse(None))
+
+    def test_capture(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "capture.ndjson")
+            with self.settings(
+                TRAFFIC_CAPTURE_PATH=path, TRAFFIC_CAPTURE_SAMPLE_RATE=1
+            ):
+                response = APIClient().post(
+                    "/v1/token/",
+                    dict(username="ada", password="secret"),
+                    format="json",
+                )
+            with open(path) as fd:
+                (record,) = traffic.read_capture(fd)
+
+        self.assertEqual(
+            {key: record[key] for key in ("method", "route", "path", "body")},
+            dict(
+                method="POST",
+                route="token_obtain_pair",
+                path="/v1/token/",
+                body=dict(username="xxx", password="xxxxxx"),
+            ),
+        )
+        self.assertEqual(record["status"], response.status_code)
+        # The capture keeps microseconds
+        self.assertAlmostEqual(
+            record["duration_s"],
+            metrics.parse_server_timing(response["Server-Timing"]),
+            places=6,
+        )
+
+
+class ImportReportTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = self.settings(IMPORT_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def import_professionals(self, csv: str) -> int:
+        upload = SimpleUploadedFile("professionals.csv", csv.encode())
+        response = self.client.post("/v1/professionals/import/", dict(file=upload))
+        self.assertEqual(response.status_code, 202, response.content)
+        taskqueue.execute(taskqueue.claim())
+        return response.json()["task_id"]
+
+    def test_report(self):
+        task_id = self.import_professionals(
+            "full_name,email,title,daily_rate_range,availability_ids,location_ids\n"
+            "Grace Hopper,grace@example.com,Admiral,600,1|2,1\n"
+            "Nobody,not an email,Clerk,100,1,1\n"
+        )
+        result = self.client.get(f"/v1/tasks/{task_id}/").json()["result"]
+        self.assertEqual((result["created"], result["failed"]), (1, 1))
+
+        response = self.client.get(f"/v1/tasks/{task_id}/report/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        (error,) = [json.loads(line) for line in lines]
+        self.assertEqual((error["row"], list(error["errors"])), (2, ["email"]))
+
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(username="other")
+        )
+        response = self.client.get(f"/v1/tasks/{task_id}/report/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_no_report(self):
+        task_id = self.import_professionals(
+            "full_name,email,title,daily_rate_range,availability_ids,location_ids\n"
+            "Grace Hopper,grace@example.com,Admiral,600,1|2,1\n"
+        )
+        response = self.client.get(f"/v1/tasks/{task_id}/report/")
+        self.assertEqual(response.status_code, 404)
+
+    def import_jobs(self, name: str, content: str) -> dict:
+        upload = SimpleUploadedFile(name, content.encode())
+        response = self.client.post(
+            f"/v1/business/{self.business.pk}/jobs/import/", dict(file=upload)
+        )
+        self.assertEqual(response.status_code, 202, response.content)
+        taskqueue.execute(taskqueue.claim())
+        task_id = response.json()["task_id"]
+        return self.client.get(f"/v1/tasks/{task_id}/").json()["result"]
+
+    def assertImportedSkills(self, expected: Dict[str, List[str]]):
+        jobs = Job.objects.filter(title__in=expected)
+        self.assertEqual(
+            {job.title: skills.names(job.skill_ids) for job in jobs}, expected
+        )
+
+    def test_jobs_csv(self):
+        result = self.import_jobs(
+            "jobs.csv",
+            "title,daily_rate_range,availability_ids,location_ids,skills\n"
+            "Architect,600,1|2,1,Python|Django\n"
+            "Developer,500,1,1,python|Go|Django\n"
+            "Intern,300,1,1,\n",
+        )
+        self.assertEqual((result["created"], result["failed"]), (3, 0))
+        self.assertImportedSkills(
+            {
+                "Architect": ["Python", "Django"],
+                "Developer": ["Python", "Go", "Django"],
+                "Intern": [],
+            }
+        )
+
+    def test_jobs_ndjson(self):
+        rows = [
+            dict(title="Architect", daily_rate_range=600, skills=["Rust"]),
+            dict(title="Developer", daily_rate_range=500, skills=["rust", "SQL"]),
+        ]
+        result = self.import_jobs(
+            "jobs.ndjson",
+            "".join(
+                json.dumps(dict(row, availability_ids=[1], location_ids=[1])) + "\n"
+                for row in rows
+            ),
+        )
+        self.assertEqual((result["created"], result["failed"]), (2, 0))
+        self.assertImportedSkills({"Architect": ["Rust"], "Developer": ["Rust", "SQL"]})
+
+    def test_rejected_batch(self):
+        bulk_create = Job.objects.bulk_create
+
+        def reject_broken(jobs, **kwargs):
+            if any(job.title == "Broken" for job in jobs):
+                raise DatabaseError("value rejected")
+            return bulk_create(jobs, **kwargs)
+
+        csv = (
+            "title,daily_rate_range,availability_ids,location_ids,skills\n"
+            "Architect,600,1,1,Python\n"
+            "Broken,500,1,1,Cobol\n"
+            "Developer,500,1,1,Go\n"
+        )
+        with mock.patch.object(Job.objects, "bulk_create", reject_broken):
+            result = importers.import_records(
+                "jobs",
+                io.BytesIO(csv.encode()),
+                "csv",
+                owner=self.user,
+                business=self.business,
+                batch_size=1,
+            )
+        self.assertEqual((result["created"], result["failed"]), (2, 1))
+        self.assertEqual(
+            result["errors"],
+            [dict(row=2, errors={"non_field_errors": ["value rejected"]})],
+        )
+        self.assertImportedSkills({"Architect": ["Python"], "Developer": ["Go"]})
+        # The skills of the rejected batch were rolled back with it
+        self.assertEqual(skills.lookup(["Cobol"]), [])
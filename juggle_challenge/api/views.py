@@ -1,30 +1,67 @@
 from __future__ import annotations
 
 import datetime
+import uuid
 
+from django.http import FileResponse, Http404
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.db import transaction
 from django_filters.rest_framework import DjangoFilterBackend
-from django_filters import FilterSet, DateTimeFilter, CharFilter
+from django_filters import (
+    FilterSet,
+    ChoiceFilter,
+    DateTimeFilter,
+    CharFilter,
+    NumberFilter,
+)
 
+from django.conf import settings
 from rest_framework import decorators, status, viewsets, mixins
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework.serializers import ValidationError
 from rest_framework.permissions import IsAuthenticated, AllowAny
 
 
-from .models import Business, Job, Professional
+from . import (
+    aggregates,
+    caching,
+    changes,
+    importers,
+    rollups,
+    similarity,
+    skills,
+    streams,
+)
+from .data import AVAILABILITIES, LOCATIONS
+from .models import Application, Business, Job, JobWithArchive, Professional, Task
 from .serializers import (
     AuthUserSerializer,
     BusinessSerializer,
     JobSerializer,
     ProfessionalSerializer,
+    TaskSerializer,
+)
+from juggle_challenge import metrics, utils
+from juggle_challenge.baseviews import (
+    BulkRetrieveMixin,
+    ChildMixin,
+    OwnerListMixin,
+    OwnerSaveMixin,
+    SparseQuerysetMixin,
 )
-from juggle_challenge.baseviews import ChildMixin, OwnerSaveMixin
+from juggle_challenge.permissions import IsOwner
+from juggle_challenge.serializers import optimize_queryset
+from juggle_challenge.querycount import query_budget
 
 AuthUser = get_user_model()
 
+JOB_APPLY_REJECTIONS = metrics.counter(
+    "job_apply_rejections_total", "Job applications rejected", ["reason"]
+)
+
 
 class CreateUserViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
     permission_classes = (AllowAny,)
@@ -32,9 +69,88 @@ class CreateUserViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
     serializer_class = AuthUserSerializer
 
 
+def task_accepted_response(task):
+    """202 response for work handed to the task queue."""
+    return Response(
+        TaskSerializer(task).data,
+        status=status.HTTP_202_ACCEPTED,
+        headers={
+            "Location": utils.build_absolute_url(
+                path=reverse("task-detail", args=[task.pk])
+            )
+        },
+    )
+
+
+def import_upload_response(request, kind, business=None):
+    upload = request.FILES.get("file")
+    if upload is None:
+        raise ValidationError({"file": "This field is required."})
+    try:
+        fmt = request.data.get("format") or importers.format_from_name(upload.name)
+        if fmt not in importers.FORMATS:
+            raise importers.ImportFormatError(f"Unsupported file format {fmt!r}")
+    except importers.ImportFormatError as exc:
+        raise ValidationError({"format": str(exc)})
+
+    path = importers.upload_path(f"{uuid.uuid4().hex}.{fmt}")
+    with open(path, "wb") as fd:
+        for chunk in upload.chunks():
+            fd.write(chunk)
+
+    task = importers.import_file.enqueue(
+        owner=request.user,
+        kind=kind,
+        path=path,
+        fmt=fmt,
+        owner_id=request.user.pk,
+        business_id=business.pk if business is not None else None,
+    )
+    return task_accepted_response(task)
+
+
+def facets_response(request, queryset, facets, cache_model=None):
+    counts = caching.get_or_compute(
+        "facets",
+        cache_model or queryset.model,
+        request.GET,
+        lambda: aggregates.facet_counts(
+            queryset, facets, limits=dict(skill=settings.FACETS_TOP_SKILLS)
+        ),
+        timeout=settings.FACETS_CACHE_TIMEOUT,
+    )
+    data = dict(
+        availabilities=[
+            dict(
+                availability_id=availability.availability_id,
+                description=availability.description,
+                count=counts["availability"].get(availability.availability_id, 0),
+            )
+            for availability in AVAILABILITIES
+        ],
+        locations=[
+            dict(
+                location_id=location.location_id,
+                description=location.description,
+                count=counts["location"].get(location.location_id, 0),
+            )
+            for location in LOCATIONS
+        ],
+    )
+    if "skill" in counts:
+        data["skills"] = [
+            dict(name=name, count=counts["skill"][str(pk)])
+            for pk, name in skills.names_by_id(map(int, counts["skill"])).items()
+        ]
+    return Response(data)
+
+
 class JobFilterSet(FilterSet):
     title = CharFilter(lookup_expr="iexact")
-    daily_date_range = CharFilter(lookup_expr="iexact")
+    min_daily_rate = NumberFilter(field_name="daily_rate_range", lookup_expr="gte")
+    max_daily_rate = NumberFilter(field_name="daily_rate_range", lookup_expr="lte")
+    skills = CharFilter(method="filter_skills")
+    status = ChoiceFilter(choices=Job.Status.choices)
     min_created_datetime = DateTimeFilter(field_name="created_at", lookup_expr="gte")
     max_created_datetime = DateTimeFilter(field_name="created_at", lookup_expr="lte")
 
@@ -42,23 +158,64 @@ class JobFilterSet(FilterSet):
         model = Job
         fields = [
             "title",
-            "daily_date_range",
+            "min_daily_rate",
+            "max_daily_rate",
+            "skills",
+            "status",
             "min_created_datetime",
             "max_created_datetime",
         ]
 
+    def filter_skills(self, queryset, name, value):
+        skill_ids = skills.lookup(value.split(","))
+        if not skill_ids:
+            return queryset.none()
+        return queryset.filter(skill_ids__overlap=skill_ids)
+
+
+class JobWithArchiveFilterSet(JobFilterSet):
+    class Meta(JobFilterSet.Meta):
+        model = JobWithArchive
+
 
-class JobViewSet(ChildMixin, viewsets.ModelViewSet):
+class JobViewSet(
+    SparseQuerysetMixin,
+    BulkRetrieveMixin,
+    ChildMixin,
+    OwnerListMixin,
+    viewsets.ModelViewSet,
+):
     permission_classes = [IsAuthenticated]
     queryset = Job.objects.all()
     serializer_class = JobSerializer
     filter_backends = [DjangoFilterBackend]
-    filterset_class = JobFilterSet
+
+    # Read-only actions that can also search archived jobs
+    archive_actions = ("list", "retrieve", "rate_histogram", "facets")
+
+    def include_archived(self) -> bool:
+        return self.action in self.archive_actions and self.request.GET.get(
+            "include_archived", ""
+        ).lower() in ("true", "1")
+
+    @property
+    def filterset_class(self):
+        if self.include_archived():
+            return JobWithArchiveFilterSet
+        return JobFilterSet
+
+    def get_queryset(self):
+        if self.include_archived():
+            return optimize_queryset(
+                JobWithArchive.objects.all(), self.get_serializer_class(), self.request
+            )
+        return super().get_queryset()
 
     def get_professional_serializer_class(self):
         return ProfessionalSerializer
 
     @decorators.action(detail=True, methods=["get"])
+    @query_budget(3)
     def professionals(self, request, pk):
         resp = self.child_action(
             request,
@@ -70,10 +227,71 @@ class JobViewSet(ChildMixin, viewsets.ModelViewSet):
         )
         return resp
 
+    @decorators.action(
+        detail=False,
+        methods=["get"],
+        url_path="rate-histogram",
+        url_name="rate-histogram",
+    )
+    def rate_histogram(self, request):
+        try:
+            buckets = int(request.GET.get("buckets", 10))
+        except ValueError:
+            buckets = 0
+        if not 1 <= buckets <= 100:
+            raise ValidationError({"buckets": "Must be an integer between 1 and 100."})
+
+        data = caching.get_or_compute(
+            "rate_histogram",
+            Job,
+            request.GET,
+            lambda: aggregates.rate_histogram(
+                self.filter_queryset(self.get_queryset()), buckets=buckets
+            ),
+            timeout=settings.RATE_HISTOGRAM_CACHE_TIMEOUT,
+        )
+        return Response(data)
+
+    @decorators.action(detail=False, methods=["get"])
+    def facets(self, request):
+        return facets_response(
+            request,
+            self.filter_queryset(self.get_queryset()),
+            dict(
+                availability="availability_ids",
+                location="location_ids",
+                skill="skill_ids",
+            ),
+            cache_model=Job,
+        )
+
+    # Not budgeted: catching up with job changes adds queries every
+    # SIMILAR_JOBS_REFRESH_SECONDS
+    @decorators.action(detail=True, methods=["get"])
+    def similar(self, request, pk):
+        try:
+            limit = int(request.GET.get("limit", 10))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= 50:
+            raise ValidationError({"limit": "Must be an integer between 1 and 50."})
+
+        scores = dict(similarity.similar_jobs(self.get_object(), limit))
+        jobs = self.get_queryset().in_bulk(scores)
+        data = []
+        for job_id, score in scores.items():
+            # The index may lag behind deletions by a few seconds
+            if job_id in jobs:
+                job_data = self.get_serializer(jobs[job_id]).data
+                job_data["similarity"] = round(score, 3)
+                data.append(job_data)
+        return Response(data)
+
 
 class ProfessionalFilterSet(FilterSet):
     title = CharFilter(lookup_expr="icontains")
-    daily_date_range = CharFilter(lookup_expr="iexact")
+    min_daily_rate = NumberFilter(field_name="daily_rate_range", lookup_expr="gte")
+    max_daily_rate = NumberFilter(field_name="daily_rate_range", lookup_expr="lte")
     email = CharFilter(lookup_expr="iexact")
     full_name = CharFilter(lookup_expr="icontains")
     min_created_datetime = DateTimeFilter(field_name="created_at", lookup_expr="gte")
@@ -83,7 +301,8 @@ class ProfessionalFilterSet(FilterSet):
         model = Professional
         fields = [
             "title",
-            "daily_date_range",
+            "min_daily_rate",
+            "max_daily_rate",
             "email",
             "full_name",
             "min_created_datetime",
@@ -91,16 +310,45 @@ class ProfessionalFilterSet(FilterSet):
         ]
 
 
-class ProfessionalViewSet(ChildMixin, OwnerSaveMixin, viewsets.ModelViewSet):
+class ProfessionalViewSet(
+    SparseQuerysetMixin,
+    BulkRetrieveMixin,
+    ChildMixin,
+    OwnerListMixin,
+    OwnerSaveMixin,
+    viewsets.ModelViewSet,
+):
     permission_classes = [IsAuthenticated]
     queryset = Professional.objects.all()
     serializer_class = ProfessionalSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = ProfessionalFilterSet
 
+    @query_budget(2)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
     def get_job_serializer_class(self):
         return JobSerializer
 
+    @decorators.action(detail=False, methods=["get"])
+    def facets(self, request):
+        return facets_response(
+            request,
+            self.filter_queryset(self.get_queryset()),
+            dict(availability="availability_ids", location="location_ids"),
+        )
+
+    @decorators.action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        url_name="import",
+        parser_classes=[MultiPartParser],
+    )
+    def bulk_import(self, request):
+        return import_upload_response(request, "professionals")
+
     @decorators.action(detail=True, methods=["get"])
     def jobs(self, request, pk):
         resp = self.child_action(
@@ -122,19 +370,36 @@ class ProfessionalViewSet(ChildMixin, OwnerSaveMixin, viewsets.ModelViewSet):
     def job_apply(self, request, job_id, pk):
         with transaction.atomic():
             professional = self.get_object()
-            job = get_object_or_404(Job, pk=job_id)
-
-            if (
-                job.professional_list.filter(
-                    created_at__date=datetime.date.today()
-                ).count()
-                >= 5
-            ):
+            # Lock the job so concurrent applications can't exceed the limit
+            job = get_object_or_404(Job.objects.select_for_update(), pk=job_id)
+            if job.status != Job.Status.OPEN:
+                JOB_APPLY_REJECTIONS.inc(reason="job_closed")
+                raise ValidationError("This job is no longer accepting applications.")
+
+            # The job lock also keeps a concurrent request from applying twice
+            if Application.objects.filter(professional=professional, job=job).exists():
+                return Response(status=status.HTTP_200_OK)
+
+            # A half-open range on created_at lets Postgres prune to the
+            # current Application partition
+            today = utils.now_with_tz().replace(
+                hour=0, minute=0, second=0, microsecond=0
+            )
+            applications_today = Application.objects.filter(
+                job=job,
+                created_at__gte=today,
+                created_at__lt=today + datetime.timedelta(days=1),
+            ).count()
+            if applications_today >= 5:
+                JOB_APPLY_REJECTIONS.inc(reason="daily_limit")
                 raise ValidationError(
                     "The limit of applications for the current job was reached. Please try again tomorrow."
                 )
 
-            professional.jobs.add(job)
+            Application.objects.create(professional=professional, job=job)
+            rollups.record_application(job, today.date())
+            # Delivered to the event streams when the transaction commits
+            streams.notify_application(professional, job)
 
         return Response(status=status.HTTP_200_OK)
 
@@ -151,6 +416,7 @@ class BusinessCreateViewSet(
 
 class BusinessRetrieveUpdateViewSet(
     ChildMixin,
+    OwnerListMixin,
     OwnerSaveMixin,
     mixins.RetrieveModelMixin,
     mixins.UpdateModelMixin,
@@ -172,5 +438,85 @@ class BusinessRetrieveUpdateViewSet(
             queryset=self.get_object().job_set,
             lookup_field="pk",
             parent_name="business",
+            filterset_class=JobFilterSet,
         )
         return resp
+
+    @decorators.action(
+        detail=True,
+        methods=["post"],
+        url_path="jobs/import",
+        url_name="jobs-import",
+        parser_classes=[MultiPartParser],
+    )
+    def jobs_import(self, request, pk):
+        return import_upload_response(request, "jobs", business=self.get_object())
+
+    @decorators.action(
+        detail=True, methods=["get"], permission_classes=[IsAuthenticated, IsOwner]
+    )
+    @query_budget(3)
+    def stats(self, request, pk):
+        max_days = settings.BUSINESS_STATS_MAX_DAYS
+        try:
+            days = int(request.GET.get("days", settings.BUSINESS_STATS_DAYS))
+        except ValueError:
+            days = 0
+        if not 1 <= days <= max_days:
+            raise ValidationError(
+                {"days": f"Must be an integer between 1 and {max_days}."}
+            )
+        return Response(rollups.business_stats(self.get_object(), days))
+
+
+class TaskViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    permission_classes = [IsAuthenticated]
+    queryset = Task.objects.all()
+    serializer_class = TaskSerializer
+
+    def get_queryset(self):
+        if getattr(self, "swagger_fake_view", False):
+            return Task.objects.none()
+        return super().get_queryset().filter(owner=self.request.user)
+
+    @decorators.action(detail=True, methods=["get"])
+    def report(self, request, pk):
+        """The rows an import rejected, with their errors, as NDJSON."""
+        path = importers.report_path(self.get_object())
+        try:
+            fd = open(path, "rb") if path else None
+        except FileNotFoundError:
+            fd = None
+        if fd is None:
+            raise Http404("This task has no error report.")
+        return FileResponse(fd, content_type="application/x-ndjson")
+
+
+class ChangeViewSet(viewsets.ViewSet):
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request):
+        since = request.GET.get("since")
+        try:
+            cursor = changes.decode_cursor(since) if since else None
+        except ValueError:
+            raise ValidationError({"since": "Invalid cursor."})
+
+        max_limit = settings.CHANGES_MAX_PAGE_SIZE
+        try:
+            limit = int(request.GET.get("limit", settings.CHANGES_PAGE_SIZE))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= max_limit:
+            raise ValidationError(
+                {"limit": f"Must be an integer between 1 and {max_limit}."}
+            )
+
+        results, next_cursor, has_more = changes.read_changes(cursor, limit)
+        return Response(
+            dict(
+                changes=results,
+                cursor=changes.encode_cursor(next_cursor),
+                has_more=has_more,
+            )
+        )
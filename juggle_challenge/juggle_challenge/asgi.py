@@ -13,4 +13,11 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'juggle_challenge.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Importing the streams needs the app registry set up by the line above
+from api.streams import ROUTES  # noqa: E402
+from juggle_challenge.events import EventRouter  # noqa: E402
+
+# Server-sent event streams are handled here, everything else by Django
+application = EventRouter(django_application, ROUTES)
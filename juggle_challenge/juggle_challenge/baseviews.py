@@ -1,11 +1,15 @@
 from __future__ import annotations
 
+from django.conf import settings
 from django.core import exceptions
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
-from rest_framework import response, status
+from rest_framework import decorators, response, status
+from rest_framework.exceptions import ValidationError
 
+from .permissions import owned_by
+from .serializers import SparseFieldsMixin, optimize_queryset
 from .utils import build_absolute_url
 
 User = get_user_model()
@@ -20,11 +24,66 @@ class OwnerSaveMixin:
         return kwargs
 
 
+class SparseQuerysetMixin:
+    def get_queryset(self):
+        return optimize_queryset(
+            super().get_queryset(), self.get_serializer_class(), self.request
+        )
+
+
+class BulkRetrieveMixin:
+    """Adds ``bulk/``, the objects whose ids are listed in the ``ids`` query
+    parameter (comma separated) or, for long lists, in the ``ids`` list of a
+    POST body. Objects come in the requested order, loaded with a single
+    ``in_bulk`` through the viewset's queryset and its prefetches.
+    """
+
+    def get_bulk_ids(self, request):
+        if request.method == "POST":
+            values = request.data.get("ids") if hasattr(request.data, "get") else None
+            if not isinstance(values, list):
+                raise ValidationError({"ids": "Must be a list of ids."})
+        else:
+            values = [v for v in request.GET.get("ids", "").split(",") if v.strip()]
+
+        if len(values) > settings.BULK_RETRIEVE_MAX_IDS:
+            raise ValidationError(
+                {"ids": f"At most {settings.BULK_RETRIEVE_MAX_IDS} ids are allowed."}
+            )
+        try:
+            ids = [int(value) for value in values]
+        except (TypeError, ValueError):
+            raise ValidationError({"ids": "Must be integers."})
+        # Keep the first occurrence of repeated ids
+        return list(dict.fromkeys(ids))
+
+    @decorators.action(detail=False, methods=["get", "post"])
+    def bulk(self, request):
+        ids = self.get_bulk_ids(request)
+        queryset = self.get_queryset()
+        serializer_class = self.get_serializer_class()
+        if request.method == "POST" and issubclass(serializer_class, SparseFieldsMixin):
+            # Only reads with safe methods are narrowed by get_queryset()
+            queryset = serializer_class.optimize_queryset(queryset, request)
+        objects = queryset.in_bulk(ids) if ids else {}
+        serializer = self.get_serializer(
+            [objects[pk] for pk in ids if pk in objects], many=True
+        )
+        return response.Response(
+            dict(
+                results=serializer.data,
+                missing=[pk for pk in ids if pk not in objects],
+            )
+        )
+
+
 class ListModelMixin:
     # Equivalent to ListModelMixin.list()
     def custom_list(self, request, queryset, serializer_class, filterset_class=None):
         try:
-            queryset = queryset.order_by("pk")
+            queryset = optimize_queryset(
+                queryset.order_by("pk"), serializer_class, request
+            )
             if filterset_class is not None:
                 filterset = filterset_class(
                     data=request.GET, request=request, queryset=queryset
@@ -40,18 +99,34 @@ class ListModelMixin:
                     page, many=True, context=dict(request=request)
                 )
                 resp = self.get_paginated_response(serializer.data)
+                resp["X-Total-Count"] = self.paginator.get_total_count()
             else:
                 serializer = serializer_class(
                     queryset, many=True, context=dict(request=request)
                 )
                 resp = response.Response(serializer.data)
+                resp["X-Total-Count"] = len(serializer.data)
 
-            resp["X-Total-Count"] = queryset.count()
             return resp
         except exceptions.ValidationError as exc:
             return response.Response(data=exc, status=status.HTTP_400_BAD_REQUEST)
 
 
+class OwnerListMixin(ListModelMixin):
+    """Adds ``GET mine/``, the requesting user's objects through the viewset's
+    filterset and pagination.
+    """
+
+    @decorators.action(detail=False, methods=["get"])
+    def mine(self, request):
+        return self.custom_list(
+            request,
+            owned_by(self.get_queryset(), request.user),
+            self.get_serializer_class(),
+            getattr(self, "filterset_class", None),
+        )
+
+
 class ChildMixin(ListModelMixin):
     _child_object = None
 
@@ -0,0 +1,289 @@
+"""Server-sent events fed by Postgres LISTEN/NOTIFY.
+
+``notify`` publishes a JSON payload on a channel from within the writing
+transaction: Postgres delivers it when the transaction commits and drops it
+when it rolls back. On the ASGI side, each process holds a single ``Listener``
+connection that LISTENs on the channels with subscribers and fans the
+notifications out to their queues, so thousands of idle event streams cost
+one database connection and no threads.
+
+``EventRouter`` wraps the Django ASGI application and hands the paths of its
+routes to async handlers, which usually end with ``stream``.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import re
+from typing import Awaitable, Callable, Dict, List, Optional, Pattern, Set, Tuple
+from urllib.parse import parse_qs
+
+import psycopg2
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, connections
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+SSE_STREAMS = metrics.gauge(
+    "sse_streams", "Open server-sent event streams", ["channel"]
+)
+
+Predicate = Callable[[dict], bool]
+Handler = Callable[..., Awaitable[None]]
+
+# Reconnection delays double from 1 second up to this
+MAX_RECONNECT_DELAY = 30
+
+
+def notify(channel: str, payload: dict) -> None:
+    """Publish ``payload`` to the listeners of ``channel`` on commit."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_notify(%s, %s)",
+            [channel, json.dumps(payload, cls=DjangoJSONEncoder)],
+        )
+
+
+class Subscription:
+    def __init__(self, channel: str, predicate: Predicate):
+        self.channel = channel
+        self.predicate = predicate
+        # None tells the stream its notifications may have been lost
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.SSE_QUEUE_SIZE)
+
+
+class Listener:
+    """The LISTEN connection of this process, shared by all subscriptions."""
+
+    def __init__(self):
+        self.subscriptions: Dict[str, Set[Subscription]] = {}
+        self._conn = None
+        self._listening: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, channel: str, predicate: Predicate) -> Subscription:
+        subscription = Subscription(channel, predicate)
+        self.subscriptions.setdefault(channel, set()).add(subscription)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        elif self._conn is not None:
+            self._listen()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        # The channel stays LISTENed to, it's cheap and likely to be reused
+        self.subscriptions.get(subscription.channel, set()).discard(subscription)
+
+    def _connect(self):
+        params = connections["default"].get_connection_params()
+        conn = psycopg2.connect(**params)
+        conn.set_session(autocommit=True)
+        return conn
+
+    def _listen(self) -> None:
+        # A round trip on the event loop, only once per channel and connection
+        with self._conn.cursor() as cursor:
+            for channel in set(self.subscriptions) - self._listening:
+                cursor.execute(f'LISTEN "{channel}"')
+                self._listening.add(channel)
+
+    def _on_readable(self, lost: asyncio.Future) -> None:
+        try:
+            self._conn.poll()
+        except psycopg2.Error:
+            if not lost.done():
+                lost.set_result(None)
+            return
+        for notification in self._conn.notifies:
+            self._dispatch(notification.channel, notification.payload)
+        self._conn.notifies.clear()
+
+    def _dispatch(self, channel: str, raw: str) -> None:
+        try:
+            payload = json.loads(raw)
+        except ValueError:
+            logger.warning("Ignoring malformed notification on %s", channel)
+            return
+        for subscription in list(self.subscriptions.get(channel, ())):
+            if not subscription.predicate(payload):
+                continue
+            try:
+                subscription.queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                logger.warning("Dropping a notification for a slow %s stream", channel)
+
+    def _drop_subscriptions(self) -> None:
+        # Notifications sent while disconnected are lost, close the streams
+        # so clients reconnect and resync
+        for subscriptions in self.subscriptions.values():
+            for subscription in subscriptions:
+                while not subscription.queue.empty():
+                    subscription.queue.get_nowait()
+                subscription.queue.put_nowait(None)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        delay = 1
+        while any(self.subscriptions.values()):
+            try:
+                self._conn = await loop.run_in_executor(None, self._connect)
+                self._listen()
+            except psycopg2.Error:
+                logger.exception("LISTEN connection failed, retrying in %ds", delay)
+                self._close()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+                continue
+
+            delay = 1
+            lost = loop.create_future()
+            fd = self._conn.fileno()
+            loop.add_reader(fd, self._on_readable, lost)
+            try:
+                await lost
+                logger.warning("LISTEN connection lost, reconnecting")
+            finally:
+                loop.remove_reader(fd)
+                self._close()
+            self._drop_subscriptions()
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+        self._conn = None
+        self._listening = set()
+
+
+listener = Listener()
+
+
+def authenticate(scope: dict) -> Optional[object]:
+    """Return the user id of the JWT access token sent with the request.
+
+    Browsers' EventSource can't set headers, so the token may also be passed
+    as the ``access_token`` query parameter.
+    """
+    raw_token = None
+    headers = dict(scope["headers"])
+    parts = headers.get(b"authorization", b"").decode("latin-1").split()
+    if len(parts) == 2 and parts[0] in jwt_settings.AUTH_HEADER_TYPES:
+        raw_token = parts[1]
+    else:
+        query = parse_qs(scope["query_string"].decode("latin-1"))
+        raw_token = query.get("access_token", [None])[0]
+    if not raw_token:
+        return None
+    try:
+        token = AccessToken(raw_token)
+    except TokenError:
+        return None
+    return token.get(jwt_settings.USER_ID_CLAIM)
+
+
+async def send_json(send, status: int, body: dict) -> None:
+    content = json.dumps(body).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(content)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": content})
+
+
+def format_event(event: str, payload: dict) -> bytes:
+    data = json.dumps(payload, cls=DjangoJSONEncoder)
+    return f"event: {event}\ndata: {data}\n\n".encode()
+
+
+async def _disconnected(receive) -> None:
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def stream(receive, send, channel: str, predicate: Predicate, event: str) -> None:
+    """Send the ``channel`` notifications matching ``predicate`` as events."""
+    subscription = listener.subscribe(channel, predicate)
+    SSE_STREAMS.inc(channel=channel)
+    disconnected = asyncio.ensure_future(_disconnected(receive))
+    message = None
+    try:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream"),
+                    (b"cache-control", b"no-cache"),
+                    # Don't let nginx buffer the stream
+                    (b"x-accel-buffering", b"no"),
+                ],
+            }
+        )
+        retry = int(settings.SSE_RETRY_SECONDS * 1000)
+        await send(
+            {
+                "type": "http.response.body",
+                "body": f"retry: {retry}\n\n".encode(),
+                "more_body": True,
+            }
+        )
+        while True:
+            if message is None:
+                message = asyncio.ensure_future(subscription.queue.get())
+            done, _ = await asyncio.wait(
+                {message, disconnected},
+                timeout=settings.SSE_KEEPALIVE_SECONDS,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if disconnected in done:
+                return
+            if message in done:
+                payload = message.result()
+                message = None
+                if payload is None:
+                    break
+                body = format_event(event, payload)
+            else:
+                # Keeps proxies and load balancers from closing idle streams
+                body = b": keepalive\n\n"
+            await send({"type": "http.response.body", "body": body, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        for task in (message, disconnected):
+            if task is not None:
+                task.cancel()
+        listener.unsubscribe(subscription)
+        SSE_STREAMS.dec(channel=channel)
+
+
+class EventRouter:
+    """ASGI application serving ``routes`` and passing the rest to ``app``."""
+
+    def __init__(self, app, routes: List[Tuple[str, Handler]]):
+        self.app = app
+        self.routes: List[Tuple[Pattern, Handler]] = [
+            (re.compile(pattern), handler) for pattern, handler in routes
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            for pattern, handler in self.routes:
+                match = pattern.fullmatch(scope["path"])
+                if match is not None:
+                    if scope["method"] != "GET":
+                        detail = f'Method "{scope["method"]}" not allowed.'
+                        return await send_json(send, 405, {"detail": detail})
+                    return await handler(scope, receive, send, **match.groupdict())
+        return await self.app(scope, receive, send)
@@ -0,0 +1,151 @@
+"""Password hashing on a bounded process pool.
+
+Hashing a password takes hundreds of milliseconds of CPU on purpose. Doing it
+in request threads lets a burst of signups and logins starve every other
+endpoint, so hashes are computed by ``PASSWORD_HASHING_WORKERS`` processes
+per server process, running with a lower priority than the request threads.
+At most ``PASSWORD_HASHING_MAX_PENDING`` hashes wait or run at once; further
+requests are refused with 429 instead of queueing behind them.
+
+Set ``PASSWORD_HASHING_WORKERS`` to 0 to hash in the request thread.
+"""
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model, hashers
+from django.contrib.auth.backends import ModelBackend
+from rest_framework.exceptions import APIException, Throttled
+
+from . import metrics
+
+PASSWORD_HASHING_SECONDS = metrics.histogram(
+    "password_hashing_seconds",
+    "Time to hash or check a password, queueing included",
+    ["operation"],
+)
+PASSWORD_HASHING_PENDING = metrics.gauge(
+    "password_hashing_pending", "Password hashes queued or running"
+)
+PASSWORD_HASHING_REJECTIONS = metrics.counter(
+    "password_hashing_rejections_total",
+    "Password hashes refused because the pool was saturated",
+    ["operation"],
+)
+
+_lock = threading.Lock()
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_pid: Optional[int] = None
+_pending = 0
+
+
+class HashingUnavailable(APIException):
+    status_code = 503
+    default_detail = "Password hashing is temporarily unavailable."
+    default_code = "hashing_unavailable"
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool, _pool_pid
+    # A pool inherited from a forking parent has no processes of its own
+    if _pool is None or _pool_pid != os.getpid():
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.PASSWORD_HASHING_WORKERS,
+            # Forking a threaded server is unsafe, children import the
+            # settings from DJANGO_SETTINGS_MODULE instead
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=os.nice,
+            initargs=(settings.PASSWORD_HASHING_NICE,),
+        )
+        _pool_pid = os.getpid()
+    return _pool
+
+
+def _run(operation: str, fn: Callable, *args):
+    global _pool, _pending
+    started = time.perf_counter()
+    if not settings.PASSWORD_HASHING_WORKERS:
+        result = fn(*args)
+        PASSWORD_HASHING_SECONDS.observe(
+            time.perf_counter() - started, operation=operation
+        )
+        return result
+
+    with _lock:
+        if _pending >= settings.PASSWORD_HASHING_MAX_PENDING:
+            PASSWORD_HASHING_REJECTIONS.inc(operation=operation)
+            raise Throttled(
+                wait=1, detail="Too many logins and signups at once, try again."
+            )
+        _pending += 1
+        pool = _get_pool()
+    PASSWORD_HASHING_PENDING.inc()
+    try:
+        future = pool.submit(fn, *args)
+        return future.result(timeout=settings.PASSWORD_HASHING_TIMEOUT)
+    except TimeoutError:
+        future.cancel()
+        raise HashingUnavailable()
+    except BrokenProcessPool:
+        # A pool process died, start a new pool for the next requests
+        with _lock:
+            if _pool is pool:
+                _pool = None
+        raise HashingUnavailable()
+    finally:
+        with _lock:
+            _pending -= 1
+        PASSWORD_HASHING_PENDING.dec()
+        PASSWORD_HASHING_SECONDS.observe(
+            time.perf_counter() - started, operation=operation
+        )
+
+
+def make_password(password: Optional[str]) -> str:
+    return _run("make", hashers.make_password, password)
+
+
+def check_password(password: Optional[str], encoded: Optional[str]) -> bool:
+    return _run("check", hashers.check_password, password, encoded)
+
+
+def must_update(encoded: str) -> bool:
+    """Whether ``encoded`` was made by another hasher or with other parameters
+    than the preferred hasher's, like ``hashers.check_password`` decides.
+    """
+    try:
+        hasher = hashers.identify_hasher(encoded)
+    except ValueError:
+        return False
+    preferred = hashers.get_hasher("default")
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+class PooledModelBackend(ModelBackend):
+    """``ModelBackend`` checking passwords on the hashing pool."""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway, so response times don't tell which users exist
+            make_password(password)
+            return None
+        if not check_password(password, user.password):
+            return None
+        if must_update(user.password):
+            user.password = make_password(password)
+            user.save(update_fields=["password"])
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,402 @@
+"""In-process metrics registry exposed in the Prometheus text format.
+
+Every thread records into its own shard, so the hot path never takes a lock.
+Shards are merged when the registry is collected, and those of exited threads
+are folded into one so that thread churn doesn't accumulate them. When
+``METRICS_DIR`` is configured each process periodically writes a snapshot
+there, and the ``/metrics`` endpoint merges the snapshots of every worker
+process.
+"""
+
+from __future__ import annotations
+
+import atexit
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+import weakref
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Name of the request time in the Server-Timing header of responses
+SERVER_TIMING_NAME = "app"
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        # The shard of each recording thread, and what exited threads recorded
+        self._shards: List[Tuple[weakref.ref, dict]] = []
+        self._retired: dict = {}
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._retire_shards()
+                self._shards.append((weakref.ref(threading.current_thread()), shard))
+        return shard
+
+    def _retire_shards(self) -> None:
+        # Exited threads no longer write to their shard
+        live = []
+        for thread_ref, shard in self._shards:
+            thread = thread_ref()
+            if thread is not None and thread.is_alive():
+                live.append((thread_ref, shard))
+            else:
+                self._merge(self._retired, shard)
+        self._shards = live
+
+    def _key(self, labels: dict) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _merge(self, target: dict, shard: dict) -> None:
+        for key, value in shard.items():
+            target[key] = target.get(key, 0) + value
+
+    def samples(self) -> Dict[LabelValues, object]:
+        merged: dict = {}
+        with self._shards_lock:
+            self._retire_shards()
+            self._merge(merged, self._retired)
+            shards = [shard for _, shard in self._shards]
+        for shard in shards:
+            self._merge(merged, shard.copy())
+        return merged
+
+    def describe(self) -> dict:
+        return dict(
+            kind=self.kind, doc=self.documentation, labelnames=list(self.labelnames)
+        )
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """A value that goes up and down; values of all processes are summed."""
+
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        shard = self._shard()
+        key = self._key(labels)
+        # [count per bucket..., count above last bucket, sum]
+        state = shard.get(key)
+        if state is None:
+            state = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def _merge(self, target: dict, shard: dict) -> None:
+        for key, state in shard.items():
+            total = target.setdefault(key, [0] * len(state))
+            for i, value in enumerate(list(state)):
+                total[i] += value
+
+    def describe(self) -> dict:
+        return dict(super().describe(), buckets=list(self.buckets))
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames=()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(
+        self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._get_or_create(
+            Histogram, name, documentation, labelnames, buckets=buckets
+        )
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            metric.name: dict(
+                metric.describe(),
+                samples=[[list(k), v] for k, v in metric.samples().items()],
+            )
+            for metric in metrics
+        }
+
+    def flush(self, directory: Optional[str] = None) -> None:
+        directory = directory or getattr(settings, "METRICS_DIR", None)
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"metrics-{os.getpid()}.json")
+        _write_snapshot(path, self.snapshot())
+        self._last_flush = time.monotonic()
+
+    def maybe_flush(self) -> None:
+        interval = getattr(settings, "METRICS_FLUSH_INTERVAL", 5)
+        if time.monotonic() - self._last_flush >= interval:
+            self.flush()
+
+    def collect(self, directory: Optional[str] = None) -> dict:
+        """Merge this process' live metrics with every other worker snapshot."""
+        merged = self.snapshot()
+        directory = directory or getattr(settings, "METRICS_DIR", None)
+        if not directory:
+            return merged
+
+        own_path = os.path.join(directory, f"metrics-{os.getpid()}.json")
+        for path in glob.glob(os.path.join(directory, "metrics-*.json")):
+            if path != own_path:
+                _merge_snapshot(merged, _read_snapshot(path))
+        return merged
+
+    def retire(self, pid: int, directory: Optional[str] = None) -> None:
+        """Fold the snapshot of the exited process ``pid`` into a single
+        ``metrics-retired.json``, so recycled workers don't leave a file each.
+        """
+        directory = directory or getattr(settings, "METRICS_DIR", None)
+        if not directory:
+            return
+        path = os.path.join(directory, f"metrics-{pid}.json")
+        if not os.path.exists(path):
+            return
+        retired_path = os.path.join(directory, "metrics-retired.json")
+        retired = _read_snapshot(retired_path)
+        snapshot = _read_snapshot(path)
+        # Gauges describe live processes, only counts outlive them
+        _merge_snapshot(
+            retired, {k: v for k, v in snapshot.items() if v["kind"] != "gauge"}
+        )
+        _write_snapshot(retired_path, retired)
+        os.remove(path)
+
+
+def _read_snapshot(path: str) -> dict:
+    try:
+        with open(path) as fd:
+            return json.load(fd)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_snapshot(path: str, snapshot: dict) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as fd:
+        json.dump(snapshot, fd)
+    os.replace(tmp_path, path)
+
+
+def _merge_snapshot(merged: dict, snapshot: dict) -> None:
+    for name, metric in snapshot.items():
+        target = merged.setdefault(name, dict(metric, samples=[]))
+        _merge_samples(target, metric["samples"])
+
+
+def _merge_samples(target: dict, samples: list) -> None:
+    index = {tuple(labels): value for labels, value in target["samples"]}
+    for labels, value in samples:
+        key = tuple(labels)
+        current = index.get(key)
+        if current is None:
+            index[key] = value
+        elif isinstance(value, list):
+            index[key] = [a + b for a, b in zip(current, value)]
+        else:
+            index[key] = current + value
+    target["samples"] = [[list(k), v] for k, v in index.items()]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra=()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def render(snapshot: dict) -> str:
+    lines = []
+    for name in sorted(snapshot):
+        metric = snapshot[name]
+        names = metric["labelnames"]
+        lines.append(f"# HELP {name} {metric['doc']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        for labels, value in sorted(metric["samples"]):
+            if metric["kind"] == "histogram":
+                cumulative = 0
+                for bound, count in zip(metric["buckets"] + ["+Inf"], value[:-1]):
+                    cumulative += count
+                    le = bound if bound == "+Inf" else _format_value(float(bound))
+                    lines.append(
+                        f"{name}_bucket{_format_labels(names, labels, [('le', le)])} "
+                        f"{_format_value(cumulative)}"
+                    )
+                label_str = _format_labels(names, labels)
+                lines.append(f"{name}_sum{label_str} {_format_value(value[-1])}")
+                lines.append(f"{name}_count{label_str} {_format_value(cumulative)}")
+            else:
+                lines.append(
+                    f"{name}{_format_labels(names, labels)} {_format_value(value)}"
+                )
+    return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+atexit.register(REGISTRY.flush)
+
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+HTTP_REQUESTS = counter(
+    "http_requests_total", "HTTP requests handled", ["route", "method", "status"]
+)
+HTTP_REQUEST_DURATION = histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["route", "method"]
+)
+HTTP_REQUEST_DB_DURATION = histogram(
+    "http_request_db_duration_seconds", "Database time spent per request", ["route"]
+)
+DB_QUERIES = counter("db_queries_total", "Database queries executed", ["route"])
+THROTTLED_REQUESTS = counter(
+    "http_throttled_requests_total", "Requests rejected by throttling", ["route"]
+)
+CACHE_REQUESTS = counter(
+    "cache_requests_total", "Cache lookups by result", ["cache", "result"]
+)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def parse_server_timing(value: Optional[str]) -> Optional[float]:
+    """Seconds of ``SERVER_TIMING_NAME`` in a ``Server-Timing`` header."""
+    for metric in (value or "").split(","):
+        name, *params = [part.strip() for part in metric.split(";")]
+        if name != SERVER_TIMING_NAME:
+            continue
+        for param in params:
+            key, _, duration = param.partition("=")
+            if key == "dur":
+                try:
+                    return float(duration) / 1000
+                except ValueError:
+                    return None
+    return None
+
+
+def route_name(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    if match is None or not match.url_name:
+        return "unmatched"
+    return match.url_name
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        db = dict(time=0.0, queries=0)
+
+        def timed_execute(execute, sql, params, many, context):
+            t0 = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                db["time"] += time.perf_counter() - t0
+                db["queries"] += 1
+
+        t0 = time.perf_counter()
+        with connection.execute_wrapper(timed_execute):
+            response = self.get_response(request)
+        dt_s = time.perf_counter() - t0
+
+        # Lets clients tell server time from network time
+        response["Server-Timing"] = f"{SERVER_TIMING_NAME};dur={dt_s * 1000:.3f}"
+        route = route_name(request)
+        HTTP_REQUESTS.inc(
+            route=route, method=request.method, status=response.status_code
+        )
+        HTTP_REQUEST_DURATION.observe(dt_s, route=route, method=request.method)
+        HTTP_REQUEST_DB_DURATION.observe(db["time"], route=route)
+        DB_QUERIES.inc(db["queries"], route=route)
+        if response.status_code == 429:
+            THROTTLED_REQUESTS.inc(route=route)
+
+        REGISTRY.maybe_flush()
+        return response
+
+
+def metrics_view(request):
+    return HttpResponse(render(REGISTRY.collect()), content_type=CONTENT_TYPE)
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from django.conf import settings
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db.models import IntegerField, Subquery
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework.utils.urls import remove_query_param, replace_query_param
@@ -8,12 +9,72 @@ from rest_framework.utils.urls import remove_query_param, replace_query_param
 from juggle_challenge import utils
 
 
+class CountSubquery(Subquery):
+    template = "(SELECT COUNT(*) FROM (%(subquery)s) counted)"
+    output_field = IntegerField()
+
+
+class InlineCountPaginator(Paginator):
+    """Fetch a page and the total number of rows in a single query, with a
+    ``(SELECT COUNT(*) ...)`` subquery instead of a separate query.
+
+    Postgres runs the uncorrelated subquery once and plans it for counting
+    every row, while the page itself is planned to stop after ``per_page``
+    rows. ``COUNT(*) OVER ()`` reads every row too, but before Postgres 17 the
+    planner costs it as if the LIMIT stopped early, and picks sequential
+    scans over indexes for selective filters.
+    """
+
+    count_attname = "_total_count"
+
+    def page(self, number):
+        if not hasattr(self.object_list, "annotate"):
+            return super().page(number)
+
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger("That page number is not an integer")
+        if number < 1:
+            raise EmptyPage("That page number is less than 1")
+
+        bottom = (number - 1) * self.per_page
+        rows = list(
+            self.object_list.annotate(
+                **{
+                    self.count_attname: CountSubquery(
+                        self.object_list.order_by().values("pk")
+                    )
+                }
+            )[bottom : bottom + self.per_page]
+        )
+        if rows:
+            count = getattr(rows[0], self.count_attname)
+        elif number == 1 and self.allow_empty_first_page:
+            count = 0
+        else:
+            raise EmptyPage("That page contains no results")
+
+        # Paginator.count is a cached_property, seed it with the counted rows
+        self.__dict__["count"] = count
+        return self._get_page(rows, number, self)
+
+
 class LinkHeaderPagination(PageNumberPagination):
     """Inform the user of pagination links via response headers, similar to
     what's described in
     https://developer.github.com/v3/guides/traversing-with-pagination/
     """
 
+    django_paginator_class = InlineCountPaginator
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = utils.build_absolute_url(path=request.get_full_path())
+        return super().paginate_queryset(queryset, request, view=view)
+
+    def get_total_count(self):
+        return self.page.paginator.count
+
     def get_paginated_response(self, data):
         next_url = self.get_next_link()
         previous_url = self.get_previous_link()
@@ -38,35 +99,26 @@ class LinkHeaderPagination(PageNumberPagination):
         if not self.page.has_previous():
             return None
         else:
-            url = utils.build_absolute_url(path=self.request.get_full_path())
-            return remove_query_param(url, self.page_query_param)
+            return remove_query_param(self.base_url, self.page_query_param)
 
     def get_next_link(self):
         if not self.page.has_next():
             return None
-        url = utils.build_absolute_url(path=self.request.get_full_path())
         page_number = self.page.next_page_number()
-        return replace_query_param(url, self.page_query_param, page_number)
+        return replace_query_param(self.base_url, self.page_query_param, page_number)
 
     def get_previous_link(self):
         if not self.page.has_previous():
             return None
-        url = utils.build_absolute_url(path=self.request.get_full_path())
         page_number = self.page.previous_page_number()
         if page_number == 1:
-            return remove_query_param(url, self.page_query_param)
-        return replace_query_param(url, self.page_query_param, page_number)
+            return remove_query_param(self.base_url, self.page_query_param)
+        return replace_query_param(self.base_url, self.page_query_param, page_number)
 
     def get_last_link(self):
         if not self.page.has_next():
             return None
         else:
-            if getattr(settings, "SITE_BASE_URL", False):
-                url = "{}{}".format(
-                    settings.SITE_BASE_URL, self.request.get_full_path()
-                )
-            else:
-                url = self.request.build_absolute_uri()
             return replace_query_param(
-                url, self.page_query_param, self.page.paginator.num_pages
+                self.base_url, self.page_query_param, self.page.paginator.num_pages
             )
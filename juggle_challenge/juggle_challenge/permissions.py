@@ -3,19 +3,27 @@ from __future__ import annotations
 from rest_framework import permissions
 
 
+def owned_by(queryset, user):
+    """``queryset`` restricted to the objects of ``user``, an index range scan
+    on the models' ``(owner, created_at)`` indexes.
+    """
+    return queryset.filter(owner=user)
+
+
 class IsOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        return obj.user.auth_user == request.user or (request.user.is_staff)
+        return obj.owner_id == request.user.pk or request.user.is_staff
 
 
 class OwnerFilterMixin:
     def get_queryset(self):
         queryset = super().get_queryset()
-        if not self.request.user.is_anonymous:
-            return queryset.filter(user__auth_user=self.request.user)
+        if self.request.user.is_anonymous:
+            return queryset.none()
+        return owned_by(queryset, self.request.user)
 
 
 class OwnerUserFilterMixin:
     def get_queryset(self):
         queryset = super().get_queryset()
-        return queryset.filter(auth_user=self.request.user)
+        return queryset.filter(pk=self.request.user.pk)
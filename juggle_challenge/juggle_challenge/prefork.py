@@ -0,0 +1,74 @@
+"""Prefork HTTP server for production deployments, run by gunicorn.
+
+``Server`` hands an application that ``manage.py serve`` already loaded and
+warmed up to gunicorn with ``preload_app``, so workers share the loaded code
+and caches copy-on-write. Gunicorn replaces workers after ``max_requests``
+requests plus a random jitter, kills the ones stuck on a request for longer
+than ``timeout`` and, on SIGTERM, gives workers ``graceful_timeout`` seconds to
+finish their requests.
+
+WSGI workers are gunicorn's sync workers, meant to run behind a load balancer
+or reverse proxy. ASGI workers run uvicorn, which is an optional dependency.
+"""
+from __future__ import annotations
+
+import math
+import os
+from typing import Callable, Optional
+
+from gunicorn.app.base import BaseApplication
+
+# Gunicorn worker class of ASGI servers
+ASGI_WORKER_CLASS = "juggle_challenge.uvicorn_worker.UvicornWorker"
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on, honoring affinity and cgroup quotas."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as fd:
+            quota, period = fd.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+class Server(BaseApplication):
+    """Gunicorn serving ``application`` with the gunicorn settings ``options``.
+
+    ``post_fork`` runs in each worker before it accepts connections,
+    ``worker_exit`` in each worker as it exits and ``worker_reaped`` in the
+    master with the pid of each exited worker.
+    """
+
+    def __init__(
+        self,
+        application,
+        options: dict,
+        post_fork: Optional[Callable[[], None]] = None,
+        worker_exit: Optional[Callable[[], None]] = None,
+        worker_reaped: Optional[Callable[[int], None]] = None,
+    ):
+        self.application = application
+        self.options = dict(options, preload_app=True)
+        if post_fork is not None:
+            self.options["post_fork"] = lambda server, worker: post_fork()
+        if worker_exit is not None:
+            self.options["worker_exit"] = lambda server, worker: worker_exit()
+        if worker_reaped is not None:
+            self.options["child_exit"] = lambda server, worker: worker_reaped(
+                worker.pid
+            )
+        super().__init__()
+
+    def load_config(self):
+        for name, value in self.options.items():
+            self.cfg.set(name, value)
+
+    def load(self):
+        return self.application
@@ -0,0 +1,161 @@
+"""SQL fingerprinting, N+1 detection and query budgets.
+
+``NPlusOneMiddleware`` logs every query shape that a single request repeats
+at least ``N_PLUS_ONE_THRESHOLD`` times, together with the view and the
+project stack frame that issued it. ``query_budget`` declares how many
+queries a view method may run; with ``QUERY_BUDGET_ENFORCED`` enabled (as in
+tests) exceeding it raises ``QueryBudgetExceeded``.
+"""
+from __future__ import annotations
+
+import contextlib
+import functools
+import logging
+import os
+import re
+import traceback
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\bIN \((?:\s*(?:%s|\?)\s*,?)+\)", re.IGNORECASE)
+_SPACE_RE = re.compile(r"\s+")
+
+
+def fingerprint(sql: str) -> str:
+    """Reduce a SQL statement to its shape: literals and IN lists collapsed."""
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _IN_LIST_RE.sub("IN (...)", sql)
+    return _SPACE_RE.sub(" ", sql).strip()
+
+
+def _caller_frame() -> Optional[str]:
+    base_dir = str(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename == __file__ or not frame.filename.startswith(base_dir):
+            continue
+        if f"{os.sep}site-packages{os.sep}" in frame.filename:
+            continue
+        return f"{frame.filename}:{frame.lineno} in {frame.name}"
+    return None
+
+
+@dataclass
+class QueryShape:
+    fingerprint: str
+    sql: str
+    count: int = 0
+    frames: Counter = field(default_factory=Counter)
+
+    def __str__(self):
+        frame = self.frames.most_common(1)[0][0] if self.frames else "unknown"
+        return f"{self.count}x {self.fingerprint}\n    from {frame}"
+
+
+class QueryRecorder:
+    def __init__(self, capture_frames: bool = True):
+        self.capture_frames = capture_frames
+        self.count = 0
+        self.shapes: Dict[str, QueryShape] = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        key = fingerprint(sql)
+        shape = self.shapes.get(key)
+        if shape is None:
+            shape = self.shapes[key] = QueryShape(fingerprint=key, sql=sql)
+        shape.count += 1
+        if self.capture_frames:
+            shape.frames[_caller_frame()] += 1
+        return execute(sql, params, many, context)
+
+    def repeated(self, threshold: int) -> List[QueryShape]:
+        shapes = [s for s in self.shapes.values() if s.count >= threshold]
+        return sorted(shapes, key=lambda s: s.count, reverse=True)
+
+    def report(self) -> str:
+        return "\n".join(str(s) for s in self.repeated(threshold=2))
+
+
+@contextlib.contextmanager
+def record_queries(capture_frames: bool = True):
+    recorder = QueryRecorder(capture_frames=capture_frames)
+    with connection.execute_wrapper(recorder):
+        yield recorder
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextlib.contextmanager
+def assert_query_budget(max_queries: int, label: str = "block"):
+    """Fail when the wrapped block runs more than ``max_queries`` queries."""
+    with record_queries() as recorder:
+        yield recorder
+    if recorder.count > max_queries:
+        raise QueryBudgetExceeded(
+            f"{label} ran {recorder.count} queries, budget is {max_queries}\n"
+            f"{recorder.report()}"
+        )
+
+
+def query_budget(max_queries: int):
+    """Declare the query budget of a view method.
+
+    The budget is only checked when ``settings.QUERY_BUDGET_ENFORCED`` is
+    set, so production requests don't pay for the bookkeeping.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if not getattr(settings, "QUERY_BUDGET_ENFORCED", False):
+                return func(self, *args, **kwargs)
+            label = f"{self.__class__.__name__}.{func.__name__}"
+            with assert_query_budget(max_queries, label=label):
+                return func(self, *args, **kwargs)
+
+        wrapper.query_budget = max_queries
+        return wrapper
+
+    return decorator
+
+
+class NPlusOneMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, "QUERY_INSPECTOR_ENABLED", settings.DEBUG):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.threshold = getattr(settings, "N_PLUS_ONE_THRESHOLD", 5)
+
+    def __call__(self, request):
+        with record_queries() as recorder:
+            response = self.get_response(request)
+
+        repeated = recorder.repeated(self.threshold)
+        if repeated:
+            match = getattr(request, "resolver_match", None)
+            view = (
+                f"{match._func_path} ({match.view_name})"
+                if match is not None
+                else request.path
+            )
+            logger.warning(
+                "Possible N+1 in %s %s (%s, %d queries):\n%s",
+                request.method,
+                request.path,
+                view,
+                recorder.count,
+                "\n".join(str(s) for s in repeated),
+            )
+        return response
@@ -1,20 +1,32 @@
-from dataclasses import dataclass, field
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
 from typing import Any, Callable, Dict, List, Optional, Tuple
+import base64
 import json
+import logging
+import os
+import random
+import threading
 import time
 
 import requests
 from requests import Response
 from requests.auth import AuthBase
+from requests.structures import CaseInsensitiveDict
 
 from juggle_challenge import utils
 
+logger = logging.getLogger(__name__)
+
+LOG_BODY_MAX_CHARS = 4096
+
 
 def decode_content(content: bytes) -> Tuple[str, Any]:
     try:
         content = json.loads(content)
         return "json", content
-    except json.JSONDecodeError:
+    # json.loads decodes bytes first, binary content fails there
+    except (json.JSONDecodeError, UnicodeDecodeError):
         pass
 
     try:
@@ -26,37 +38,239 @@ def decode_content(content: bytes) -> Tuple[str, Any]:
     return "binary", content
 
 
-def json_fmt(data: Any) -> str:
-    return json.dumps(data, ensure_ascii=False, indent=2)
-
+def json_fmt(data: Any, indent: Optional[int] = None) -> str:
+    return json.dumps(data, ensure_ascii=False, indent=indent)
 
-def log_request(method, url, data) -> None:
-    print(f"{method} {url}")
-    if method.lower() not in {"get", "head"}:
-        print(json_fmt(data))
 
+class LazyBody:
+    """Formats a request payload or response content only if it gets logged."""
 
-def log_response(response: requests.Response, dt_s: float) -> None:
-    print(f"{response.status_code} {response.reason}  dt_s={dt_s:.3}")
+    def __init__(self, body: Any, max_chars: int = LOG_BODY_MAX_CHARS):
+        self.body = body
+        self.max_chars = max_chars
 
-    if 300 <= response.status_code < 400:
-        print(f"Location: {response.headers['location']}\n")
+    def __str__(self) -> str:
+        if isinstance(self.body, bytes):
+            content_type, content = decode_content(self.body)
+            if content_type == "json":
+                text = json_fmt(content)
+            elif content_type == "text":
+                text = content
+            else:
+                text = repr(content)
+        else:
+            text = json_fmt(self.body)
+        if len(text) > self.max_chars:
+            return f"{text[:self.max_chars]}... ({len(text)} chars)"
+        return text
+
+
+def log_request(method, url, data, log_body: bool = False) -> None:
+    logger.info(
+        "%s %s",
+        method,
+        url,
+        extra=dict(http_method=method, http_url=url),
+    )
+    if (
+        log_body
+        and method.lower() not in {"get", "head"}
+        and logger.isEnabledFor(logging.DEBUG)
+    ):
+        logger.debug("request body=%s", LazyBody(data))
+
+
+def log_response(
+    response: requests.Response, dt_s: float, log_body: bool = False
+) -> None:
+    level = logging.WARNING if response.status_code >= 400 else logging.INFO
+    logger.log(
+        level,
+        "%s %s dt_s=%.3f",
+        response.status_code,
+        response.reason,
+        dt_s,
+        extra=dict(
+            http_url=response.url,
+            http_status=response.status_code,
+            duration_s=dt_s,
+        ),
+    )
+
+    if 300 <= response.status_code < 400 and response.status_code != 304:
+        logger.info("Location: %s", response.headers.get("location"))
         return
 
-    content_type, content = decode_content(response.content)
-    if content_type == "json":
-        print(json_fmt(content))
-    elif content_type == "text":
-        print(content[:4096])
-    elif content_type == "binary":
-        print(repr(content)[:4096])
-    print()
+    if log_body and logger.isEnabledFor(logging.DEBUG):
+        logger.debug("response body=%s", LazyBody(response.content))
 
 
 class RestApiResponseException(Exception):
     pass
 
 
+# Headers of a 304 that update the cached response, RFC 7232 section 4.1
+NOT_MODIFIED_HEADERS = ("Cache-Control", "Date", "ETag", "Expires", "Last-Modified")
+
+
+@dataclass
+class CacheStats:
+    # Requests answered with a 304 and served from the cache
+    hits: int = 0
+    # Requests that downloaded a full response
+    misses: int = 0
+    evictions: int = 0
+    # Response bytes the hits didn't download
+    bytes_saved: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        requests_count = self.hits + self.misses
+        return self.hits / requests_count if requests_count else 0.0
+
+
+@dataclass
+class CachedResponse:
+    url: str
+    status_code: int
+    headers: Dict[str, str]
+    content: bytes
+
+    def validators(self) -> Dict[str, str]:
+        headers = {}
+        if "ETag" in self.headers:
+            headers["If-None-Match"] = self.headers["ETag"]
+        if "Last-Modified" in self.headers:
+            headers["If-Modified-Since"] = self.headers["Last-Modified"]
+        return headers
+
+    def to_response(self, not_modified: Response) -> Response:
+        response = Response()
+        response.status_code = self.status_code
+        response.reason = "OK"
+        response.headers = CaseInsensitiveDict(self.headers)
+        response._content = self.content
+        response.url = not_modified.url
+        response.request = not_modified.request
+        response.elapsed = not_modified.elapsed
+        response.from_cache = True
+        return response
+
+
+class ResponseCache:
+    """Client-side cache of GET responses carrying an ``ETag`` or
+    ``Last-Modified`` header.
+
+    Cached responses are always revalidated with a conditional request; a 304
+    answer is served from the cache. The least recently used responses are
+    evicted beyond ``max_entries`` or ``max_bytes`` of content. With ``path``,
+    the cache is loaded from that file and written back by ``save()``.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+        path: Optional[str] = None,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.path = path
+        self.stats = CacheStats()
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+            return entry
+
+    def put(self, entry: CachedResponse) -> None:
+        with self._lock:
+            self._pop(entry.url)
+            if len(entry.content) > self.max_bytes:
+                return
+            self._entries[entry.url] = entry
+            self._size += len(entry.content)
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted.content)
+                self.stats.evictions += 1
+
+    def discard(self, url: str) -> None:
+        with self._lock:
+            self._pop(url)
+
+    def _pop(self, url: str) -> None:
+        entry = self._entries.pop(url, None)
+        if entry is not None:
+            self._size -= len(entry.content)
+
+    def request_headers(self, url: str) -> Dict[str, str]:
+        """Conditional request headers for a GET of ``url``."""
+        entry = self.get(url)
+        return entry.validators() if entry is not None else {}
+
+    def process(self, url: str, response: Response) -> Response:
+        """Update the cache with the answer to a GET of ``url``, and return
+        the cached response for a 304.
+        """
+        if response.status_code == 304:
+            entry = self.get(url)
+            if entry is not None:
+                for name in NOT_MODIFIED_HEADERS:
+                    if name in response.headers:
+                        entry.headers[name] = response.headers[name]
+                self.stats.hits += 1
+                self.stats.bytes_saved += len(entry.content)
+                return entry.to_response(response)
+            return response
+
+        self.stats.misses += 1
+        if response.status_code == 200 and (
+            "ETag" in response.headers or "Last-Modified" in response.headers
+        ):
+            self.put(
+                CachedResponse(
+                    url=url,
+                    status_code=response.status_code,
+                    headers=dict(response.headers),
+                    content=response.content,
+                )
+            )
+        else:
+            self.discard(url)
+        return response
+
+    def save(self, path: Optional[str] = None) -> None:
+        path = path or self.path
+        with self._lock:
+            entries = list(self._entries.values())
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as fd:
+            # Least recently used first, so loading keeps the LRU order
+            for entry in entries:
+                data = asdict(entry)
+                data["content"] = base64.b64encode(entry.content).decode()
+                fd.write(json.dumps(data) + "\n")
+        os.replace(tmp_path, path)
+
+    def load(self, path: Optional[str] = None) -> None:
+        with open(path or self.path) as fd:
+            for line in fd:
+                data = json.loads(line)
+                data["content"] = base64.b64decode(data["content"])
+                self.put(CachedResponse(**data))
+
+
 @dataclass
 class BaseBearerAuth(AuthBase):
     def _get_api_token(self):
@@ -92,13 +306,28 @@ class Client:
     default_headers: Optional[dict] = None
     create_response: Optional[Callable] = utils.create_response
     exception_raise_enabled: Optional[bool] = True
+    # Bodies are never decoded unless enabled and DEBUG logging is on.
+    log_bodies: bool = False
+    # Fraction of request/response pairs that get logged at all.
+    log_sample_rate: float = 1.0
+    # Revalidates cached GET responses instead of downloading them again.
+    cache: Optional[ResponseCache] = None
+    # Reuses connections across requests.
+    session: Optional[requests.Session] = None
 
     def __call__(self, path: str) -> "Endpoint":
         return Endpoint(client=self, path=path)
 
     def _send(self, request: Request) -> Response:
         url = f"{self.base_url}{request.path}"
-        log_request(request.method, url=request.path, data=request.data)
+        sampled = self.log_sample_rate >= 1 or random.random() < self.log_sample_rate
+        if sampled:
+            log_request(
+                request.method,
+                url=request.path,
+                data=request.data,
+                log_body=self.log_bodies,
+            )
 
         if self.base_url is None:
             return self.create_response(status_code=200)
@@ -109,9 +338,19 @@ class Client:
         else:
             extra = dict(data=request.data, files=request.files)
         headers = dict()
+        cacheable = (
+            self.cache is not None
+            and request.method.upper() == "GET"
+            and request.files is None
+        )
+        if cacheable:
+            headers.update(self.cache.request_headers(url))
+        elif self.cache is not None:
+            # Writes make the cached representation stale
+            self.cache.discard(url)
         headers.update(request.headers or dict())
         headers.update(self.default_headers or dict())
-        response = requests.request(
+        response = (self.session or requests).request(
             allow_redirects=False,
             auth=self.auth,
             method=request.method,
@@ -121,7 +360,10 @@ class Client:
         )
         t = time.perf_counter()
 
-        log_response(response, dt_s=t - t0)
+        if sampled:
+            log_response(response, dt_s=t - t0, log_body=self.log_bodies)
+        if cacheable:
+            response = self.cache.process(url, response)
         if self.exception_raise_enabled and (not 200 <= response.status_code < 300):
             raise RestApiResponseException(f"{response.text}")
         return response
@@ -0,0 +1,148 @@
+"""OpenAPI schema served from a prebuilt artifact.
+
+``manage.py generate_schema`` writes ``swagger.json`` and ``swagger.yaml`` to
+``OPENAPI_SCHEMA_DIR`` (the Docker image does it at build time) and the views
+below serve those files with an ``ETag``. Without an artifact the schema is
+generated on first use and kept for the life of the process. drf_yasg is only
+imported when a schema is actually generated.
+"""
+from __future__ import annotations
+
+import functools
+import hashlib
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.templatetags.static import static
+from django.views.decorators.http import condition, require_safe
+
+from .utils import build_absolute_url
+
+INFO = dict(title="Juggle API", default_version="v1", description="Job Post")
+
+CONTENT_TYPES = {"json": "application/json", "yaml": "application/yaml"}
+
+SWAGGER_UI_HTML = """<!DOCTYPE html>
+<html>
+<head>
+  <meta charset="utf-8">
+  <title>{title}</title>
+  <link rel="stylesheet" href="{css}">
+</head>
+<body>
+  <div id="swagger-ui"></div>
+  <script src="{bundle_js}"></script>
+  <script src="{preset_js}"></script>
+  <script>
+    window.ui = SwaggerUIBundle({{
+      url: "{schema_url}",
+      dom_id: "#swagger-ui",
+      presets: [SwaggerUIBundle.presets.apis, SwaggerUIStandalonePreset],
+      layout: "StandaloneLayout",
+    }});
+  </script>
+</body>
+</html>
+"""
+
+_schemas: Dict[str, Tuple[bytes, str]] = {}
+_schemas_lock = threading.Lock()
+
+
+def _etag(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()[:32]
+
+
+def generate(fmt: str) -> bytes:
+    from drf_yasg import openapi
+    from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+    from drf_yasg.generators import OpenAPISchemaGenerator
+    from rest_framework.test import APIRequestFactory
+    from rest_framework.views import APIView
+
+    # Views see an anonymous request, as they did when the schema was served
+    # by drf_yasg's own view
+    request = APIView().initialize_request(APIRequestFactory().get("/swagger.json"))
+    request.user = AnonymousUser()
+
+    generator = OpenAPISchemaGenerator(openapi.Info(**INFO), url=build_absolute_url(""))
+    schema = generator.get_schema(request=request, public=True)
+    codec = OpenAPICodecJson if fmt == "json" else OpenAPICodecYaml
+    return codec(validators=[]).encode(schema)
+
+
+def schema_path(fmt: str, directory: Optional[str] = None) -> str:
+    return os.path.join(directory or settings.OPENAPI_SCHEMA_DIR, f"swagger.{fmt}")
+
+
+def write_schemas(directory: str) -> List[str]:
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for fmt in CONTENT_TYPES:
+        path = schema_path(fmt, directory)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as fd:
+            fd.write(generate(fmt))
+        os.replace(tmp_path, path)
+        paths.append(path)
+    return paths
+
+
+def get_schema(fmt: str) -> Tuple[bytes, str]:
+    """Return the ``fmt`` schema document and its ETag."""
+    schema = _schemas.get(fmt)
+    if schema is not None:
+        return schema
+
+    with _schemas_lock:
+        if fmt not in _schemas:
+            content = None
+            if settings.OPENAPI_SCHEMA_DIR:
+                try:
+                    with open(schema_path(fmt), "rb") as fd:
+                        content = fd.read()
+                except FileNotFoundError:
+                    pass
+            if content is None:
+                content = generate(fmt)
+            _schemas[fmt] = (content, _etag(content))
+        return _schemas[fmt]
+
+
+@require_safe
+@condition(etag_func=lambda request, format: get_schema(format.lstrip("."))[1])
+def schema_view(request, format):
+    fmt = format.lstrip(".")
+    content, _ = get_schema(fmt)
+    return HttpResponse(content, content_type=CONTENT_TYPES[fmt])
+
+
+@functools.lru_cache(maxsize=None)
+def _swagger_ui() -> Tuple[bytes, str]:
+    content = SWAGGER_UI_HTML.format(
+        title=INFO["title"],
+        css=static("drf-yasg/swagger-ui-dist/swagger-ui.css"),
+        bundle_js=static("drf-yasg/swagger-ui-dist/swagger-ui-bundle.js"),
+        preset_js=static("drf-yasg/swagger-ui-dist/swagger-ui-standalone-preset.js"),
+        schema_url="/swagger.json",
+    ).encode()
+    return content, _etag(content)
+
+
+def _swagger_ui_etag(request):
+    if request.GET.get("format") == "openapi":
+        return get_schema("json")[1]
+    return _swagger_ui()[1]
+
+
+@require_safe
+@condition(etag_func=_swagger_ui_etag)
+def swagger_ui_view(request):
+    # drf_yasg's UI view also served the JSON schema for ?format=openapi
+    if request.GET.get("format") == "openapi":
+        return HttpResponse(get_schema("json")[0], content_type=CONTENT_TYPES["json"])
+    return HttpResponse(_swagger_ui()[0], content_type="text/html; charset=utf-8")
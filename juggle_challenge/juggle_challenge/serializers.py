@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+from typing import Optional, Set
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import permissions, serializers
+
+
+def query_param_set(request, name: str) -> Set[str]:
+    if request is None:
+        return set()
+    params = getattr(request, "query_params", request.GET)
+    values = params.get(name, "").split(",")
+    return {value.strip() for value in values if value.strip()}
+
+
+class SparseFieldsMixin:
+    """Serializer support for ``?fields=``, ``?omit=`` and ``?expand=``.
+
+    ``Meta.expandable_fields`` are only rendered when requested through
+    ``?expand=``. ``Meta.source_fields`` maps serializer fields to the model
+    columns they read, so ``optimize_queryset`` can narrow the query with
+    ``.only()`` and prefetch just the expanded relations.
+    """
+
+    @classmethod
+    def requested_field_names(cls, request) -> Set[str]:
+        names = set(cls.Meta.fields)
+        fields = query_param_set(request, "fields")
+        if fields:
+            names &= fields
+        names -= query_param_set(request, "omit")
+        expandable = set(getattr(cls.Meta, "expandable_fields", ()))
+        names -= expandable - query_param_set(request, "expand")
+        return names
+
+    @classmethod
+    def optimize_queryset(cls, queryset, request):
+        model = queryset.model
+        names = cls.requested_field_names(request)
+        source_fields = getattr(cls.Meta, "source_fields", {})
+        expandable = getattr(cls.Meta, "expandable_fields", {})
+
+        columns = {model._meta.pk.name}
+        # Related managers set the parent of each row from its foreign key,
+        # deferring it would load it with one query per row
+        columns.update(field.name for field in queryset._known_related_objects)
+        for name in names:
+            if name in expandable:
+                continue
+            for column in source_fields.get(name, [name]):
+                try:
+                    field = model._meta.get_field(column)
+                except FieldDoesNotExist:
+                    continue
+                if field.concrete and not field.many_to_many:
+                    columns.add(column)
+        queryset = queryset.only(*columns)
+
+        for name in names & set(expandable):
+            related_model = model._meta.get_field(name).related_model
+            nested_cls = expandable[name]
+            queryset = queryset.prefetch_related(
+                Prefetch(
+                    name,
+                    queryset=nested_cls.optimize_queryset(
+                        related_model.objects.all(), None
+                    ),
+                )
+            )
+        return queryset
+
+    def _is_root(self) -> bool:
+        parent = self.parent
+        return parent is None or (
+            isinstance(parent, serializers.ListSerializer) and parent.parent is None
+        )
+
+    @property
+    def _readable_fields(self):
+        # Pruned on output only: writes validate every field whatever the
+        # query string asks to render
+        names = getattr(self, "_rendered_field_names", None)
+        if names is None:
+            request = self.context.get("request") if self._is_root() else None
+            names = self._rendered_field_names = self.requested_field_names(request)
+        for field in super()._readable_fields:
+            if field.field_name in names:
+                yield field
+
+
+def optimize_queryset(queryset, serializer_class, request: Optional[object]):
+    """Narrow ``queryset`` to what a read of ``serializer_class`` renders."""
+    if (
+        request is None
+        or request.method not in permissions.SAFE_METHODS
+        or not issubclass(serializer_class, SparseFieldsMixin)
+    ):
+        return queryset
+    return serializer_class.optimize_queryset(queryset, request)
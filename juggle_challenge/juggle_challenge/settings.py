@@ -43,13 +43,17 @@ INSTALLED_APPS = [
     'django_extensions',
     'rest_framework',
     'rest_framework.authtoken',
-    'drf_yasg',
     'django_filters',
     'api',
 ]
 
 MIDDLEWARE = [
+    'juggle_challenge.traffic.TrafficCaptureMiddleware',
+    'juggle_challenge.metrics.MetricsMiddleware',
+    'juggle_challenge.querycount.NPlusOneMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # ETags on GET responses, and 304s for clients that already have them
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -90,6 +94,8 @@ DATABASES = {
         "PASSWORD": os.environ.get("JUGGLE_DATABASE_PASSWORD", "juggle"),
         "HOST": os.environ.get("JUGGLE_DATABASE_HOST", "127.0.0.1"),
         "PORT": os.environ.get("JUGGLE_DATABASE_PORT", "5432"),
+        # Keep connections open between requests of long lived workers
+        "CONN_MAX_AGE": int(os.environ.get("JUGGLE_DATABASE_CONN_MAX_AGE", 60)),
     }
 }
 
@@ -112,6 +118,8 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+AUTHENTICATION_BACKENDS = ["juggle_challenge.hashing.PooledModelBackend"]
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
@@ -163,6 +171,176 @@ SWAGGER_SETTINGS = {
     }
 }
 
+# Directory holding the schema written by `manage.py generate_schema`. When
+# unset, the schema is generated in-process on first request.
+OPENAPI_SCHEMA_DIR = os.environ.get("JUGGLE_OPENAPI_SCHEMA_DIR")
+
+# Serve the schema and the Swagger UI. drf_yasg, which provides the UI's
+# static files, is only installed when they are served.
+SWAGGER_ENABLED = os.environ.get("JUGGLE_SWAGGER_ENABLED", "1") == "1"
+if SWAGGER_ENABLED:
+    INSTALLED_APPS.append("drf_yasg")
+
+######################################################################
+# SERVER
+
+# Options of `manage.py serve`, passed on to gunicorn. SERVER_WORKERS defaults to one per available
+# CPU for ASGI, and 2 * CPUs + 1 for WSGI whose workers block on the database.
+SERVER_BIND = os.environ.get("JUGGLE_SERVER_BIND", "0.0.0.0:8000")
+SERVER_WORKERS = int(os.environ.get("JUGGLE_SERVER_WORKERS", 0)) or None
+# Workers are replaced after serving this many requests, plus up to
+# SERVER_MAX_REQUESTS_JITTER so they don't all restart together.
+SERVER_MAX_REQUESTS = 1000
+SERVER_MAX_REQUESTS_JITTER = 100
+SERVER_GRACEFUL_TIMEOUT = 30
+# Workers stuck on a request for longer are killed and replaced
+SERVER_REQUEST_TIMEOUT = 30
+# Seconds to wait for the database at startup, which preloads data from it
+SERVER_DATABASE_TIMEOUT = int(os.environ.get("JUGGLE_SERVER_DATABASE_TIMEOUT", 60))
+
+######################################################################
+# BULK RETRIEVAL
+
+# Ids accepted by the bulk/ actions of jobs and professionals
+BULK_RETRIEVE_MAX_IDS = 1000
+
+######################################################################
+# CACHING
+
+# Seconds a /v1/jobs/rate-histogram/ result is served from cache.
+RATE_HISTOGRAM_CACHE_TIMEOUT = 30
+# Seconds facet counts are served from cache. Writes to jobs or professionals
+# invalidate them once committed.
+FACETS_CACHE_TIMEOUT = 60
+FACETS_TOP_SKILLS = 20
+
+######################################################################
+# BACKGROUND TASKS
+
+# Modules whose @taskqueue.task functions the worker registers
+TASK_MODULES = ["api.importers", "api.similarity"]
+TASK_WORKER_CONCURRENCY = int(os.environ.get("JUGGLE_TASK_WORKER_CONCURRENCY", 4))
+TASK_POLL_INTERVAL = 1.0
+# A running task is handed to another worker if it takes longer than this
+TASK_LEASE_SECONDS = 3600
+# Retry delays double from TASK_RETRY_BACKOFF up to TASK_RETRY_BACKOFF_MAX
+TASK_RETRY_BACKOFF = 10
+TASK_RETRY_BACKOFF_MAX = 3600
+
+######################################################################
+# BULK IMPORTS
+
+# Uploaded import files and their error reports
+IMPORT_DIR = os.environ.get("JUGGLE_IMPORT_DIR", str(BASE_DIR / "var" / "imports"))
+IMPORT_BATCH_SIZE = 1000
+
+######################################################################
+# CHANGE FEED
+
+# Default and maximum number of changes returned by /v1/changes/
+CHANGES_PAGE_SIZE = 500
+CHANGES_MAX_PAGE_SIZE = 5000
+# Consumers further behind than this have to resync from the list endpoints
+CHANGE_LOG_RETENTION_DAYS = 30
+
+######################################################################
+# SERVER-SENT EVENTS
+
+# Streams send a comment after this many idle seconds so proxies keep them
+# open, and tell clients to reconnect after SSE_RETRY_SECONDS.
+SSE_KEEPALIVE_SECONDS = 15
+SSE_RETRY_SECONDS = 3
+# Notifications buffered per stream; a stream further behind loses them
+SSE_QUEUE_SIZE = 100
+
+######################################################################
+# SIMILAR JOBS
+
+# Built by `manage.py build_similarity_index`, or by a task queued on first use
+# when missing. Task workers must share it with the API processes.
+SIMILAR_JOBS_INDEX_PATH = os.environ.get(
+    "JUGGLE_SIMILAR_JOBS_INDEX", str(BASE_DIR / "var" / "similar-jobs.npz")
+)
+# MinHash values per job, split in bands of PERMUTATIONS / BANDS values. Jobs
+# sharing a band are candidates: with bands of 4 values, jobs with a Jaccard
+# similarity of 0.5 have a 64% chance of being found, 0.7 a 98% chance.
+SIMILAR_JOBS_PERMUTATIONS = 64
+SIMILAR_JOBS_BANDS = 16
+# Candidates taken from one band bucket, bounds the cost of common skill sets
+SIMILAR_JOBS_MAX_BUCKET_SIZE = 200
+# Changed jobs are merged into the index arrays once there are this many
+SIMILAR_JOBS_MERGE_THRESHOLD = 10000
+# Seconds between catching up with other processes' job changes
+SIMILAR_JOBS_REFRESH_SECONDS = 5
+
+######################################################################
+# BUSINESS STATS
+
+# Days of daily application counts returned by /v1/business/<id>/stats/ by
+# default and at most
+BUSINESS_STATS_DAYS = 30
+BUSINESS_STATS_MAX_DAYS = 366
+
+######################################################################
+# JOB ARCHIVAL
+
+# Open jobs not updated for JOB_EXPIRE_AFTER_DAYS are marked expired; closed
+# and expired jobs are moved to the archive tables JOB_ARCHIVE_AFTER_DAYS
+# after their last update.
+JOB_EXPIRE_AFTER_DAYS = 90
+JOB_ARCHIVE_AFTER_DAYS = 30
+JOB_ARCHIVE_BATCH_SIZE = 1000
+
+######################################################################
+# METRICS
+
+# Directory shared by all worker processes; each one periodically writes a
+# snapshot there so /metrics reports totals across workers.
+METRICS_DIR = os.environ.get("JUGGLE_METRICS_DIR")
+METRICS_FLUSH_INTERVAL = 5
+
+######################################################################
+# PASSWORD HASHING
+
+# Processes hashing passwords for each server process, 0 hashes in the
+# request thread. They run with PASSWORD_HASHING_NICE added to their niceness
+# so request threads get the CPU first.
+PASSWORD_HASHING_WORKERS = int(os.environ.get("JUGGLE_PASSWORD_HASHING_WORKERS", 1))
+PASSWORD_HASHING_NICE = 10
+# Signups and logins beyond this many hashes in progress get a 429
+PASSWORD_HASHING_MAX_PENDING = 8
+# Seconds a hash may take, queueing included, before the request fails
+PASSWORD_HASHING_TIMEOUT = 10
+
+######################################################################
+# QUERY INSPECTION
+
+# Log query shapes repeated N_PLUS_ONE_THRESHOLD times within one request.
+QUERY_INSPECTOR_ENABLED = DEBUG
+N_PLUS_ONE_THRESHOLD = 5
+# Fail views decorated with querycount.query_budget when they exceed it.
+QUERY_BUDGET_ENFORCED = False
+
+######################################################################
+# TRAFFIC CAPTURE
+
+# NDJSON file sampled API requests are appended to, for
+# `manage.py replay_traffic`. Capture is off when unset.
+TRAFFIC_CAPTURE_PATH = os.environ.get("JUGGLE_TRAFFIC_CAPTURE_PATH")
+TRAFFIC_CAPTURE_SAMPLE_RATE = float(
+    os.environ.get("JUGGLE_TRAFFIC_CAPTURE_SAMPLE_RATE", 0.01)
+)
+# Query parameters and body fields whose values are always masked, numbers too
+TRAFFIC_CAPTURE_REDACTED_FIELDS = (
+    "access_token",
+    "email",
+    "full_name",
+    "password",
+    "username",
+)
+# Larger JSON bodies are not captured
+TRAFFIC_CAPTURE_MAX_BODY_SIZE = 64 * 1024
+
 ######################################################################
 # JWT authentication properties
 
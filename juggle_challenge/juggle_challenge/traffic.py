@@ -0,0 +1,142 @@
+"""Capture of sampled, anonymized API traffic for replay benchmarks.
+
+``TrafficCaptureMiddleware`` appends one JSON line per sampled ``/v1/``
+request to ``TRAFFIC_CAPTURE_PATH``: its start time, method, route, path,
+query, body and the status, duration and size of the response. Nothing that
+identifies the caller is kept: authentication headers are dropped, and the
+``TRAFFIC_CAPTURE_REDACTED_FIELDS`` query parameters and all text in bodies
+are masked, keeping their length and punctuation so they still validate.
+
+The duration is the server time ``MetricsMiddleware`` reports in the
+``Server-Timing`` header, which replays compare with the header of their
+responses.
+
+``manage.py replay_traffic`` sends a capture again and compares latencies.
+"""
+from __future__ import annotations
+
+import json
+import os
+import random
+import time
+from typing import Any, Dict, Iterable, Iterator, List
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .metrics import parse_server_timing, route_name
+
+CAPTURED_PATH_PREFIX = "/v1/"
+
+
+def _mask_text(text: str) -> str:
+    # Keeping URL schemes lets masked URLs validate
+    scheme, separator, rest = text.rpartition("://")
+    masked = "".join(
+        "0" if char.isdigit() else "x" if char.isalpha() else char for char in rest
+    )
+    return scheme + separator + masked
+
+
+def mask(value: Any, redact: bool = False) -> Any:
+    """``value`` with letters replaced by x and digits by 0 in its strings.
+    Numbers, and strings holding one, are kept unless ``redact``, and so are
+    keys and structure. Values of ``TRAFFIC_CAPTURE_REDACTED_FIELDS`` keys
+    are always redacted.
+    """
+    if isinstance(value, dict):
+        redacted = settings.TRAFFIC_CAPTURE_REDACTED_FIELDS
+        return {
+            key: mask(item, redact or key in redacted) for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [mask(item, redact) for item in value]
+    if isinstance(value, str):
+        if not redact:
+            try:
+                float(value)
+                return value
+            except ValueError:
+                pass
+        return _mask_text(value)
+    if redact and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return 0
+    return value
+
+
+def anonymize_query(query) -> Dict[str, List[str]]:
+    redacted = settings.TRAFFIC_CAPTURE_REDACTED_FIELDS
+    return {
+        name: [mask(v, redact=True) for v in values] if name in redacted else values
+        for name, values in query.lists()
+    }
+
+
+def read_body(request) -> Dict[str, Any]:
+    """The body of ``request``, masked, if it's a small enough JSON document."""
+    length = int(request.META.get("CONTENT_LENGTH") or 0)
+    if not length:
+        return {}
+    if request.content_type != "application/json":
+        return dict(body_omitted=request.content_type)
+    if length > settings.TRAFFIC_CAPTURE_MAX_BODY_SIZE:
+        return dict(body_omitted="too large")
+    try:
+        return dict(body=mask(json.loads(request.body)))
+    except ValueError:
+        return dict(body_omitted="invalid json")
+
+
+class TrafficCaptureMiddleware:
+    def __init__(self, get_response):
+        if not settings.TRAFFIC_CAPTURE_PATH:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.path = settings.TRAFFIC_CAPTURE_PATH
+        self.sample_rate = settings.TRAFFIC_CAPTURE_SAMPLE_RATE
+
+    def __call__(self, request):
+        if (
+            not request.path.startswith(CAPTURED_PATH_PREFIX)
+            or random.random() >= self.sample_rate
+        ):
+            return self.get_response(request)
+
+        # Read before the view consumes the request stream
+        body = read_body(request)
+        started_at = time.time()
+        t0 = time.perf_counter()
+        response = self.get_response(request)
+        dt_s = parse_server_timing(response.get("Server-Timing"))
+        if dt_s is None:
+            dt_s = time.perf_counter() - t0
+
+        record = dict(
+            ts=started_at,
+            method=request.method,
+            route=route_name(request),
+            path=request.path,
+            query=anonymize_query(request.GET),
+            **body,
+            status=response.status_code,
+            duration_s=round(dt_s, 6),
+            size=len(response.content) if not response.streaming else None,
+        )
+        self.write(record)
+        return response
+
+    def write(self, record: dict) -> None:
+        line = (json.dumps(record) + "\n").encode()
+        # One O_APPEND write per record keeps lines from several worker
+        # processes whole
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+
+def read_capture(lines: Iterable[str]) -> Iterator[dict]:
+    for line in lines:
+        if line.strip():
+            yield json.loads(line)
@@ -0,0 +1,7 @@
+"""Gunicorn worker serving asgi.py with uvicorn, see ``prefork``."""
+from uvicorn.workers import UvicornWorker as BaseUvicornWorker
+
+
+class UvicornWorker(BaseUvicornWorker):
+    # Django doesn't implement the ASGI lifespan protocol
+    CONFIG_KWARGS = dict(BaseUvicornWorker.CONFIG_KWARGS, lifespan="off")